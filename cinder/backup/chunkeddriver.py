@@ -22,10 +22,15 @@
 """
 
 import abc
+import collections
+import errno
 import hashlib
+import io
 import json
 import os
+import struct
 import sys
+import time
 
 import eventlet
 from oslo_config import cfg
@@ -62,12 +67,323 @@ backup_opts = [
                         ('bzip2', "Same as 'bz2'"),
                         ('zstd', 'Use the Zstandard compression algorithm')],
                help="Compression algorithm for backups ('none' to disable)"),
+    cfg.IntOpt('backup_chunk_upload_workers',
+               default=1,
+               min=1,
+               help='Number of chunks of a single backup that chunked backup '
+                    'drivers compress and upload concurrently.'),
+    cfg.IntOpt('backup_max_chunks_in_flight',
+               default=1,
+               min=1,
+               help='Maximum number of chunks that have been read from the '
+                    'volume and are queued for upload.  Memory used by a '
+                    'backup is bounded by the sum of this value and '
+                    'backup_chunk_upload_workers times the chunk size.'),
+    cfg.IntOpt('backup_chunk_processing_threads',
+               default=1,
+               min=1,
+               help='Number of chunks of a single backup that chunked backup '
+                    'drivers hash, checksum and compress concurrently.  Each '
+                    'chunk is processed in a single pass by a native thread '
+                    'taken from the pool sized by '
+                    'backup_native_threads_pool_size, so this value should '
+                    'be well below that size.'),
+    cfg.IntOpt('backup_restore_prefetch_objects',
+               default=1,
+               min=1,
+               help='Number of backup objects that chunked backup drivers '
+                    'download and decompress concurrently ahead of the one '
+                    'being written to the volume during a restore.'),
+    cfg.IntOpt('backup_restore_prefetch_max_bytes',
+               default=0,
+               min=0,
+               help='Maximum amount of uncompressed data, in bytes, held by '
+                    'prefetched objects during a restore.  At least one '
+                    'object is always prefetched.  0 means no limit other '
+                    'than backup_restore_prefetch_objects.'),
+    cfg.BoolOpt('backup_write_sha256_index',
+                default=False,
+                help='Store a compact binary index of the block hashes next '
+                     'to the JSON sha256 file of chunked backups.  '
+                     'Incremental backups read the index of their parent '
+                     'instead of the JSON file when it is available.  Backup '
+                     'services that predate this option cannot restore '
+                     'backups that have an index, so it should be disabled '
+                     'until all backup services are upgraded.'),
+    cfg.BoolOpt('backup_skip_zero_blocks',
+                default=False,
+                help='Record hash blocks that only contain zeroes as holes '
+                     'in the backup metadata instead of uploading them, and '
+                     'skip reading ranges that the volume file reports as '
+                     'unallocated with SEEK_HOLE.  Backup services that '
+                     'predate this option cannot restore backups that '
+                     'contain holes, so it should only be enabled once all '
+                     'backup services are upgraded.'),
+    cfg.IntOpt('backup_status_check_interval',
+               default=5,
+               min=0,
+               help='Minimum interval, in seconds, between two database '
+                    'queries made by chunked backup drivers to check '
+                    'whether a running backup or restore has been cancelled. '
+                    'Backups deleted through the backup service running them '
+                    'are stopped right away regardless of this value.  0 '
+                    'queries the database for every chunk.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(backup_opts)
 
 
+SHA256_DIGEST_SIZE = hashlib.sha256().digest_size
+# Amount of data of a chunk hashed before its blocks are compared with the
+# parent backup and compressed, small enough to still be in the CPU cache.
+_PROCESS_WINDOW_BYTES = units.Mi
+# Header of the binary sha256 index: magic, format version, digest size,
+# hash block size and number of digests.  It is followed by the digests,
+# one after the other, so the index can be sliced or mmap-ed without parsing.
+_SHA_INDEX_HEADER = struct.Struct('<4sHHQQ')
+_SHA_INDEX_MAGIC = b'CSHA'
+_SHA_INDEX_VERSION = 1
+
+
+def _pack_sha_index(block_size, digests):
+    """Return the binary sha256 index for the concatenated `digests`."""
+    count = len(digests) // SHA256_DIGEST_SIZE
+    header = _SHA_INDEX_HEADER.pack(_SHA_INDEX_MAGIC, _SHA_INDEX_VERSION,
+                                    SHA256_DIGEST_SIZE, block_size, count)
+    return header + digests
+
+
+def _unpack_sha_index(data):
+    """Return the hash block size and digests stored in a sha256 index."""
+    data = memoryview(data)
+    if len(data) < _SHA_INDEX_HEADER.size:
+        raise ValueError(_('sha256 index is truncated'))
+    magic, version, digest_size, block_size, count = \
+        _SHA_INDEX_HEADER.unpack_from(data)
+    if (magic != _SHA_INDEX_MAGIC or version != _SHA_INDEX_VERSION or
+            digest_size != SHA256_DIGEST_SIZE):
+        raise ValueError(_('unsupported sha256 index format'))
+    digests = data[_SHA_INDEX_HEADER.size:]
+    if len(digests) != count * SHA256_DIGEST_SIZE:
+        raise ValueError(_('sha256 index is truncated'))
+    return block_size, digests
+
+
+def _diff_runs(digests, other, start, end):
+    """Return the runs of blocks whose digests differ between two indexes.
+
+    `digests` and `other` are concatenated sha256 digests, and the blocks
+    from `start` to `end` are compared.  Ranges of blocks are compared in
+    bulk and only split in halves when they differ, so long runs of equal
+    blocks cost a single comparison.  Blocks missing from `other` differ.
+
+    Returns the (start, end) block ranges that differ, in order.
+    """
+    digests = memoryview(digests)
+    other = memoryview(other)
+    runs = []
+    pending = [(start, end)]
+    while pending:
+        low, high = pending.pop()
+        if (digests[low * SHA256_DIGEST_SIZE:high * SHA256_DIGEST_SIZE] ==
+                other[low * SHA256_DIGEST_SIZE:high * SHA256_DIGEST_SIZE]):
+            continue
+        if high - low > 1:
+            middle = (low + high) // 2
+            # The lower half is popped first to find the runs in order.
+            pending.append((middle, high))
+            pending.append((low, middle))
+        elif runs and runs[-1][1] == low:
+            runs[-1][1] = high
+        else:
+            runs.append([low, high])
+    return [(low, high) for low, high in runs]
+
+
+def _block_runs(digests, parent_digests, zero_digests, start, end):
+    """Classify the blocks from `start` to `end` of a chunk in bulk.
+
+    Yields (kind, start, end) block ranges covering all the blocks, where
+    kind is None for blocks unchanged since the parent backup, 'hole' for
+    blocks of zeroes and 'data' for the blocks to upload.
+    """
+    if parent_digests is None:
+        changed = [(start, end)]
+    else:
+        changed = _diff_runs(digests, parent_digests, start, end)
+    position = start
+    for changed_start, changed_end in changed:
+        if position < changed_start:
+            yield None, position, changed_start
+        position = changed_start
+        if zero_digests is not None:
+            for data_start, data_end in _diff_runs(
+                    digests, zero_digests, changed_start, changed_end):
+                if position < data_start:
+                    yield 'hole', position, data_start
+                yield 'data', data_start, data_end
+                position = data_end
+            if position < changed_end:
+                yield 'hole', position, changed_end
+        else:
+            yield 'data', changed_start, changed_end
+        position = changed_end
+    if position < end:
+        yield None, position, end
+
+
+def _compress(compressor, data):
+    """Compress data that may be any object supporting the buffer protocol."""
+    try:
+        return compressor.compress(data)
+    except TypeError:
+        # Some compression libraries, like zstd, only accept bytes and not
+        # other buffer protocol objects.
+        return compressor.compress(bytes(data))
+
+
+class _ObjectEncoder(object):
+    """Checksum and compress a backup object fed to it range by range.
+
+    Compression libraries that provide a streaming compressor get each range
+    right after it has been hashed, while it is still in the CPU cache.
+    Others, like zstd, compress the whole object when it is finished.
+    """
+
+    def __init__(self, compressor, algorithm):
+        self._compressor = compressor
+        self._algorithm = algorithm
+        self._md5 = secretutils.md5(usedforsecurity=False)
+        self._stream = None
+        if compressor is not None:
+            for factory in ('compressobj', 'BZ2Compressor'):
+                factory = getattr(compressor, factory, None)
+                if factory is not None:
+                    self._stream = factory()
+                    break
+        self._parts = []
+
+    def update(self, block):
+        self._md5.update(block)
+        if self._stream is not None:
+            part = self._stream.compress(block)
+            if part:
+                self._parts.append(part)
+
+    def finish(self, data):
+        """Return the compression, payload and MD5 of the object.
+
+        `data` is the whole object, which is returned as is when compression
+        is disabled or doesn't make it smaller.
+        """
+        md5 = self._md5.hexdigest()
+        if self._compressor is None:
+            return 'none', data, md5
+        if self._stream is not None:
+            self._parts.append(self._stream.flush())
+            output = b''.join(self._parts)
+        else:
+            output = _compress(self._compressor, data)
+        if len(output) >= len(data):
+            return 'none', data, md5
+        return self._algorithm, output, md5
+
+
+class _StatusRefresher(object):
+    """Refresh a backup from the database at most once per interval."""
+
+    def __init__(self, backup, interval):
+        self._backup = backup
+        self._interval = interval
+        self._last_refresh = None
+
+    def refresh(self):
+        now = time.monotonic()
+        if (self._last_refresh is not None and
+                now - self._last_refresh < self._interval):
+            return
+        with self._backup.as_read_deleted():
+            self._backup.refresh()
+        self._last_refresh = now
+
+
+class _SparseFileProbe(object):
+    """Find unallocated ranges of a volume file using SEEK_DATA.
+
+    A separate file descriptor is used so the position of the volume file
+    being read is never moved.  Probing is silently disabled when the file
+    can't be opened by name or its file system doesn't support SEEK_DATA.
+    """
+
+    def __init__(self, volume_file):
+        self._fd = None
+        self.size = None
+        if not hasattr(os, 'SEEK_DATA') or sys.platform == 'win32':
+            return
+        try:
+            self._fd = os.open(volume_file.name, os.O_RDONLY)
+            self.size = os.lseek(self._fd, 0, os.SEEK_END)
+        except (AttributeError, TypeError, OSError):
+            self.close()
+
+    def hole_length(self, offset, length):
+        """Return how many bytes from offset are a hole, up to length."""
+        if self._fd is None or offset >= self.size:
+            return 0
+        length = min(length, self.size - offset)
+        try:
+            data_offset = os.lseek(self._fd, offset, os.SEEK_DATA)
+        except OSError as exc:
+            if exc.errno == errno.ENXIO:
+                # There is no data between offset and the end of the file.
+                return length
+            self.close()
+            return 0
+        return min(max(data_offset - offset, 0), length)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = None
+
+
+def _read_into(volume_file, buf, read_bytes):
+    """Read up to `read_bytes` of `volume_file` into `buf`.
+
+    Returns a memoryview of the data, which is a view of `buf` unless the
+    file doesn't support readinto.
+    """
+    view = memoryview(buf)[:read_bytes]
+    try:
+        read_len = volume_file.readinto(view)
+    except (AttributeError, NotImplementedError, io.UnsupportedOperation):
+        return memoryview(volume_file.read(read_bytes))
+    return view[:read_len or 0]
+
+
+def _write_at(volume_file, volume_offset, content):
+    """Write `content` at `volume_offset` of `volume_file`.
+
+    Uses a positional write when the file has a real file descriptor, so the
+    file position doesn't need to be moved, and falls back to seek and write
+    for other IO implementations.
+    """
+    try:
+        fileno = volume_file.fileno()
+    except (IOError, AttributeError):
+        fileno = None
+    if isinstance(fileno, int) and hasattr(os, 'pwrite'):
+        content = memoryview(content)
+        while content:
+            written = os.pwrite(fileno, content, volume_offset)
+            content = content[written:]
+            volume_offset += written
+    else:
+        volume_file.seek(volume_offset)
+        volume_file.write(content)
+
+
 def _write_nonzero(volume_file, volume_offset, content):
     """Write non-zero parts of `content` into `volume_file`."""
     chunk_length = 1024 * 1024
@@ -77,16 +393,246 @@ def _write_nonzero(volume_file, volume_offset, content):
         chunk = content[chunk_offset:chunk_end]
         # The len(chunk) may be smaller than chunk_length. It's okay.
         if not volume_utils.is_all_zero(chunk):
-            volume_file.seek(volume_offset + chunk_offset)
-            volume_file.write(chunk)
+            _write_at(volume_file, volume_offset + chunk_offset, chunk)
 
 
 def _write_volume(volume_is_new, volume_file, volume_offset, content):
     if volume_is_new:
         _write_nonzero(volume_file, volume_offset, content)
     else:
-        volume_file.seek(volume_offset)
-        volume_file.write(content)
+        _write_at(volume_file, volume_offset, content)
+
+
+class _ChunkUploader(object):
+    """Upload processed backup objects using a pool of greenthreads.
+
+    The reading greenthread submits chunks in volume order and names them
+    right away, so the object names and their position in object_meta['list']
+    do not depend on the order in which the uploads complete.
+    """
+
+    def __init__(self, driver, container, object_meta, extra_metadata,
+                 workers, max_in_flight, buffer_size, processing_threads=1):
+        self._driver = driver
+        self._container = container
+        self._object_meta = object_meta
+        self._extra_metadata = extra_metadata
+        self._workers = workers
+        self._queue = eventlet.queue.LightQueue(maxsize=max_in_flight)
+        self._error = None
+        self._aborted = False
+        self._stopped = False
+        # Chunks are read into reusable buffers.  Every chunk being processed
+        # and every queued or in progress upload may hold one, and the reader
+        # needs one more.
+        self._buffer_size = buffer_size
+        self._max_buffers = workers + max_in_flight + processing_threads + 1
+        self._buffer_count = 0
+        self._free_buffers = eventlet.queue.LightQueue()
+        self._buffer_refs = {}
+        self._pool = eventlet.GreenPool(workers)
+        for _i in range(workers):
+            self._pool.spawn_n(self._worker)
+
+    def get_buffer(self):
+        """Return a chunk buffer, waiting for one to be released if needed."""
+        if (self._free_buffers.empty() and
+                self._buffer_count < self._max_buffers):
+            self._buffer_count += 1
+            buf = bytearray(self._buffer_size)
+        else:
+            buf = self._free_buffers.get()
+        self._buffer_refs[id(buf)] = 1
+        return buf
+
+    def release_buffer(self, buf):
+        """Drop a reference to a chunk buffer, freeing it on the last one."""
+        key = id(buf)
+        self._buffer_refs[key] -= 1
+        if not self._buffer_refs[key]:
+            del self._buffer_refs[key]
+            self._free_buffers.put(buf)
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            object_name, obj, data, buf = item
+            try:
+                # Keep consuming after a failure so the reader never blocks on
+                # a full queue, but don't upload anything else.
+                if self._error is None and not self._aborted:
+                    self._driver._upload_object(self._container, object_name,
+                                                obj, data,
+                                                self._extra_metadata)
+            except Exception as exc:
+                self._error = exc
+            finally:
+                if buf is not None:
+                    self.release_buffer(buf)
+
+    def submit(self, data, data_offset, length, compression, md5,
+               buf=None):
+        """Queue an object for upload, blocking if the queue is full.
+
+        `data` is the payload of the object, `length` bytes of the volume
+        once decompressed.  It may be a view of `buf`, a buffer returned by
+        get_buffer, which is kept alive until the upload is done.
+        """
+        if self._error is not None:
+            self.wait()
+        object_name, obj = self._driver._reserve_object(self._object_meta,
+                                                        data_offset, length,
+                                                        compression, md5)
+        if buf is not None:
+            self._buffer_refs[id(buf)] += 1
+        self._queue.put((object_name, obj, data, buf))
+
+    def _stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        for _i in range(self._workers):
+            self._queue.put(None)
+        self._pool.waitall()
+
+    def wait(self):
+        """Wait for all queued chunks and raise the first upload error."""
+        self._stop()
+        if self._error is not None:
+            raise self._error
+
+    def abort(self):
+        """Drop queued chunks and wait for in progress uploads to finish."""
+        self._aborted = True
+        self._stop()
+
+
+class _ChunkProcessor(object):
+    """Process backup chunks in native threads.
+
+    Chunks are hashed, checksummed and compressed concurrently, and their
+    hashes, holes and objects are then stored in volume order.
+    """
+
+    def __init__(self, driver, uploader, object_meta, digests, threads):
+        self._driver = driver
+        self._uploader = uploader
+        self._object_meta = object_meta
+        self._digests = digests
+        self._threads = threads
+        self._algorithm = CONF.backup_compression_algorithm.lower()
+        self._pending = collections.deque()
+
+    def submit(self, data, data_offset, data_len, buf, parent_digests,
+               zero_digests):
+        """Start processing a chunk, waiting for a thread if needed.
+
+        `data` is a view of `buf`, a buffer returned by the uploader, which
+        is released once the chunk has been stored.  It may be None when the
+        chunk only contains zeroes.
+        """
+        while len(self._pending) >= self._threads:
+            self._store_next()
+        if data is None:
+            # There is nothing to hash or compress.
+            thread = eventlet.spawn(self._driver._process_chunk, None,
+                                    data_len, self._algorithm,
+                                    parent_digests, zero_digests)
+        else:
+            thread = eventlet.spawn(eventlet.tpool.execute,
+                                    self._driver._process_chunk, data,
+                                    data_len, self._algorithm,
+                                    parent_digests, zero_digests)
+        self._pending.append((data_offset, thread, buf))
+
+    def _store_next(self):
+        data_offset, thread, buf = self._pending.popleft()
+        try:
+            self._driver._store_chunk(self._uploader, self._object_meta,
+                                      self._digests, data_offset,
+                                      thread.wait(), buf)
+        finally:
+            if buf is not None:
+                self._uploader.release_buffer(buf)
+
+    def wait(self):
+        """Store all the chunks that are being processed."""
+        while self._pending:
+            self._store_next()
+
+    def abort(self):
+        """Drop the chunks that are being processed."""
+        while self._pending:
+            _data_offset, thread, buf = self._pending.popleft()
+            # Native threads cannot be interrupted, so wait for them to be
+            # done with the chunk buffer.
+            try:
+                thread.wait()
+            except Exception:
+                pass
+            if buf is not None:
+                self._uploader.release_buffer(buf)
+
+
+class _ObjectPrefetcher(object):
+    """Download and decompress backup objects ahead of the volume writer.
+
+    Objects are returned in the order they were given, while up to
+    `max_objects` of them, holding at most `max_bytes` of uncompressed data,
+    are fetched concurrently.
+    """
+
+    def __init__(self, fetch, objects, max_objects, max_bytes=0):
+        self._fetch = fetch
+        self._objects = iter(objects)
+        self._max_objects = max_objects
+        self._max_bytes = max_bytes
+        self._pool = eventlet.GreenPool(max_objects)
+        self._pending = collections.deque()
+        self._pending_bytes = 0
+        self._next = None
+
+    def _peek(self):
+        if self._next is None:
+            self._next = next(self._objects, None)
+        return self._next
+
+    def _fill(self):
+        while len(self._pending) < self._max_objects:
+            item = self._peek()
+            if item is None:
+                return
+            length = item[-1]['length']
+            if (self._pending and self._max_bytes and
+                    self._pending_bytes + length > self._max_bytes):
+                return
+            self._next = None
+            self._pending.append((length, self._pool.spawn(self._fetch,
+                                                           *item)))
+            self._pending_bytes += length
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self._fill()
+        if not self._pending:
+            raise StopIteration
+        length, gt = self._pending.popleft()
+        self._pending_bytes -= length
+        result = gt.wait()
+        # Start the next download before the caller writes this one.
+        self._fill()
+        return result
+
+    def cancel(self):
+        """Stop all the downloads that are still pending."""
+        while self._pending:
+            _length, gt = self._pending.popleft()
+            gt.kill()
+        self._pending_bytes = 0
 
 
 # Object writer and reader returned by inheriting classes must not have any
@@ -107,7 +653,11 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
     """
 
     DRIVER_VERSION = '1.0.0'
-    DRIVER_VERSION_MAPPING = {'1.0.0': '_restore_v1'}
+    # Version of backups whose metadata contains holes, which older services
+    # must refuse to restore.
+    SPARSE_DRIVER_VERSION = '1.1.0'
+    DRIVER_VERSION_MAPPING = {'1.0.0': '_restore_v1',
+                              '1.1.0': '_restore_v1'}
 
     def _get_compressor(self, algorithm):
         try:
@@ -151,6 +701,15 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
         self.compressor = \
             self._get_compressor(CONF.backup_compression_algorithm)
         self.support_force_delete = True
+        self.chunk_upload_workers = CONF.backup_chunk_upload_workers
+        self.max_chunks_in_flight = CONF.backup_max_chunks_in_flight
+        self.chunk_processing_threads = CONF.backup_chunk_processing_threads
+        self.restore_prefetch_objects = CONF.backup_restore_prefetch_objects
+        self.restore_prefetch_max_bytes = \
+            CONF.backup_restore_prefetch_max_bytes
+        self.skip_zero_blocks = CONF.backup_skip_zero_blocks
+        self.status_check_interval = CONF.backup_status_check_interval
+        self._zero_digests_cache = {}
 
         if sys.platform == 'win32' and self.chunk_size_bytes % 4096:
             # The chunk size must be a multiple of the sector size. In order
@@ -274,8 +833,13 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
         filename = '%s_sha256file' % object_name
         return filename
 
+    def _sha256_index_filename(self, backup):
+        object_name = backup['service_metadata']
+        filename = '%s_sha256index' % object_name
+        return filename
+
     def _write_metadata(self, backup, volume_id, container, object_list,
-                        volume_meta, extra_metadata=None):
+                        volume_meta, extra_metadata=None, holes=None):
         filename = self._metadata_filename(backup)
         LOG.debug('_write_metadata started, container name: %(container)s,'
                   ' metadata filename: %(filename)s.',
@@ -288,6 +852,9 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
         metadata['backup_description'] = backup['display_description']
         metadata['created_at'] = str(backup['created_at'])
         metadata['objects'] = object_list
+        if holes:
+            metadata['version'] = self.SPARSE_DRIVER_VERSION
+            metadata['holes'] = holes
         metadata['parent_id'] = backup['parent_id']
         metadata['volume_meta'] = volume_meta
         if extra_metadata:
@@ -298,7 +865,7 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
             writer.write(metadata_json)
         LOG.debug('_write_metadata finished. Metadata: %s.', metadata_json)
 
-    def _write_sha256file(self, backup, volume_id, container, sha256_list):
+    def _write_sha256file(self, backup, volume_id, container, digests):
         filename = self._sha256_filename(backup)
         LOG.debug('_write_sha256file started, container name: %(container)s,'
                   ' sha256file filename: %(filename)s.',
@@ -311,13 +878,70 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
         sha256file['backup_description'] = backup['display_description']
         sha256file['created_at'] = str(backup['created_at'])
         sha256file['chunk_size'] = self.sha_block_size_bytes
-        sha256file['sha256s'] = sha256_list
+        hex_digests = digests.hex()
+        sha256file['sha256s'] = [
+            hex_digests[i:i + 2 * SHA256_DIGEST_SIZE]
+            for i in range(0, len(hex_digests), 2 * SHA256_DIGEST_SIZE)]
         sha256file_json = json.dumps(sha256file, sort_keys=True, indent=2)
         sha256file_json = sha256file_json.encode('utf-8')
         with self._get_object_writer(container, filename) as writer:
             writer.write(sha256file_json)
         LOG.debug('_write_sha256file finished.')
 
+    def _write_sha256_index(self, backup, container, digests):
+        filename = self._sha256_index_filename(backup)
+        LOG.debug('_write_sha256_index started, container name: '
+                  '%(container)s, sha256 index filename: %(filename)s.',
+                  {'container': container, 'filename': filename})
+        with self._get_object_writer(container, filename) as writer:
+            writer.write(_pack_sha_index(self.sha_block_size_bytes, digests))
+        LOG.debug('_write_sha256_index finished.')
+
+    def _read_sha256_index(self, backup):
+        """Return the hash block size and sha256 digests of a backup.
+
+        Uses the binary index when the backup has one and falls back to the
+        JSON sha256 file for backups created without it, or whose index
+        cannot be parsed.  Other errors reading the index are raised.
+        """
+        container = backup['container']
+        filename = self._sha256_index_filename(backup)
+        LOG.debug('_read_sha256_index started, container name: '
+                  '%(container)s, sha256 index filename: %(filename)s.',
+                  {'container': container, 'filename': filename})
+        index = None
+        try:
+            with self._get_object_reader(container, filename) as reader:
+                index = reader.read()
+        except Exception as exc:
+            if not self._is_object_not_found(exc):
+                raise
+            LOG.debug('Backup %(backup_id)s has no sha256 index, reading '
+                      'the sha256 file instead.',
+                      {'backup_id': backup['id']})
+        if index is not None:
+            try:
+                block_size, digests = _unpack_sha_index(index)
+                LOG.debug('_read_sha256_index finished.')
+                return block_size, digests
+            except (ValueError, struct.error) as exc:
+                LOG.warning('Cannot use sha256 index of backup '
+                            '%(backup_id)s, reading the sha256 file '
+                            'instead: %(exc)s',
+                            {'backup_id': backup['id'], 'exc': exc})
+        sha256file = self._read_sha256file(backup)
+        LOG.debug('_read_sha256_index finished.')
+        return (sha256file['chunk_size'],
+                memoryview(bytes.fromhex(''.join(sha256file['sha256s']))))
+
+    def _is_object_not_found(self, exc):
+        """Return whether exc was raised reading a missing object.
+
+        Drivers whose object readers report missing objects with other
+        exceptions than FileNotFoundError override this.
+        """
+        return isinstance(exc, FileNotFoundError)
+
     def _read_metadata(self, backup):
         container = backup['container']
         filename = self._metadata_filename(backup)
@@ -372,7 +996,10 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
                   })
         object_meta = {'id': 1, 'list': [], 'prefix': object_prefix,
                        'volume_meta': None}
-        object_sha256 = {'id': 1, 'sha256s': [], 'prefix': object_prefix}
+        # The digests of the blocks are kept concatenated, and only turned
+        # into the hex strings of the JSON sha256 file when it is written.
+        object_sha256 = {'id': 1, 'sha256s': bytearray(),
+                         'prefix': object_prefix}
         extra_metadata = self.get_extra_metadata(backup, volume)
         if extra_metadata is not None:
             object_meta['extra_metadata'] = extra_metadata
@@ -380,86 +1007,86 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
         return (object_meta, object_sha256, extra_metadata, container,
                 volume_size_bytes)
 
-    def _backup_chunk(self, backup, container, data, data_offset,
-                      object_meta, extra_metadata):
-        """Backup data chunk based on the object metadata and offset."""
+    def _reserve_object(self, object_meta, data_offset, length, compression,
+                        md5):
+        """Name the next object and add its entry to the object list."""
         object_prefix = object_meta['prefix']
-        object_list = object_meta['list']
-
         object_id = object_meta['id']
         object_name = '%s-%05d' % (object_prefix, object_id)
         obj = {}
-        obj[object_name] = {}
-        obj[object_name]['offset'] = data_offset
-        obj[object_name]['length'] = len(data)
-        LOG.debug('Backing up chunk of data from volume.')
-        algorithm, output_data = self._prepare_output_data(data)
-        obj[object_name]['compression'] = algorithm
+        obj['offset'] = data_offset
+        obj['length'] = length
+        obj['compression'] = compression
+        obj['md5'] = md5
+        object_meta['list'].append({object_name: obj})
+        object_meta['id'] = object_id + 1
+        return object_name, obj
+
+    def _upload_object(self, container, object_name, obj, output_data,
+                       extra_metadata):
+        """Write the already compressed payload of an object."""
+        LOG.debug('Backing up %(length)d bytes of data from volume in '
+                  '%(object_name)s, %(size)d bytes with %(compression)s '
+                  'compression.',
+                  {'length': obj['length'], 'object_name': object_name,
+                   'size': len(output_data),
+                   'compression': obj['compression']})
         LOG.debug('About to put_object')
         with self._get_object_writer(
                 container, object_name, extra_metadata=extra_metadata
         ) as writer:
             writer.write(output_data)
-        md5 = eventlet.tpool.execute(
-            secretutils.md5, data, usedforsecurity=False).hexdigest()
-        obj[object_name]['md5'] = md5
         LOG.debug('backup MD5 for %(object_name)s: %(md5)s',
-                  {'object_name': object_name, 'md5': md5})
-        object_list.append(obj)
-        object_id += 1
-        object_meta['list'] = object_list
-        object_meta['id'] = object_id
+                  {'object_name': object_name, 'md5': obj['md5']})
 
         LOG.debug('Calling eventlet.sleep(0)')
         eventlet.sleep(0)
 
-    def _prepare_output_data(self, data):
-        if self.compressor is None:
-            return 'none', data
-        data_size_bytes = len(data)
-        # Execute compression in native thread so it doesn't prevent
-        # cooperative greenthread switching.
-        compressed_data = self.compressor.compress(data)
-        comp_size_bytes = len(compressed_data)
-        algorithm = CONF.backup_compression_algorithm.lower()
-        if comp_size_bytes >= data_size_bytes:
-            LOG.debug('Compression of this chunk was ineffective: '
-                      'original length: %(data_size_bytes)d, '
-                      'compressed length: %(compressed_size_bytes)d. '
-                      'Using original data for this chunk.',
-                      {'data_size_bytes': data_size_bytes,
-                       'compressed_size_bytes': comp_size_bytes,
-                       })
-            return 'none', data
-        LOG.debug('Compressed %(data_size_bytes)d bytes of data '
-                  'to %(comp_size_bytes)d bytes using %(algorithm)s.',
-                  {'data_size_bytes': data_size_bytes,
-                   'comp_size_bytes': comp_size_bytes,
-                   'algorithm': algorithm,
-                   })
-        return algorithm, compressed_data
+    def _zero_digests(self, data_len):
+        """Return the sha256 digests of data_len bytes of zeroes."""
+        digests = self._zero_digests_cache.get(data_len)
+        if digests is None:
+            block_size = self.sha_block_size_bytes
+            full_blocks, tail = divmod(data_len, block_size)
+            digests = hashlib.sha256(bytes(block_size)).digest() * full_blocks
+            if tail:
+                digests += hashlib.sha256(bytes(tail)).digest()
+            self._zero_digests_cache[data_len] = digests
+        return digests
+
+    def _add_hole(self, object_meta, offset, length):
+        """Record a range of zeroes in the backup metadata."""
+        holes = object_meta.setdefault('holes', [])
+        if holes and holes[-1][0] + holes[-1][1] == offset:
+            holes[-1][1] += length
+        else:
+            holes.append([offset, length])
 
     def _finalize_backup(self, backup, container, object_meta, object_sha256):
         """Write the backup's metadata to the backup repository."""
         object_list = object_meta['list']
         object_id = object_meta['id']
         volume_meta = object_meta['volume_meta']
-        sha256_list = object_sha256['sha256s']
+        digests = object_sha256['sha256s']
         extra_metadata = object_meta.get('extra_metadata')
+        holes = object_meta.get('holes')
         self._write_sha256file(backup,
                                backup.volume_id,
                                container,
-                               sha256_list)
+                               digests)
+        if CONF.backup_write_sha256_index:
+            self._write_sha256_index(backup, container, bytes(digests))
         self._write_metadata(backup,
                              backup.volume_id,
                              container,
                              object_list,
                              volume_meta,
-                             extra_metadata)
+                             extra_metadata,
+                             holes)
         # NOTE(whoami-rajat) : The object_id variable is used to name
         # the backup objects and hence differs from the object_count
         # variable, therefore the increment of object_id value in the last
-        # iteration of _backup_chunk() method shouldn't be reflected in the
+        # call of _reserve_object() method shouldn't be reflected in the
         # object_count variable.
         backup.object_count = object_id - 1
         backup.save()
@@ -504,24 +1131,90 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
             disk_path)
         return win32_diskutils.get_disk_size(disk_number)
 
-    def _calculate_sha(self, data):
-        """Calculate SHA256 of a data chunk.
+    def _process_chunk(self, data, data_len, algorithm,
+                       parent_digests=None, zero_digests=None):
+        """Hash, checksum and compress a chunk in a single pass.
+
+        The chunk is processed in windows of _PROCESS_WINDOW_BYTES.  The
+        blocks of a window are hashed, then their digests are compared in
+        bulk with the digests of the same blocks in the parent backup, if
+        any, and with the digests of a block of zeroes when zero blocks are
+        skipped.  Unchanged blocks are left out, runs of zero blocks are
+        returned as holes and the other runs of blocks are checksummed and
+        compressed while the window is still in the CPU cache.
+
+        `data` may be None when the chunk is known to only contain zeroes,
+        in which case `zero_digests` is used instead of hashing it.
+
+        Returns the concatenated digests of the blocks, the (offset, length)
+        of the holes and the (offset, length, compression, payload, md5) of
+        the objects to upload, with offsets relative to the start of the
+        chunk.
 
         This method cannot log anything as it is called on a native thread.
         """
-        # NOTE(geguileo): Using memoryview to avoid data copying when slicing
-        # for the sha256 call.
-        chunk = memoryview(data)
-        shalist = []
-        off = 0
-        datalen = len(chunk)
-        while off < datalen:
-            chunk_end = min(datalen, off + self.sha_block_size_bytes)
-            block = chunk[off:chunk_end]
-            sha = hashlib.sha256(block).hexdigest()
-            shalist.append(sha)
-            off += self.sha_block_size_bytes
-        return shalist
+        block_size = self.sha_block_size_bytes
+        block_count = -(-data_len // block_size)
+        if data is None:
+            digests = bytearray(zero_digests)
+        else:
+            # NOTE(geguileo): Using memoryview to avoid data copying when
+            # slicing for the sha256 call.
+            data = memoryview(data)
+            # Allocated up front, as views of it are compared while it is
+            # filled.
+            digests = bytearray(block_count * SHA256_DIGEST_SIZE)
+        window_blocks = max(1, _PROCESS_WINDOW_BYTES // block_size)
+        holes = []
+        objects = []
+        run = None
+        run_start = 0
+        encoder = None
+
+        def _end_run(run_end):
+            if run == 'hole':
+                holes.append((run_start, run_end - run_start))
+            elif run == 'data':
+                objects.append((run_start, run_end - run_start) +
+                               encoder.finish(data[run_start:run_end]))
+
+        for window_start in range(0, block_count, window_blocks):
+            window_end = min(window_start + window_blocks, block_count)
+            if data is not None:
+                for index in range(window_start, window_end):
+                    offset = index * block_size
+                    digests[index * SHA256_DIGEST_SIZE:
+                            (index + 1) * SHA256_DIGEST_SIZE] = \
+                        hashlib.sha256(
+                            data[offset:offset + block_size]).digest()
+            for block_run, start, end in _block_runs(
+                    digests, parent_digests, zero_digests, window_start,
+                    window_end):
+                start = start * block_size
+                end = min(end * block_size, data_len)
+                if block_run != run:
+                    _end_run(start)
+                    run = block_run
+                    run_start = start
+                    if run == 'data':
+                        encoder = _ObjectEncoder(self.compressor, algorithm)
+                if run == 'data':
+                    encoder.update(data[start:end])
+        _end_run(data_len)
+        return digests, holes, objects
+
+    def _store_chunk(self, uploader, object_meta, backup_digests,
+                     data_offset, processed, buf):
+        """Record the hashes and holes of a chunk and upload its objects."""
+        digests, holes, objects = processed
+        backup_digests += digests
+        for offset, length in holes:
+            self._add_hole(object_meta, data_offset + offset, length)
+        for offset, length, compression, output, md5 in objects:
+            # Only uncompressed payloads are views of the chunk buffer.
+            uploader.submit(output, data_offset + offset, length,
+                            compression, md5,
+                            buf if isinstance(output, memoryview) else None)
 
     def backup(self, backup, volume_file, backup_metadata=True):
         """Backup the given volume.
@@ -536,19 +1229,17 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
 
         # Read the shafile of the parent backup if backup['parent_id']
         # is given.
-        parent_backup_shafile = None
         parent_backup = None
         if backup.parent_id:
             parent_backup = objects.Backup.get_by_id(self.context,
                                                      backup.parent_id)
-            parent_backup_shafile = self._read_sha256file(parent_backup)
-            parent_backup_shalist = parent_backup_shafile['sha256s']
-            if (parent_backup_shafile['chunk_size'] !=
-                    self.sha_block_size_bytes):
+            parent_block_size, parent_backup_digests = \
+                self._read_sha256_index(parent_backup)
+            if parent_block_size != self.sha_block_size_bytes:
                 err = (_('Hash block size has changed since the last '
                          'backup. New hash block size: %(new)s. Old hash '
                          'block size: %(old)s. Do a full backup.')
-                       % {'old': parent_backup_shafile['chunk_size'],
+                       % {'old': parent_block_size,
                           'new': self.sha_block_size_bytes})
                 raise exception.InvalidBackup(reason=err)
             # If the volume size increased since the last backup, fail
@@ -587,86 +1278,111 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
         if self.enable_progress_timer:
             timer.start(interval=self.backup_timer_interval)
 
-        sha256_list = object_sha256['sha256s']
+        uploader = _ChunkUploader(self, container, object_meta,
+                                  extra_metadata, self.chunk_upload_workers,
+                                  self.max_chunks_in_flight,
+                                  self.chunk_size_bytes,
+                                  self.chunk_processing_threads)
+        digests = object_sha256['sha256s']
+        processor = _ChunkProcessor(self, uploader, object_meta, digests,
+                                    self.chunk_processing_threads)
+        sparse_probe = None
+        if self.skip_zero_blocks and win32_disk_size is None:
+            sparse_probe = _SparseFileProbe(volume_file)
         shaindex = 0
         is_backup_canceled = False
-        while True:
-            # First of all, we check the status of this backup. If it
-            # has been changed to delete or has been deleted, we cancel the
-            # backup process to do forcing delete.
-            with backup.as_read_deleted():
-                backup.refresh()
-            if backup.status in (fields.BackupStatus.DELETING,
-                                 fields.BackupStatus.DELETED):
-                is_backup_canceled = True
-                # To avoid the chunk left when deletion complete, need to
-                # clean up the object of chunk again.
-                self.delete_backup(backup)
-                LOG.debug('Cancel the backup process of %s.', backup.id)
-                break
-            data_offset = volume_file.tell()
-
-            if win32_disk_size is not None:
-                read_bytes = min(self.chunk_size_bytes,
-                                 win32_disk_size - data_offset)
-            else:
-                read_bytes = self.chunk_size_bytes
-            data = volume_file.read(read_bytes)
-
-            if data == b'':
-                break
-
-            # Calculate new shas with the datablock.
-            shalist = eventlet.tpool.execute(self._calculate_sha, data)
-            sha256_list.extend(shalist)
-
-            # If parent_backup is not None, that means an incremental
-            # backup will be performed.
-            if parent_backup:
-                # Find the extent that needs to be backed up.
-                extent_off = -1
-                for idx, sha in enumerate(shalist):
-                    if sha != parent_backup_shalist[shaindex]:
-                        if extent_off == -1:
-                            # Start of new extent.
-                            extent_off = idx * self.sha_block_size_bytes
-                    else:
-                        if extent_off != -1:
-                            # We've reached the end of extent.
-                            extent_end = idx * self.sha_block_size_bytes
-                            segment = data[extent_off:extent_end]
-                            self._backup_chunk(backup, container, segment,
-                                               data_offset + extent_off,
-                                               object_meta,
-                                               extra_metadata)
-                            extent_off = -1
-                    shaindex += 1
-
-                # The last extent extends to the end of data buffer.
-                if extent_off != -1:
-                    extent_end = len(data)
-                    segment = data[extent_off:extent_end]
-                    self._backup_chunk(backup, container, segment,
-                                       data_offset + extent_off,
-                                       object_meta, extra_metadata)
-                    extent_off = -1
-            else:  # Do a full backup.
-                self._backup_chunk(backup, container, data, data_offset,
-                                   object_meta, extra_metadata)
-
-            # Notifications
-            total_block_sent_num += self.data_block_num
-            counter += 1
-            if counter == self.data_block_num:
-                # Send the notification to Ceilometer when the chunk
-                # number reaches the data_block_num.  The backup percentage
-                # is put in the metadata as the extra information.
-                self._send_progress_notification(self.context, backup,
-                                                 object_meta,
-                                                 total_block_sent_num,
-                                                 volume_size_bytes)
-                # Reset the counter
-                counter = 0
+        status_refresher = _StatusRefresher(backup,
+                                            self.status_check_interval)
+        try:
+            while True:
+                # First of all, we check the status of this backup. If it
+                # has been changed to delete or has been deleted, we cancel
+                # the backup process to do forcing delete.
+                if not driver.is_backup_cancelled(backup.id):
+                    status_refresher.refresh()
+                if (driver.is_backup_cancelled(backup.id) or
+                        backup.status in (fields.BackupStatus.DELETING,
+                                          fields.BackupStatus.DELETED)):
+                    is_backup_canceled = True
+                    # Uploads still in progress must finish before we can
+                    # clean up, otherwise they could leave objects behind.
+                    processor.abort()
+                    uploader.abort()
+                    # To avoid the chunk left when deletion complete, need to
+                    # clean up the object of chunk again.
+                    self.delete_backup(backup)
+                    LOG.debug('Cancel the backup process of %s.', backup.id)
+                    break
+                data_offset = volume_file.tell()
+
+                if win32_disk_size is not None:
+                    read_bytes = min(self.chunk_size_bytes,
+                                     win32_disk_size - data_offset)
+                else:
+                    read_bytes = self.chunk_size_bytes
+
+                buf = None
+                if (sparse_probe is not None and
+                        sparse_probe.hole_length(data_offset,
+                                                 read_bytes) == read_bytes):
+                    # The whole chunk is unallocated, there's no need to
+                    # read it to know it's all zeroes.
+                    data = None
+                    data_len = min(read_bytes,
+                                   sparse_probe.size - data_offset)
+                    volume_file.seek(data_offset + data_len)
+                else:
+                    buf = uploader.get_buffer()
+                    data = _read_into(volume_file, buf, read_bytes)
+                    data_len = len(data)
+
+                    if not data_len:
+                        uploader.release_buffer(buf)
+                        break
+
+                shacount = -(-data_len // self.sha_block_size_bytes)
+                # If parent_backup is not None, that means an incremental
+                # backup will be performed, and only the blocks that changed
+                # since the parent backup are uploaded.
+                parent_digests = None
+                if parent_backup:
+                    parent_digests = parent_backup_digests[
+                        shaindex * SHA256_DIGEST_SIZE:
+                        (shaindex + shacount) * SHA256_DIGEST_SIZE]
+                    shaindex += shacount
+                zero_digests = None
+                if self.skip_zero_blocks:
+                    zero_digests = self._zero_digests(data_len)
+                processor.submit(data, data_offset, data_len, buf,
+                                 parent_digests, zero_digests)
+                data = None
+
+                # Notifications
+                total_block_sent_num += self.data_block_num
+                counter += 1
+                if counter == self.data_block_num:
+                    # Send the notification to Ceilometer when the chunk
+                    # number reaches the data_block_num.  The backup
+                    # percentage is put in the metadata as the extra
+                    # information.
+                    self._send_progress_notification(self.context, backup,
+                                                     object_meta,
+                                                     total_block_sent_num,
+                                                     volume_size_bytes)
+                    # Reset the counter
+                    counter = 0
+
+            if not is_backup_canceled:
+                processor.wait()
+                uploader.wait()
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                timer.stop()
+                processor.abort()
+                uploader.abort()
+        finally:
+            if sparse_probe is not None:
+                sparse_probe.close()
 
         # Stop the timer.
         timer.stop()
@@ -677,7 +1393,6 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
         # All the data have been sent, the backup_percent reaches 100.
         self._send_progress_end(self.context, backup, object_meta)
 
-        object_sha256['sha256s'] = sha256_list
         if backup_metadata:
             try:
                 self._backup_metadata(backup, object_meta)
@@ -707,7 +1422,8 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
             metadata_object_names.extend(obj.keys())
         LOG.debug('metadata_object_names = %s.', metadata_object_names)
         prune_list = [self._metadata_filename(backup),
-                      self._sha256_filename(backup)]
+                      self._sha256_filename(backup),
+                      self._sha256_index_filename(backup)]
         object_names = [object_name for object_name in
                         self._generate_object_names(backup)
                         if object_name not in prune_list]
@@ -716,43 +1432,60 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
                     'does not match object list stored in metadata.')
             raise exception.InvalidBackup(reason=err)
 
+        objects_to_fetch = []
         for metadata_object in metadata_objects:
+            object_name, obj = list(metadata_object.items())[0]
+            objects_to_fetch.append((container, object_name, extra_metadata,
+                                     obj))
+        prefetcher = _ObjectPrefetcher(self._fetch_object, objects_to_fetch,
+                                       self.restore_prefetch_objects,
+                                       self.restore_prefetch_max_bytes)
+        # New volumes are already zeroed, so zeroes can only be skipped when
+        # restoring the full backup at the bottom of the chain.  Incremental
+        # backups are restored over the data of their parents, where zeroed
+        # blocks and holes must be written.
+        zeroed = volume_is_new and not backup['parent_id']
+        try:
+            self._restore_objects(backup, volume_id, volume_file, zeroed,
+                                  requested_backup, prefetcher)
+        finally:
+            prefetcher.cancel()
+        if not zeroed:
+            self._restore_holes(metadata.get('holes', []), volume_file)
+        LOG.debug('v1 volume backup restore of %s finished.',
+                  backup_id)
+
+    def _fetch_object(self, container, object_name, extra_metadata, obj):
+        """Read a backup object and return its decompressed contents."""
+        LOG.debug('restoring object. container: %(container)s, '
+                  'object name: %(object_name)s.',
+                  {'container': container, 'object_name': object_name})
+        with self._get_object_reader(
+                container, object_name,
+                extra_metadata=extra_metadata) as reader:
+            body = reader.read()
+        compression_algorithm = obj['compression']
+        decompressor = self._get_compressor(compression_algorithm)
+        if decompressor is not None:
+            LOG.debug('decompressing data using %s algorithm',
+                      compression_algorithm)
+            body = decompressor.decompress(body)
+        return obj, body
+
+    def _restore_objects(self, backup, volume_id, volume_file, volume_is_new,
+                         requested_backup, fetched_objects):
+        """Write already downloaded objects to the volume in order."""
+        status_refresher = _StatusRefresher(requested_backup,
+                                            self.status_check_interval)
+        for obj, body in fetched_objects:
             # Abort when status changes to error, available, or anything else
-            with requested_backup.as_read_deleted():
-                requested_backup.refresh()
+            status_refresher.refresh()
             if requested_backup.status != fields.BackupStatus.RESTORING:
                 raise exception.BackupRestoreCancel(back_id=backup.id,
                                                     vol_id=volume_id)
 
-            object_name, obj = list(metadata_object.items())[0]
-            LOG.debug('restoring object. backup: %(backup_id)s, '
-                      'container: %(container)s, object name: '
-                      '%(object_name)s, volume: %(volume_id)s.',
-                      {
-                          'backup_id': backup_id,
-                          'container': container,
-                          'object_name': object_name,
-                          'volume_id': volume_id,
-                      })
-
-            with self._get_object_reader(
-                    container, object_name,
-                    extra_metadata=extra_metadata) as reader:
-                body = reader.read()
-            compression_algorithm = metadata_object[object_name]['compression']
-            decompressor = self._get_compressor(compression_algorithm)
-            if decompressor is not None:
-                LOG.debug('decompressing data using %s algorithm',
-                          compression_algorithm)
-                decompressed = decompressor.decompress(body)
-                body = None  # Allow Python to free it
-                _write_volume(volume_is_new,
-                              volume_file, obj['offset'], decompressed)
-                decompressed = None  # Allow Python to free it
-            else:
-                _write_volume(volume_is_new,
-                              volume_file, obj['offset'], body)
-                body = None  # Allow Python to free it
+            _write_volume(volume_is_new, volume_file, obj['offset'], body)
+            body = None  # Allow Python to free it
 
             # force flush every write to avoid long blocking write on close
             volume_file.flush()
@@ -770,8 +1503,19 @@ class ChunkedBackupDriver(driver.BackupDriver, metaclass=abc.ABCMeta):
             # threads can run, allowing for among other things the service
             # status to be updated
             eventlet.sleep(0)
-        LOG.debug('v1 volume backup restore of %s finished.',
-                  backup_id)
+
+    def _restore_holes(self, holes, volume_file):
+        """Write zeroes to the ranges recorded as holes in the backup."""
+        zeroes = memoryview(bytes(units.Mi))
+        for offset, length in holes:
+            end = offset + length
+            while offset < end:
+                write_len = min(end - offset, len(zeroes))
+                _write_at(volume_file, offset, zeroes[:write_len])
+                offset += write_len
+                eventlet.sleep(0)
+        if holes:
+            volume_file.flush()
 
     def restore(self, backup, volume_id, volume_file, volume_is_new):
         """Restore the given volume backup from backup repository.
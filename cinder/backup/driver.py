@@ -45,6 +45,25 @@ CONF.register_opts(backup_opts)
 
 LOG = logging.getLogger(__name__)
 
+# IDs of the backups that this process is deleting, so drivers can stop a
+# backup that is still in progress without querying the database.
+_CANCELLED_BACKUPS = set()
+
+
+def cancel_backup(backup_id):
+    """Flag a backup as being deleted by this process."""
+    _CANCELLED_BACKUPS.add(backup_id)
+
+
+def clear_cancelled_backup(backup_id):
+    """Remove the cancellation flag set by cancel_backup."""
+    _CANCELLED_BACKUPS.discard(backup_id)
+
+
+def is_backup_cancelled(backup_id):
+    """Return whether this process is deleting the backup."""
+    return backup_id in _CANCELLED_BACKUPS
+
 
 class BackupMetadataAPI(base.Base):
 
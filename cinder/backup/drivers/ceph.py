@@ -334,7 +334,8 @@ class CephBackupDriver(driver.BackupDriver):
 
     @staticmethod
     def _disconnect_from_rados(client: 'rados.Rados',
-                               ioctx: 'rados.Ioctx') -> None:
+                               ioctx: 'rados.Ioctx',
+                               error: Optional[BaseException] = None) -> None:
         """Terminate connection with the backup Ceph cluster."""
         # closing an ioctx cannot raise an exception
         ioctx.close()
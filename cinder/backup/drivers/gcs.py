@@ -133,7 +133,7 @@ def gcs_logger(func):
         try:
             return func(self, *args, **kwargs)
         except errors.Error as err:
-            raise GCSApiFailure(reason=err)
+            raise GCSApiFailure(reason=err) from err
         except OAUTH_EXCEPTIONS as err:
             raise GCSOAuth2Failure(reason=err)
         except Exception as err:
@@ -275,6 +275,12 @@ class GoogleBackupDriver(chunkeddriver.ChunkedBackupDriver):
             bucket=bucket,
             object=object_name).execute(num_retries=self.num_retries)
 
+    def _is_object_not_found(self, exc):
+        # The exception wrapped in GCSApiFailure is only kept as its cause.
+        cause = exc.__cause__ if isinstance(exc, GCSApiFailure) else None
+        return (isinstance(cause, errors.HttpError) and
+                cause.resp.status == 404)
+
     def _generate_object_name_prefix(self, backup):
         """Generates a GCS backup object name prefix.
 
@@ -308,7 +314,7 @@ class GoogleObjectWriter(object):
         self.bucket = bucket
         self.object_name = object_name
         self.conn = conn
-        self.data = bytearray()
+        self.data = []
         self.chunk_size = writer_chunk_size
         self.num_retries = num_retries
         self.resumable = resumable
@@ -320,11 +326,19 @@ class GoogleObjectWriter(object):
         self.close()
 
     def write(self, data):
-        self.data += data
+        # Keep a reference instead of copying into a single buffer, callers
+        # don't modify the data until the writer has been closed.
+        self.data.append(data)
+
+    def _get_data(self):
+        if len(self.data) == 1:
+            return self.data[0]
+        return b''.join(self.data)
 
     @gcs_logger
     def close(self):
-        media = http.MediaIoBaseUpload(io.BytesIO(self.data),
+        data = self._get_data()
+        media = http.MediaIoBaseUpload(io.BytesIO(data),
                                        'application/octet-stream',
                                        chunksize=self.chunk_size,
                                        resumable=self.resumable)
@@ -334,7 +348,7 @@ class GoogleObjectWriter(object):
             body={},
             media_body=media).execute(num_retries=self.num_retries)
         etag = resp['md5Hash']
-        md5 = secretutils.md5(self.data, usedforsecurity=False).digest()
+        md5 = secretutils.md5(data, usedforsecurity=False).digest()
         md5 = md5.encode('utf-8')
         etag = bytes(etag, 'utf-8')
         md5 = base64.b64encode(md5)
@@ -157,7 +157,7 @@ def _wrap_exception(func):
         try:
             return func(*args, **kwargs)
         except boto_exc.ClientError as err:
-            raise S3ClientError(reason=err)
+            raise S3ClientError(reason=err) from err
         except Exception as err:
             raise S3ConnectionFailure(reason=err)
 
@@ -257,6 +257,13 @@ class S3BackupDriver(chunkeddriver.ChunkedBackupDriver):
             Bucket=bucket,
             Key=object_name)
 
+    def _is_object_not_found(self, exc):
+        # The exception wrapped in S3ClientError is only kept as its cause.
+        cause = exc.__cause__ if isinstance(exc, S3ClientError) else None
+        return (isinstance(cause, boto_exc.ClientError) and
+                cause.response.get('Error', {}).get('Code') in
+                ('404', 'NoSuchKey'))
+
     def _generate_object_name_prefix(self, backup):
         """Generates a S3 backup object name prefix.
 
@@ -310,7 +317,7 @@ class S3ObjectWriter(object):
         self.bucket = bucket
         self.object_name = object_name
         self.conn = conn
-        self.data = bytearray()
+        self.data = []
 
     def __enter__(self):
         return self
@@ -319,17 +326,25 @@ class S3ObjectWriter(object):
         self.close()
 
     def write(self, data):
-        self.data += data
+        # Keep a reference instead of copying into a single buffer, callers
+        # don't modify the data until the writer has been closed.
+        self.data.append(data)
+
+    def _get_data(self):
+        if len(self.data) == 1:
+            return self.data[0]
+        return b''.join(self.data)
 
     @_wrap_exception
     def close(self):
-        reader = io.BytesIO(self.data)
+        data = self._get_data()
+        reader = io.BytesIO(data)
         contentmd5 = base64.b64encode(
-            md5(self.data, usedforsecurity=False).digest()).decode('utf-8')
+            md5(data, usedforsecurity=False).digest()).decode('utf-8')
         put_args = {'Bucket': self.bucket,
                     'Body': reader,
                     'Key': self.object_name,
-                    'ContentLength': len(self.data)}
+                    'ContentLength': len(data)}
         if CONF.backup_s3_md5_validation:
             put_args['ContentMD5'] = contentmd5
         if (CONF.backup_s3_sse_customer_algorithm
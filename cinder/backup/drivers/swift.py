@@ -301,7 +301,7 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
             self.container = container
             self.object_name = object_name
             self.conn = conn
-            self.data = bytearray()
+            self.data = []
             self.headers_func = headers_func
 
         def __enter__(self):
@@ -311,19 +311,27 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
             self.close()
 
         def write(self, data):
-            self.data += data
+            # Keep a reference instead of copying into a single buffer, callers
+            # don't modify the data until the writer has been closed.
+            self.data.append(data)
+
+        def _get_data(self):
+            if len(self.data) == 1:
+                return self.data[0]
+            return b''.join(self.data)
 
         def close(self):
-            reader = io.BytesIO(self.data)
+            data = self._get_data()
+            reader = io.BytesIO(data)
             try:
                 headers = self.headers_func() if self.headers_func else None
                 etag = self.conn.put_object(self.container, self.object_name,
                                             reader,
-                                            content_length=len(self.data),
+                                            content_length=len(data),
                                             headers=headers)
             except socket.error as err:
                 raise exception.SwiftConnectionFailed(reason=err)
-            md5 = secretutils.md5(self.data, usedforsecurity=False).hexdigest()
+            md5 = secretutils.md5(data, usedforsecurity=False).hexdigest()
             if etag != md5:
                 err = _('error writing object to swift, MD5 of object in '
                         'swift %(etag)s is not the same as MD5 of object sent '
@@ -424,6 +432,10 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
             if err.http_status != 404:
                 raise
 
+    def _is_object_not_found(self, exc):
+        return (isinstance(exc, swift_exc.ClientException) and
+                exc.http_status == 404)
+
     def _generate_object_name_prefix(self, backup):
         """Generates a Swift backup object name prefix."""
         az = 'az_%s' % self.az
@@ -45,6 +45,7 @@ from oslo_utils import excutils
 from oslo_utils import importutils
 from oslo_utils import timeutils
 
+from cinder.backup import driver as backup_driver
 from cinder.backup import rpcapi as backup_rpcapi
 from cinder import context
 from cinder import exception
@@ -905,6 +906,9 @@ class BackupManager(manager.SchedulerDependentManager):
             raise exception.InvalidBackup(reason=err)
 
         if backup.service:
+            # Let a backup of this process that is still in progress know it
+            # has to stop, without it having to poll the database.
+            backup_driver.cancel_backup(backup.id)
             try:
                 backup_service = self.service(context)
                 backup_service.delete_backup(backup)
@@ -914,6 +918,8 @@ class BackupManager(manager.SchedulerDependentManager):
                     self.message_api.create_from_request_context(
                         context,
                         detail=message_field.Detail.BACKUP_DELETE_DRIVER_ERROR)
+            finally:
+                backup_driver.clear_cancelled_backup(backup.id)
 
         # Get reservations
         try:
@@ -208,7 +208,19 @@ class DbCommands(object):
 
     @args('age_in_days', type=int,
           help='Purge deleted rows older than age in days')
-    def purge(self, age_in_days: int) -> None:
+    @args('--batch-size', dest='batch_size', type=int, default=None,
+          help='Purge every table in transactions of at most this many '
+               'rows instead of in a single transaction')
+    @args('--sleep', dest='batch_sleep', type=float, default=0,
+          help='Seconds to sleep between batches, with --batch-size')
+    @args('--workers', type=int, default=1,
+          help='Number of tables purged at the same time, with '
+               '--batch-size')
+    def purge(self,
+              age_in_days: int,
+              batch_size: Optional[int] = None,
+              batch_sleep: float = 0,
+              workers: int = 1) -> None:
         """Purge deleted rows older than a given age from cinder tables."""
         age_in_days = int(age_in_days)
         if age_in_days < 0:
@@ -217,10 +229,23 @@ class DbCommands(object):
         if age_in_days >= (int(time.time()) / 86400):
             print(_("Maximum age is count of days since epoch."))
             sys.exit(1)
+        if batch_size is not None and batch_size < 1:
+            print(_("Must supply a positive value for batch size"))
+            sys.exit(1)
+        if batch_sleep < 0 or workers < 1:
+            print(_("Sleep can't be negative and there must be at least one "
+                    "worker"))
+            sys.exit(1)
         ctxt = context.get_admin_context()
 
+        def progress(table: str, rows: int) -> None:
+            print(_('Purged %(rows)d rows from %(table)s') %
+                  {'rows': rows, 'table': table})
+
         try:
-            db.purge_deleted_rows(ctxt, age_in_days)
+            db.purge_deleted_rows(ctxt, age_in_days, batch_size=batch_size,
+                                  batch_sleep=batch_sleep, workers=workers,
+                                  progress=progress if batch_size else None)
         except db_exc.DBReferenceError:
             print(_("Purge command failed, check cinder-manage "
                     "logs for more details."))
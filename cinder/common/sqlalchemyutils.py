@@ -55,11 +55,31 @@ def _get_default_column_value(model, column_name):
     return _TYPE_SCHEMA[attr_type.__visit_name__]
 
 
+def keyset_sortable(model, sort_keys):
+    """Return whether the model rows always have values for the sort keys.
+
+    Keyset pagination compares the sort keys directly, so rows with NULL
+    values would be skipped.  Columns that can't be NULL or have a default
+    are considered to always have values.
+    """
+    for sort_key in sort_keys:
+        attr = getattr(model, sort_key, None)
+        if attr is None or not api.is_orm_value(attr):
+            return False
+        columns = getattr(attr.property, 'columns', None)
+        if not columns:
+            return False
+        if columns[0].nullable and columns[0].default is None:
+            return False
+    return True
+
+
 # TODO(wangxiyuan): Use oslo_db.sqlalchemy.utils.paginate_query once it is
 # stable and afforded by the minimum version in requirement.txt.
 # copied from glance/db/sqlalchemy/api.py
 def paginate_query(query, model, limit, sort_keys, marker=None,
-                   sort_dir=None, sort_dirs=None, offset=None):
+                   sort_dir=None, sort_dirs=None, offset=None,
+                   marker_query=None):
     """Returns a query with sorting / pagination criteria added.
 
     Pagination works by requiring a unique sort_key, specified by sort_keys.
@@ -87,6 +107,11 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
     :param sort_dirs: per-column array of sort_dirs, corresponding to sort_keys
     :param offset: the number of items to skip from the marker or from the
                     first element.
+    :param marker_query: query returning the marker row, used instead of
+                    marker for keyset pagination.  The marker's sort values
+                    are then selected by subqueries of the returned query and
+                    compared with the sort keys without the NULL handling, so
+                    the sort keys must satisfy keyset_sortable.
 
     :rtype: sqlalchemy.orm.query.Query
     :return: The query with sorting/pagination added.
@@ -128,7 +153,10 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
         query = query.order_by(sort_dir_func(sort_key_attr))
 
     # Add pagination
-    if marker is not None:
+    if marker_query is not None:
+        query = query.filter(
+            _keyset_criteria(model, sort_keys, sort_dirs, marker_query))
+    elif marker is not None:
         marker_values = []
         for sort_key in sort_keys:
             v = getattr(marker, sort_key)
@@ -176,3 +204,32 @@ def paginate_query(query, model, limit, sort_keys, marker=None,
         query = query.offset(offset)
 
     return query
+
+
+def _keyset_criteria(model, sort_keys, sort_dirs, marker_query):
+    """Return the criteria of the rows after the marker row.
+
+    The same lexicographical ordering as paginate_query, plus a bound on the
+    first sort key alone that makes the index range to scan explicit.
+    """
+    attrs = [getattr(model, sort_key) for sort_key in sort_keys]
+    marker_values = [marker_query.with_entities(attr).scalar_subquery()
+                     for attr in attrs]
+    criteria_list = []
+    for i, (attr, sort_dir) in enumerate(zip(attrs, sort_dirs)):
+        crit_attrs = [attrs[j] == marker_values[j] for j in range(i)]
+        if sort_dir == 'desc':
+            crit_attrs.append(attr < marker_values[i])
+        elif sort_dir == 'asc':
+            crit_attrs.append(attr > marker_values[i])
+        else:
+            raise ValueError(_("Unknown sort direction, "
+                               "must be 'desc' or 'asc'"))
+        criteria_list.append(sqlalchemy.sql.and_(*crit_attrs))
+
+    if sort_dirs[0] == 'desc':
+        first_bound = attrs[0] <= marker_values[0]
+    else:
+        first_bound = attrs[0] >= marker_values[0]
+    return sqlalchemy.sql.and_(first_bound,
+                               sqlalchemy.sql.or_(*criteria_list))
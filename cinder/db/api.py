@@ -51,6 +51,15 @@ db_opts = [
     cfg.StrOpt('snapshot_name_template',
                default='snapshot-%s',
                help='Template string to be used to generate snapshot names'),
+    cfg.BoolOpt('keyset_pagination',
+                default=False,
+                help='Page volume, snapshot and backup listings by comparing '
+                     'the sort keys with the values of the marker in the '
+                     'listing query itself, instead of fetching the marker '
+                     'first, so the created_at indexes can be used. It only '
+                     'applies when all the sort keys are columns that are '
+                     'never NULL or have a default, like the default '
+                     'created_at and id.'),
 ]
 
 backup_opts = [
@@ -423,6 +432,11 @@ def volume_data_get_for_host(context, host, count_only=False):
                                          count_only)
 
 
+def volume_count_get_for_hosts(context, hosts):
+    """Get a dictionary with the volume count of each of the hosts."""
+    return IMPL.volume_count_get_for_hosts(context, hosts)
+
+
 def volume_data_get_for_project(context, project_id, host=None):
     """Get (volume_count, gigabytes) for project."""
     return IMPL.volume_data_get_for_project(context, project_id, host=host)
@@ -504,6 +518,17 @@ def volumes_update(context, values_list):
     return IMPL.volumes_update(context, values_list)
 
 
+def volumes_provider_id_update(context, provider_ids, batch_size=1000):
+    """Set the provider_id of many volumes with bulk updates.
+
+    provider_ids maps volume ids to their new provider_id.  The volumes are
+    updated in transactions of at most batch_size volumes, volumes that
+    don't exist or are deleted are skipped.
+    """
+    return IMPL.volumes_provider_id_update(context, provider_ids,
+                                           batch_size=batch_size)
+
+
 def volume_include_in_cluster(context, cluster, partial_rename=True,
                               **filters):
     """Include all volumes matching the filters into a cluster.
@@ -669,6 +694,17 @@ def snapshot_update(context, snapshot_id, values):
     return IMPL.snapshot_update(context, snapshot_id, values)
 
 
+def snapshots_provider_id_update(context, provider_ids, batch_size=1000):
+    """Set the provider_id of many snapshots with bulk updates.
+
+    provider_ids maps snapshot ids to their new provider_id.  The snapshots
+    are updated in transactions of at most batch_size snapshots, snapshots
+    that don't exist or are deleted are skipped.
+    """
+    return IMPL.snapshots_provider_id_update(context, provider_ids,
+                                             batch_size=batch_size)
+
+
 def snapshot_data_get_for_project(context, project_id, volume_type_id=None,
                                   host=None):
     """Get count and gigabytes used for snapshots for specified project."""
@@ -1334,6 +1370,24 @@ def reservation_rollback(context, reservations, project_id=None):
                                      project_id=project_id)
 
 
+def quota_reserve_atomic(context, resources, quotas, deltas, expire,
+                         until_refresh, max_age, project_id=None):
+    """Check quotas and create reservations without locking the usages."""
+    return IMPL.quota_reserve_atomic(context, resources, quotas, deltas,
+                                     expire, until_refresh, max_age,
+                                     project_id=project_id)
+
+
+def reservation_commit_atomic(context, reservations):
+    """Commit quota reservations without locking the usages."""
+    return IMPL.reservation_commit_atomic(context, reservations)
+
+
+def reservation_rollback_atomic(context, reservations):
+    """Roll back quota reservations without locking the usages."""
+    return IMPL.reservation_rollback_atomic(context, reservations)
+
+
 def quota_destroy_by_project(context, project_id):
     """Destroy all quotas associated with a given project."""
     return IMPL.quota_destroy_by_project(context, project_id)
@@ -1779,13 +1833,22 @@ def group_snapshot_creating_from_src():
 ###################
 
 
-def purge_deleted_rows(context, age_in_days):
+def purge_deleted_rows(context, age_in_days, batch_size=None, batch_sleep=0,
+                       workers=1, progress=None):
     """Purge deleted rows older than given age from cinder tables
 
+    With a batch_size the rows are deleted in transactions of at most that
+    many rows, sleeping batch_sleep seconds between them, and up to workers
+    tables are purged at the same time.  progress is called with the table
+    name and the number of rows purged from it after every batch.
+
     Raises InvalidParameterValue if age_in_days is incorrect.
     :returns: number of deleted rows
     """
-    return IMPL.purge_deleted_rows(context, age_in_days=age_in_days)
+    return IMPL.purge_deleted_rows(context, age_in_days=age_in_days,
+                                   batch_size=batch_size,
+                                   batch_sleep=batch_sleep, workers=workers,
+                                   progress=progress)
 
 
 def get_booleans_for_table(table_name):
@@ -0,0 +1,53 @@
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Add created_at indexes
+
+Revision ID: 4224b69ac391
+Revises: 9c74c1c6971f
+Create Date: 2026-10-18 17:02:11.304412
+"""
+
+from alembic import op
+from oslo_db.sqlalchemy import utils
+from oslo_log import log as logging
+
+
+LOG = logging.getLogger(__name__)
+
+
+# revision identifiers, used by Alembic.
+revision = '4224b69ac391'
+down_revision = '9c74c1c6971f'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('volumes', 'volumes_deleted_created_at_id_idx',
+     ('deleted', 'created_at', 'id')),
+    ('snapshots', 'snapshots_deleted_created_at_id_idx',
+     ('deleted', 'created_at', 'id')),
+    ('backups', 'backups_deleted_created_at_id_idx',
+     ('deleted', 'created_at', 'id')),
+)
+
+
+def upgrade():
+    conn = op.get_bind()
+    is_mysql = conn.dialect.name == 'mysql'
+
+    for table, idx_name, fields in INDEXES:
+        # Skip creation in mysql if it already has the index
+        if is_mysql and utils.index_exists(conn, table, idx_name):
+            LOG.info('Skipping index %s, already exists', idx_name)
+        else:
+            op.create_index(idx_name, table, fields)
@@ -36,11 +36,13 @@ these objects be simple dictionaries.
 
 import collections
 from collections import abc
+from concurrent import futures
 import datetime as dt
 import functools
 import itertools
 import re
 import sys
+import time
 import uuid
 
 from oslo_config import cfg
@@ -1508,14 +1510,17 @@ def _reservation_create(
 # on reservations.
 
 
-def _get_quota_usages(context, project_id, resources=None):
+def _get_quota_usages(context, project_id, resources=None, lock=True):
     # Broken out for testability
     query = model_query(
         context, models.QuotaUsage, read_deleted="no"
     ).filter_by(project_id=project_id)
     if resources:
         query = query.filter(models.QuotaUsage.resource.in_(list(resources)))
-    rows = query.order_by(models.QuotaUsage.id.asc()).with_for_update().all()
+    query = query.order_by(models.QuotaUsage.id.asc())
+    if lock:
+        query = query.with_for_update()
+    rows = query.all()
 
     return {row.resource: row for row in rows}
 
@@ -1852,6 +1857,241 @@ def reservation_rollback(context, reservations, project_id=None):
         reservation.delete(context.session)
 
 
+# NOTE: The *_atomic quota functions below don't lock the quota_usages rows.
+# Every change to a usage is a single UPDATE that computes the new value in
+# the database, and the quota check is part of the UPDATE's WHERE clause, so
+# concurrent reservations for the same project don't wait on each other's row
+# locks for the whole transaction.  They can be mixed with the locking
+# functions above.
+
+
+def _quota_usage_update(context, usage_id, values, *conditions):
+    """Update a quota usage and return whether the conditions held."""
+    query = model_query(
+        context, models.QuotaUsage, read_deleted="no"
+    ).filter_by(id=usage_id)
+    if conditions:
+        query = query.filter(*conditions)
+    return bool(query.update(values, synchronize_session=False))
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(
+    max_retries=5, retry_on_deadlock=True, exception_checker=_is_duplicate
+)
+@main_context_manager.writer
+def quota_reserve_atomic(
+    context,
+    resources,
+    quotas,
+    deltas,
+    expire,
+    until_refresh,
+    max_age,
+    project_id=None,
+):
+    elevated = context.elevated()
+
+    if project_id is None:
+        project_id = context.project_id
+
+    usages = _get_quota_usages(
+        context, project_id, resources=deltas.keys(), lock=False
+    )
+
+    # Create missing rows calculating current values.  If another request
+    # creates the same rows first we get a DBDuplicateEntry exception and
+    # the wrap_db_retry decorator retries with the rows that now exist.
+    missing = [res for res in deltas if res not in usages]
+    for resource in missing:
+        updates = _get_sync_updates(
+            elevated,
+            project_id,
+            resources,
+            resource,
+        )
+        usages[resource] = _quota_usage_create(
+            elevated,
+            project_id,
+            resource,
+            updates[resource],
+            0,
+            until_refresh or None,
+        )
+
+    # Like quota_reserve, keep the new rows even if we are over quota.
+    if missing:
+        context.session.commit()
+        context.session.begin()
+
+    # Handle usage refresh, deciding it on the values we have read.  The
+    # rows are only changed with UPDATE statements, so the values read are
+    # kept apart instead of being set on the rows.
+    in_use = {}
+    for resource in deltas:
+        usage = usages[resource]
+        in_use[resource] = usage.in_use
+        res_until = usage.until_refresh
+        if res_until is not None:
+            res_until -= 1
+
+        if (
+            usage.in_use < 0
+            or (res_until is not None and res_until <= 0)
+            or (
+                res_until is None
+                and max_age
+                and usage.updated_at is not None
+                and (timeutils.utcnow() - usage.updated_at).total_seconds()
+                >= max_age
+            )
+        ):
+            updates = _get_sync_updates(
+                elevated,
+                project_id,
+                resources,
+                resource,
+            )
+            in_use[resource] = updates[resource]
+            _quota_usage_update(
+                context,
+                usage.id,
+                {'in_use': updates[resource],
+                 'until_refresh': until_refresh or None},
+            )
+            continue
+
+        if (res_until is None and until_refresh) or (
+            (res_until or 0) > (until_refresh or 0)
+        ):
+            res_until = until_refresh or None
+        if res_until != usage.until_refresh:
+            _quota_usage_update(
+                context, usage.id, {'until_refresh': res_until}
+            )
+
+    # Check for deltas that would go negative
+    unders = [
+        r
+        for r, delta in deltas.items()
+        if delta < 0 and delta + in_use[r] < 0
+    ]
+
+    # Reserve the positive deltas, each one with an UPDATE that only changes
+    # the row if the quota allows it.  A zero delta is checked the same way,
+    # with an UPDATE that changes nothing, so it sees the reservations made
+    # concurrently instead of the values we have read.
+    model = models.QuotaUsage
+    overs = []
+    for resource, delta in deltas.items():
+        if delta < 0 or (delta == 0 and quotas[resource] < 0):
+            continue
+        conditions = []
+        if quotas[resource] >= 0:
+            conditions.append(
+                model.in_use + model.reserved + delta <= quotas[resource]
+            )
+        if not _quota_usage_update(
+            context,
+            usages[resource].id,
+            {'reserved': model.reserved + delta},
+            *conditions,
+        ):
+            overs.append(resource)
+
+    if unders:
+        LOG.warning(
+            "Reservation would make usage less than 0 for the "
+            "following resources, so on commit they will be "
+            "limited to prevent going below 0: %s",
+            unders,
+        )
+    if overs:
+        # Raising rolls back the reservations made above
+        usages = {
+            k: dict(in_use=in_use[k], reserved=v.reserved)
+            for k, v in usages.items()
+        }
+        raise exception.OverQuota(
+            overs=sorted(overs), quotas=quotas, usages=usages
+        )
+
+    reservations = []
+    for resource, delta in deltas.items():
+        reservation = _reservation_create(
+            elevated,
+            str(uuid.uuid4()),
+            usages[resource],
+            project_id,
+            resource,
+            delta,
+            expire,
+        )
+        reservations.append(reservation.uuid)
+
+    return reservations
+
+
+def _claim_reservations(context, reservations):
+    """Delete the reservations and return the ones this call deleted.
+
+    A reservation is only returned if it was still there when deleting it,
+    so it is never applied twice by concurrent commits, rollbacks or
+    expirations.
+    """
+    rows = (
+        model_query(context, models.Reservation, read_deleted="no")
+        .filter(models.Reservation.uuid.in_(reservations))
+        .all()
+    )
+    values = models.Reservation.delete_values()
+    values['updated_at'] = models.Reservation.updated_at
+    return [
+        row
+        for row in rows
+        if model_query(context, models.Reservation, read_deleted="no")
+        .filter_by(id=row.id)
+        .update(values, synchronize_session=False)
+    ]
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def reservation_commit_atomic(context, reservations):
+    usage = models.QuotaUsage
+    for reservation in _claim_reservations(context, reservations):
+        delta = reservation.delta
+        # For negative deltas make sure we never go into negative usage
+        values = {
+            'in_use': sa.case(
+                (usage.in_use + delta < 0, 0), else_=usage.in_use + delta
+            ),
+        }
+        if delta >= 0:
+            values['reserved'] = sa.case(
+                (usage.reserved < delta, 0), else_=usage.reserved - delta
+            )
+        _quota_usage_update(context, reservation.usage_id, values)
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@main_context_manager.writer
+def reservation_rollback_atomic(context, reservations):
+    usage = models.QuotaUsage
+    for reservation in _claim_reservations(context, reservations):
+        delta = reservation.delta
+        if delta >= 0:
+            _quota_usage_update(
+                context,
+                reservation.usage_id,
+                {'reserved': sa.case(
+                    (usage.reserved < delta, 0), else_=usage.reserved - delta
+                )},
+            )
+
+
 @require_context
 def quota_destroy_by_project(context, project_id):
     """Destroy all limit quotas associated with a project.
@@ -2054,6 +2294,45 @@ def volume_data_get_for_host(context, host, count_only=False):
         return (result[0] or 0, result[1] or 0)
 
 
+@require_admin_context
+@main_context_manager.reader
+def volume_count_get_for_hosts(context, hosts):
+    """Count the volumes of several hosts with a single grouped query.
+
+    Each host counts its volumes like volume_data_get_for_host does, so a
+    backend also counts the volumes of its pools.
+    """
+    hosts = set(hosts)
+    if not hosts:
+        return {}
+
+    host_attr = models.Volume.host
+    conditions = [host_attr.in_(hosts)]
+    conditions.extend(host_attr.op('LIKE')(host + '#%') for host in hosts)
+    rows = (
+        model_query(
+            context, host_attr, func.count(models.Volume.id),
+            read_deleted="no",
+        )
+        .filter(or_(*conditions))
+        .group_by(host_attr)
+        .all()
+    )
+
+    counts = dict.fromkeys(hosts, 0)
+    for volume_host, count in rows:
+        if volume_host in counts:
+            counts[volume_host] += count
+        # Add the volumes of a pool to every host it belongs to.
+        index = volume_host.find('#')
+        while index != -1:
+            prefix = volume_host[:index]
+            if prefix in counts:
+                counts[prefix] += count
+            index = volume_host.find('#', index + 1)
+    return counts
+
+
 @require_admin_context
 def _volume_data_get_for_project(
     context,
@@ -2740,7 +3019,7 @@ def volume_get_all(
     # No volumes would match, return empty list
     if query is None:
         return []
-    return query.all()
+    return _paginate_all(context, query, marker, models.Volume)
 
 
 @require_context
@@ -2917,7 +3196,7 @@ def volume_get_all_by_project(
     # No volumes would match, return empty list
     if query is None:
         return []
-    return query.all()
+    return _paginate_all(context, query, marker, models.Volume)
 
 
 def _generate_paginate_query(
@@ -2965,8 +3244,17 @@ def _generate_paginate_query(
             return None
 
     marker_object = None
+    marker_query = None
     if marker is not None:
-        marker_object = get(context, marker)
+        if _use_keyset_pagination(paginate_type, sort_keys):
+            # The sort values of the marker are selected by subqueries of the
+            # listing query, the caller checks that the marker exists with
+            # _paginate_all when the page is empty.
+            marker_query = model_query(
+                context, paginate_type, project_only=True
+            ).filter(paginate_type.id == marker)
+        else:
+            marker_object = get(context, marker)
 
     return sqlalchemyutils.paginate_query(
         query,
@@ -2976,9 +3264,39 @@ def _generate_paginate_query(
         marker=marker_object,
         sort_dirs=sort_dirs,
         offset=offset,
+        marker_query=marker_query,
     )
 
 
+KEYSET_PAGINATION_MODELS = (models.Volume, models.Snapshot, models.Backup)
+
+
+def _use_keyset_pagination(paginate_type, sort_keys):
+    return (
+        CONF.keyset_pagination
+        and paginate_type in KEYSET_PAGINATION_MODELS
+        and sqlalchemyutils.keyset_sortable(paginate_type, sort_keys)
+    )
+
+
+def _paginate_all(context, query, marker, paginate_type):
+    """Return all the rows of a query made by _generate_paginate_query.
+
+    An empty page may come from a marker that doesn't exist when keyset
+    pagination is used, in which case the not found exception is raised like
+    when the marker is fetched beforehand.
+    """
+    result = query.all()
+    if (
+        not result
+        and marker is not None
+        and CONF.keyset_pagination
+        and paginate_type in KEYSET_PAGINATION_MODELS
+    ):
+        PAGINATION_HELPERS[paginate_type][2](context, marker)
+    return result
+
+
 @main_context_manager.reader
 def calculate_resource_count(context, resource_type, filters):
     """Calculate total count with filters applied"""
@@ -3253,6 +3571,41 @@ def volumes_update(context, values_list):
     return volume_refs
 
 
+@main_context_manager.writer
+def _provider_id_update(context, model, provider_ids):
+    table = model.__table__
+    stmt = (
+        table.update()
+        .where(table.c.id == bindparam('_id'))
+        .where(table.c.deleted == sql.false())
+        .values(provider_id=bindparam('_provider_id'))
+    )
+    context.session.execute(
+        stmt,
+        [
+            {'_id': resource_id, '_provider_id': provider_id}
+            for resource_id, provider_id in provider_ids
+        ],
+    )
+
+
+def _provider_id_update_in_batches(context, model, provider_ids, batch_size):
+    """Update provider_ids with one executemany UPDATE per batch."""
+    provider_ids = list(provider_ids.items())
+    for start in range(0, len(provider_ids), batch_size):
+        _provider_id_update(
+            context, model, provider_ids[start:start + batch_size]
+        )
+
+
+@handle_db_data_error
+@require_context
+def volumes_provider_id_update(context, provider_ids, batch_size=1000):
+    _provider_id_update_in_batches(
+        context, models.Volume, provider_ids, batch_size
+    )
+
+
 @require_context
 @main_context_manager.writer
 def volume_attachment_update(context, attachment_id, values):
@@ -3813,7 +4166,7 @@ def snapshot_get_all(
     # No snapshots would match, return empty list
     if not query:
         return []
-    return query.all()
+    return _paginate_all(context, query, marker, models.Snapshot)
 
 
 def _snaps_get_query(
@@ -4041,7 +4394,7 @@ def snapshot_get_all_by_project(
         return []
 
     query = query.options(joinedload(models.Snapshot.snapshot_metadata))
-    return query.all()
+    return _paginate_all(context, query, marker, models.Snapshot)
 
 
 @require_context
@@ -4123,6 +4476,14 @@ def snapshot_update(context, snapshot_id, values):
         raise exception.SnapshotNotFound(snapshot_id=snapshot_id)
 
 
+@handle_db_data_error
+@require_context
+def snapshots_provider_id_update(context, provider_ids, batch_size=1000):
+    _provider_id_update_in_batches(
+        context, models.Snapshot, provider_ids, batch_size
+    )
+
+
 @require_context
 @main_context_manager.reader
 def get_snapshot_summary(context, project_only, filters=None):
@@ -6372,7 +6733,7 @@ def _backup_get_all(
     )
     if query is None:
         return []
-    return query.all()
+    return _paginate_all(context, query, marker, models.Backup)
 
 
 def _backups_get_query(context, project_only=False, joined_load=True):
@@ -8043,9 +8404,26 @@ def group_snapshot_creating_from_src():
 
 
 @require_admin_context
-@main_context_manager.writer
-def purge_deleted_rows(context, age_in_days):
-    """Purge deleted rows older than age from cinder tables."""
+def purge_deleted_rows(
+    context,
+    age_in_days,
+    batch_size=None,
+    batch_sleep=0,
+    workers=1,
+    progress=None,
+):
+    """Purge deleted rows older than age from cinder tables.
+
+    Without a batch_size all the tables are purged in a single transaction.
+    With one, every table is purged in transactions of at most batch_size
+    rows, deleted by ranges of their primary key, sleeping batch_sleep
+    seconds between them.  Up to workers tables are then purged at the same
+    time, always after the tables with foreign keys to them.  After every
+    batch progress is called, if given, with the table name and the number
+    of rows purged from it so far.
+
+    :returns: number of purged rows
+    """
     try:
         age_in_days = int(age_in_days)
     except ValueError:
@@ -8056,37 +8434,92 @@ def purge_deleted_rows(context, age_in_days):
     engine = get_engine()
     metadata = MetaData()
     metadata.reflect(engine)
+    tables = [
+        table
+        for table in reversed(metadata.sorted_tables)
+        if 'deleted' in table.columns.keys()
+    ]
+    deleted_age = timeutils.utcnow() - dt.timedelta(days=age_in_days)
+
+    if not batch_size:
+        return _purge_deleted_rows(context, tables, age_in_days, deleted_age)
+
+    def purge_table(table):
+        # Every thread needs its own context, the transaction is kept in it.
+        return _purge_table_in_batches(
+            context.elevated(),
+            table,
+            age_in_days,
+            deleted_age,
+            batch_size,
+            batch_sleep,
+            progress,
+        )
+
+    if workers <= 1:
+        return sum(purge_table(table) for table in tables)
+
+    rows_purged = 0
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for wave in _purge_waves(tables):
+            rows_purged += sum(executor.map(purge_table, wave))
+    return rows_purged
 
-    for table in reversed(metadata.sorted_tables):
-        if 'deleted' not in table.columns.keys():
-            continue
 
+def _purge_waves(tables):
+    """Split the tables in groups that can be purged at the same time.
+
+    A table is only in a group after all the tables with foreign keys to it,
+    so their rows referencing it are purged first.
+    """
+    children = {
+        table: {
+            other
+            for other in tables
+            if other is not table
+            and any(fk.column.table.name == table.name
+                    for fk in other.foreign_keys)
+        }
+        for table in tables
+    }
+    remaining = list(tables)
+    while remaining:
+        wave = [table for table in remaining
+                if not children[table].intersection(remaining)]
+        remaining = [table for table in remaining if table not in wave]
+        yield wave
+
+
+def _purge_conditions(table, deleted_age):
+    """Return the conditions of every purge pass over the table."""
+    condition = and_(
+        table.columns.deleted.is_(True),
+        table.c.deleted_at < deleted_age,
+    )
+    # Delete child records first from quality_of_service_specs
+    # table to avoid FK constraints
+    if str(table) == 'quality_of_service_specs':
+        return [and_(condition, table.c.specs_id.isnot(None)), condition]
+    return [condition]
+
+
+@main_context_manager.writer
+def _purge_deleted_rows(context, tables, age_in_days, deleted_age):
+    rows_purged = 0
+    for table in tables:
         LOG.info(
             'Purging deleted rows older than age=%(age)d days '
             'from table=%(table)s',
             {'age': age_in_days, 'table': table},
         )
 
-        deleted_age = timeutils.utcnow() - dt.timedelta(days=age_in_days)
+        table_rows_purged = 0
         try:
-            # Delete child records first from quality_of_service_specs
-            # table to avoid FK constraints
-            if str(table) == 'quality_of_service_specs':
-                context.session.query(models.QualityOfServiceSpecs).filter(
-                    and_(
-                        models.QualityOfServiceSpecs.specs_id.isnot(None),
-                        models.QualityOfServiceSpecs.deleted.is_(True),
-                        models.QualityOfServiceSpecs.deleted_at < deleted_age,
-                    )
-                ).delete()
-            result = context.session.execute(
-                table.delete().where(
-                    and_(
-                        table.columns.deleted.is_(True),
-                        table.c.deleted_at < deleted_age,
-                    )
+            for condition in _purge_conditions(table, deleted_age):
+                result = context.session.execute(
+                    table.delete().where(condition)
                 )
-            )
+                table_rows_purged += result.rowcount
         except db_exc.DBReferenceError as ex:
             LOG.error(
                 'DBError detected when purging from %(tablename)s: %(error)s.',
@@ -8094,12 +8527,84 @@ def purge_deleted_rows(context, age_in_days):
             )
             raise
 
-        rows_purged = result.rowcount
-        if rows_purged != 0:
+        if table_rows_purged != 0:
             LOG.info(
                 'Deleted %(row)d rows from table=%(table)s',
-                {'row': rows_purged, 'table': table},
+                {'row': table_rows_purged, 'table': table},
             )
+        rows_purged += table_rows_purged
+    return rows_purged
+
+
+def _purge_table_in_batches(
+    context,
+    table,
+    age_in_days,
+    deleted_age,
+    batch_size,
+    batch_sleep,
+    progress,
+):
+    LOG.info(
+        'Purging deleted rows older than age=%(age)d days '
+        'from table=%(table)s in batches of %(batch)d rows',
+        {'age': age_in_days, 'table': table, 'batch': batch_size},
+    )
+    pk_columns = list(table.primary_key.columns)
+    rows_purged = 0
+    for condition in _purge_conditions(table, deleted_age):
+        last_key = None
+        more = True
+        while more:
+            if rows_purged and batch_sleep:
+                time.sleep(batch_sleep)
+
+            try:
+                with main_context_manager.writer.using(context):
+                    if len(pk_columns) != 1:
+                        # Only ranges of single column keys are supported
+                        more = False
+                        result = context.session.execute(
+                            table.delete().where(condition)
+                        )
+                    else:
+                        pk = pk_columns[0]
+                        batch_condition = condition
+                        if last_key is not None:
+                            batch_condition = and_(condition, pk > last_key)
+                        keys = context.session.execute(
+                            sa.select(pk)
+                            .where(batch_condition)
+                            .order_by(pk)
+                            .limit(batch_size)
+                        ).scalars().all()
+                        if not keys:
+                            break
+                        more = len(keys) == batch_size
+                        last_key = keys[-1]
+                        result = context.session.execute(
+                            table.delete().where(
+                                and_(batch_condition, pk <= last_key)
+                            )
+                        )
+            except db_exc.DBReferenceError as ex:
+                LOG.error(
+                    'DBError detected when purging from %(tablename)s: '
+                    '%(error)s.',
+                    {'tablename': table, 'error': ex},
+                )
+                raise
+
+            rows_purged += result.rowcount
+            if progress:
+                progress(str(table), rows_purged)
+
+    if rows_purged != 0:
+        LOG.info(
+            'Deleted %(row)d rows from table=%(table)s',
+            {'row': rows_purged, 'table': table},
+        )
+    return rows_purged
 
 
 ###############################
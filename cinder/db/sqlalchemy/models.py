@@ -320,6 +320,9 @@ class Volume(BASE, CinderBase):
         # Speed up service start, create volume from image when using direct
         # urls, host REST API, and the cinder-manage update host cmd
         sa.Index('volumes_deleted_host_idx', 'deleted', 'host'),
+        # Speed up listings in the default sort order
+        sa.Index('volumes_deleted_created_at_id_idx',
+                 'deleted', 'created_at', 'id'),
         CinderBase.__table_args__,
     )
 
@@ -904,6 +907,9 @@ class Snapshot(BASE, CinderBase):
     __table_args__ = (
         # Speed up normal listings
         sa.Index('snapshots_deleted_project_id_idx', 'deleted', 'project_id'),
+        # Speed up listings in the default sort order
+        sa.Index('snapshots_deleted_created_at_id_idx',
+                 'deleted', 'created_at', 'id'),
         CinderBase.__table_args__,
     )
 
@@ -1011,6 +1017,9 @@ class Backup(BASE, CinderBase):
     __table_args__ = (
         # Speed up normal listings
         sa.Index('backups_deleted_project_id_idx', 'deleted', 'project_id'),
+        # Speed up listings in the default sort order
+        sa.Index('backups_deleted_created_at_id_idx',
+                 'deleted', 'created_at', 'id'),
         CinderBase.__table_args__,
     )
 
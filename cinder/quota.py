@@ -68,7 +68,11 @@ quota_opts = [
                help='Number of seconds between subsequent usage refreshes'),
     cfg.StrOpt('quota_driver',
                default="cinder.quota.DbQuotaDriver",
-               help='Default driver to use for quota checks'),
+               help='Default driver to use for quota checks. '
+                    'cinder.quota.AtomicDbQuotaDriver reserves quotas with '
+                    'conditional updates of the usages instead of locking '
+                    'them, so concurrent reservations of a project don\'t '
+                    'wait on each other.'),
     cfg.BoolOpt('use_default_quota_class',
                 default=True,
                 help='Enables or disables use of default quota class '
@@ -439,6 +443,36 @@ class DbQuotaDriver(object):
         db.reservation_expire(context)
 
 
+class AtomicDbQuotaDriver(DbQuotaDriver):
+    """Driver that reserves quotas without locking the usages.
+
+    Every usage is changed with a single UPDATE whose WHERE clause checks the
+    quota, so concurrent reservations for the same project don't serialize
+    on the row locks of the usages.
+    """
+
+    def _reserve(self, context, resources, quotas, deltas, expire, project_id):
+        return db.quota_reserve_atomic(context, resources, quotas, deltas,
+                                       expire, CONF.until_refresh,
+                                       CONF.max_age, project_id=project_id)
+
+    def commit(self, context, reservations, project_id=None):
+        """Commit reservations.
+
+        project_id is only accepted for compatibility with DbQuotaDriver,
+        the reservations are found by their UUIDs and no usages are locked.
+        """
+        db.reservation_commit_atomic(context, reservations)
+
+    def rollback(self, context, reservations, project_id=None):
+        """Roll back reservations.
+
+        project_id is only accepted for compatibility with DbQuotaDriver,
+        the reservations are found by their UUIDs and no usages are locked.
+        """
+        db.reservation_rollback_atomic(context, reservations)
+
+
 class BaseResource(object):
     """Describe a single resource for quota checking."""
 
@@ -21,6 +21,7 @@ from typing import Iterable
 from oslo_log import log as logging
 
 from cinder.scheduler import base_handler
+from cinder.scheduler import stats
 
 LOG = logging.getLogger(__name__)
 
@@ -108,8 +109,11 @@ class BaseFilterHandler(base_handler.BaseHandler):
             filter_class = filter_cls()
 
             if filter_class.run_filter_for_index(index):
+                start = stats.STATS.start()
                 objs = filter_class.filter_all(list_objs, filter_properties)
                 if objs is None:
+                    stats.STATS.record('filter', cls_name, start,
+                                       start_count, 0)
                     LOG.info("Filter %s returned 0 hosts", cls_name)
                     full_filter_results.append((cls_name, None))
                     list_objs = None
@@ -117,6 +121,8 @@ class BaseFilterHandler(base_handler.BaseHandler):
 
                 list_objs = list(objs)
                 end_count = len(list_objs)
+                stats.STATS.record('filter', cls_name, start, start_count,
+                                   end_count)
                 part_filter_results.append((cls_name, start_count, end_count))
                 remaining = [getattr(obj, "host", obj)
                              for obj in list_objs]
@@ -20,11 +20,14 @@ Pluggable Weighing support
 from __future__ import annotations
 
 import abc
+import heapq
+import operator
 from typing import Iterable, Optional
 
 from oslo_log import log as logging
 
 from cinder.scheduler import base_handler
+from cinder.scheduler import stats
 
 
 LOG = logging.getLogger(__name__)
@@ -133,25 +136,35 @@ class BaseWeightHandler(base_handler.BaseHandler):
     def get_weighed_objects(self,
                             weigher_classes: list,
                             obj_list: list[WeighedObject],
-                            weighing_properties: dict) -> list[WeighedObject]:
-        """Return a sorted (descending), normalized list of WeighedObjects."""
+                            weighing_properties: dict,
+                            limit: Optional[int] = None) \
+            -> list[WeighedObject]:
+        """Return a sorted (descending), normalized list of WeighedObjects.
+
+        If limit is set only the limit objects with the highest weights are
+        returned, which spares sorting all of them when just the best ones
+        are needed.
+        """
 
         if not obj_list:
             return []
 
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
+        totals = [0.0] * len(weighed_objs)
         for weigher_cls in weigher_classes:
+            start = stats.STATS.start()
             weigher = weigher_cls()
             weights = weigher.weigh_objects(weighed_objs, weighing_properties)
 
-            # Normalize the weights
+            # Normalize the weights and add them to the totals in one pass
+            multiplier = weigher.weight_multiplier()
             weights = normalize(weights,
                                 minval=weigher.minval,
                                 maxval=weigher.maxval)
-
-            for i, weight in enumerate(weights):
-                obj = weighed_objs[i]
-                obj.weight += weigher.weight_multiplier() * weight
+            totals = [total + multiplier * weight
+                      for total, weight in zip(totals, weights)]
+            stats.STATS.record('weigher', weigher_cls.__name__, start,
+                               len(weighed_objs), len(weighed_objs))
 
             LOG.debug("Weigher %(cls_name)s returned, "
                       "weigher value is {max: %(maxval)s, min: %(minval)s}",
@@ -159,4 +172,11 @@ class BaseWeightHandler(base_handler.BaseHandler):
                        'maxval': weigher.maxval,
                        'minval': weigher.minval})
 
+        for obj, total in zip(weighed_objs, totals):
+            obj.weight = total
+
+        if limit is not None and limit < len(weighed_objs):
+            # Same order, ties included, as the sorted list below.
+            return heapq.nlargest(limit, weighed_objs,
+                                  key=operator.attrgetter('weight'))
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
@@ -15,9 +15,11 @@
 
 from __future__ import annotations  # Remove when only supporting python 3.9+
 
+import functools
 import operator
 import re
 import sys
+import threading
 from typing import Callable
 
 import pyparsing
@@ -40,21 +42,16 @@ def _operatorOperands(tokenList):
 class EvalConstant(object):
     def __init__(self, toks):
         self.value = toks[0]
+        self.variable = None
+        if (isinstance(self.value, str) and
+                re.match(r"^[a-zA-Z_]+\.[a-zA-Z_]+$", self.value)):
+            self.variable = self.value.split('.')
+        else:
+            # Literals are converted once, when the expression is compiled.
+            self.value = self._convert(self.value)
 
-    def eval(self):
-        result = self.value
-        if (isinstance(result, str) and
-                re.match(r"^[a-zA-Z_]+\.[a-zA-Z_]+$", result)):
-            (which_dict, entry) = result.split('.')
-            try:
-                result = _vars[which_dict][entry]
-            except KeyError:
-                raise exception.EvaluatorParseException(
-                    _("KeyError evaluating string"))
-            except TypeError:
-                raise exception.EvaluatorParseException(
-                    _("TypeError evaluating string"))
-
+    @staticmethod
+    def _convert(result):
         try:
             result = int(result)
         except ValueError:
@@ -66,6 +63,22 @@ class EvalConstant(object):
 
         return result
 
+    def eval(self, variables):
+        if self.variable is None:
+            return self.value
+
+        (which_dict, entry) = self.variable
+        try:
+            result = variables[which_dict][entry]
+        except KeyError:
+            raise exception.EvaluatorParseException(
+                _("KeyError evaluating string"))
+        except TypeError:
+            raise exception.EvaluatorParseException(
+                _("TypeError evaluating string"))
+
+        return self._convert(result)
+
 
 class EvalSignOp(object):
     operations = {
@@ -76,21 +89,21 @@ class EvalSignOp(object):
     def __init__(self, toks):
         self.sign, self.value = toks[0]
 
-    def eval(self):
-        return self.operations[self.sign] * self.value.eval()
+    def eval(self, variables):
+        return self.operations[self.sign] * self.value.eval(variables)
 
 
 class EvalAddOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        sum = self.value[0].eval()
+    def eval(self, variables):
+        sum = self.value[0].eval(variables)
         for op, val in _operatorOperands(self.value[1:]):
             if op == '+':
-                sum += val.eval()
+                sum += val.eval(variables)
             elif op == '-':
-                sum -= val.eval()
+                sum -= val.eval(variables)
         return sum
 
 
@@ -98,14 +111,14 @@ class EvalMultOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        prod = self.value[0].eval()
+    def eval(self, variables):
+        prod = self.value[0].eval(variables)
         for op, val in _operatorOperands(self.value[1:]):
             try:
                 if op == '*':
-                    prod *= val.eval()
+                    prod *= val.eval(variables)
                 elif op == '/':
-                    prod /= float(val.eval())
+                    prod /= float(val.eval(variables))
             except ZeroDivisionError as e:
                 raise exception.EvaluatorParseException(
                     _("ZeroDivisionError: %s") % e)
@@ -116,10 +129,10 @@ class EvalPowerOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        prod = self.value[0].eval()
+    def eval(self, variables):
+        prod = self.value[0].eval(variables)
         for op, val in _operatorOperands(self.value[1:]):
-            prod = pow(prod, val.eval())
+            prod = pow(prod, val.eval(variables))
         return prod
 
 
@@ -127,8 +140,8 @@ class EvalNegateOp(object):
     def __init__(self, toks):
         self.negation, self.value = toks[0]
 
-    def eval(self):
-        return not self.value.eval()
+    def eval(self, variables):
+        return not self.value.eval(variables)
 
 
 class EvalComparisonOp(object):
@@ -145,11 +158,11 @@ class EvalComparisonOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        val1 = self.value[0].eval()
+    def eval(self, variables):
+        val1 = self.value[0].eval(variables)
         for op, val in _operatorOperands(self.value[1:]):
             fn = self.operations[op]
-            val2 = val.eval()
+            val2 = val.eval(variables)
             if not fn(val1, val2):
                 break
             val1 = val2
@@ -162,12 +175,12 @@ class EvalTernaryOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        condition = self.value[0].eval()
+    def eval(self, variables):
+        condition = self.value[0].eval(variables)
         if condition:
-            return self.value[2].eval()
+            return self.value[2].eval(variables)
         else:
-            return self.value[4].eval()
+            return self.value[4].eval(variables)
 
 
 class EvalFunction(object):
@@ -180,8 +193,8 @@ class EvalFunction(object):
     def __init__(self, toks):
         self.func, self.value = toks[0]
 
-    def eval(self):
-        args = self.value.eval()
+    def eval(self, variables):
+        args = self.value.eval(variables)
         if type(args) is list:
             return self.functions[self.func](*args)
         else:
@@ -192,9 +205,9 @@ class EvalCommaSeperator(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        val1 = self.value[0].eval()
-        val2 = self.value[2].eval()
+    def eval(self, variables):
+        val1 = self.value[0].eval(variables)
+        val2 = self.value[2].eval(variables)
         if type(val2) is list:
             val_list = []
             val_list.append(val1)
@@ -209,9 +222,9 @@ class EvalBoolAndOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        left = self.value[0].eval()
-        right = self.value[2].eval()
+    def eval(self, variables):
+        left = self.value[0].eval(variables)
+        right = self.value[2].eval(variables)
         return left and right
 
 
@@ -219,14 +232,27 @@ class EvalBoolOrOp(object):
     def __init__(self, toks):
         self.value = toks[0]
 
-    def eval(self):
-        left = self.value[0].eval()
-        right = self.value[2].eval()
+    def eval(self, variables):
+        left = self.value[0].eval(variables)
+        right = self.value[2].eval(variables)
         return left or right
 
 
+class ParseFailure(object):
+    """Compiled form of an expression that could not be parsed."""
+
+    def __init__(self, message):
+        self.message = message
+
+    def eval(self, variables):
+        raise exception.EvaluatorParseException(self.message)
+
+
+# Maximum number of compiled expressions kept in the cache.
+COMPILE_CACHE_SIZE = 1024
+
 _parser = None
-_vars = {}
+_parser_lock = threading.Lock()
 
 
 def _def_parser():
@@ -276,6 +302,35 @@ def _def_parser():
     return expr
 
 
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def compile_expression(expression):
+    """Parse an expression into a tree that can be evaluated many times.
+
+    Compiled expressions are cached by their string, and their eval method
+    takes the dictionaries of variables as a single dictionary argument, so
+    they can be shared by concurrent evaluations.
+    """
+    global _parser
+    with _parser_lock:
+        if _parser is None:
+            _parser = _def_parser()
+
+        # Some reasonable formulas break with the default recursion limit of
+        # 1000.  Raise it here and reset it afterward.
+        orig_recursion_limit = sys.getrecursionlimit()
+        if orig_recursion_limit < 3000:
+            sys.setrecursionlimit(3000)
+
+        try:
+            return _parser.parseString(expression, parseAll=True)[0]
+        except pyparsing.ParseException as e:
+            # Expressions that cannot be parsed are cached too, so a broken
+            # filter or goodness function isn't parsed again for every pool.
+            return ParseFailure(_("ParseException: %s") % e)
+        finally:
+            sys.setrecursionlimit(orig_recursion_limit)
+
+
 def evaluate(expression, **kwargs):
     """Evaluates an expression.
 
@@ -285,25 +340,4 @@ def evaluate(expression, **kwargs):
     Supports both integer and floating point values, and automatic
     promotion where necessary.
     """
-    global _parser
-    if _parser is None:
-        _parser = _def_parser()
-
-    global _vars
-    _vars = kwargs
-
-    # Some reasonable formulas break with the default recursion limit of
-    # 1000.  Raise it here and reset it afterward.
-    orig_recursion_limit = sys.getrecursionlimit()
-    if orig_recursion_limit < 3000:
-        sys.setrecursionlimit(3000)
-
-    try:
-        result = _parser.parseString(expression, parseAll=True)[0]
-    except pyparsing.ParseException as e:
-        raise exception.EvaluatorParseException(
-            _("ParseException: %s") % e)
-    finally:
-        sys.setrecursionlimit(orig_recursion_limit)
-
-    return result.eval()
+    return compile_expression(expression).eval(kwargs)
@@ -300,10 +300,12 @@ class FilterScheduler(driver.Scheduler):
             self,
             context: context.RequestContext,
             request_spec: dict,
-            filter_properties: Optional[dict] = None) -> list:
+            filter_properties: Optional[dict] = None,
+            limit: Optional[int] = None) -> list:
         """Return a list of backends that meet required specs.
 
-        Returned list is ordered by their fitness.
+        Returned list is ordered by their fitness.  If limit is set only that
+        many of the fittest backends are returned.
         """
         elevated = context.elevated()
 
@@ -360,7 +362,7 @@ class FilterScheduler(driver.Scheduler):
         # weighted_backends = WeightedHost() ... the best
         # backend for the job.
         weighed_backends = self.host_manager.get_weighed_backends(
-            backends, filter_properties)
+            backends, filter_properties, limit=limit)
         return weighed_backends
 
     def _get_weighted_candidates_generic_group(
@@ -542,12 +544,13 @@ class FilterScheduler(driver.Scheduler):
                   context: context.RequestContext,
                   request_spec: dict,
                   filter_properties: Optional[dict] = None):
-        weighed_backends = self._get_weighted_candidates(context, request_spec,
-                                                         filter_properties)
         # When we get the weighed_backends, we clear those backends that don't
         # match the resource's backend (it could be assigned from group,
-        # snapshot or volume).
+        # snapshot or volume).  Otherwise only the top backend is needed.
         resource_backend = request_spec.get('resource_backend')
+        weighed_backends = self._get_weighted_candidates(
+            context, request_spec, filter_properties,
+            limit=None if resource_backend else 1)
         if weighed_backends and resource_backend:
             resource_backend_has_pool = bool(volume_utils.extract_host(
                 resource_backend, 'pool'))
@@ -35,6 +35,18 @@ class BaseBackendFilter(base_filter.BaseFilter):
         """
         raise NotImplementedError()
 
+    @classmethod
+    def indexed_requirements(cls, filter_properties):
+        """Return the requirements the HostManager's pool index can check.
+
+        Each requirement is a list of pool index keys, and a pool meets it if
+        it's in the index under any of them.  The HostManager only runs the
+        filters on the pools that meet all the requirements, so filters with
+        plain equality requirements can override this to avoid checking every
+        pool.  Filters still get to check all the pools that are not indexed.
+        """
+        return []
+
 
 class BackendFilterHandler(base_filter.BaseFilterHandler):
     def __init__(self, namespace):
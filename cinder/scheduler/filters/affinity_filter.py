@@ -14,33 +14,44 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import abc
+
 from oslo_utils import uuidutils
 
 from cinder.scheduler import filters
 from cinder.volume import api as volume
 
 
-class AffinityFilter(filters.BaseBackendFilter):
-    def __init__(self):
-        self.volume_api = volume.API()
+def _host_matches(field, value):
+    """Check a volume's host or cluster_name like the DB API filters do.
 
-    def _get_volumes(self, context, affinity_uuids, backend_state):
-        filters = {'id': affinity_uuids, 'deleted': False}
-        if backend_state.cluster_name:
-            filters['cluster_name'] = backend_state.cluster_name
-        else:
-            filters['host'] = backend_state.host
-        return self.volume_api.get_all(context, filters=filters)
+    A value with a pool must match exactly, a value with a backend also
+    matches any of its pools, and a bare host also matches any of its
+    backends.
+    """
+    if not field:
+        return False
+    if field == value:
+        return True
+    if '#' in value:
+        return False
+    if field.startswith(value + '#'):
+        return True
+    return '@' not in value and field.startswith(value + '@')
 
 
-class DifferentBackendFilter(AffinityFilter):
-    """Schedule volume on a different back-end from a set of volumes."""
+class AffinityFilter(filters.BaseBackendFilter, metaclass=abc.ABCMeta):
+    # Name of the scheduler hint with the volume ids, set by subclasses.
+    hint = None
 
-    def backend_passes(self, backend_state, filter_properties):
-        context = filter_properties['context']
+    def __init__(self):
+        self.volume_api = volume.API()
+
+    def _get_affinity_uuids(self, filter_properties):
+        """Return the volume ids in the hint, or None if it's not valid."""
         scheduler_hints = filter_properties.get('scheduler_hints') or {}
 
-        affinity_uuids = scheduler_hints.get('different_host', [])
+        affinity_uuids = scheduler_hints.get(self.hint, [])
 
         # scheduler hint verification: affinity_uuids can be a list of uuids
         # or single uuid.  The checks here is to make sure every single string
@@ -49,20 +60,72 @@ class DifferentBackendFilter(AffinityFilter):
         # like a uuid, it is better to fail the request than serving it wrong.
         if isinstance(affinity_uuids, list):
             for uuid in affinity_uuids:
-                if uuidutils.is_uuid_like(uuid):
-                    continue
-                else:
-                    return False
+                if not uuidutils.is_uuid_like(uuid):
+                    return None
         elif uuidutils.is_uuid_like(affinity_uuids):
             affinity_uuids = [affinity_uuids]
         else:
             # Not a list, not a string looks like uuid, don't pass it
             # to DB for query to avoid potential risk.
+            return None
+        return affinity_uuids
+
+    def _get_volumes(self, context, affinity_uuids, backend_state):
+        filters = {'id': affinity_uuids, 'deleted': False}
+        if backend_state.cluster_name:
+            filters['cluster_name'] = backend_state.cluster_name
+        else:
+            filters['host'] = backend_state.host
+        return self.volume_api.get_all(context, filters=filters)
+
+    def _on_backend(self, volumes, backend_state):
+        """Check if any of the volumes is on the back-end."""
+        if backend_state.cluster_name:
+            return any(_host_matches(vol.cluster_name,
+                                     backend_state.cluster_name)
+                       for vol in volumes)
+        return any(_host_matches(vol.host, backend_state.host)
+                   for vol in volumes)
+
+    @abc.abstractmethod
+    def _affinity_passes(self, volumes, backend_state):
+        """Check a back-end against the volumes named in the hint."""
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Filter all the back-ends with a single query for the volumes.
+
+        The hinted volumes are loaded once for the request, and each back-end
+        is checked against their hosts and clusters in memory.
+        """
+        affinity_uuids = self._get_affinity_uuids(filter_properties)
+        if affinity_uuids is None:
+            return []
+        if not affinity_uuids:
+            return filter_obj_list
+
+        volumes = self.volume_api.get_all(
+            filter_properties['context'],
+            filters={'id': affinity_uuids, 'deleted': False})
+        return [backend_state for backend_state in filter_obj_list
+                if self._affinity_passes(volumes, backend_state)]
+
+
+class DifferentBackendFilter(AffinityFilter):
+    """Schedule volume on a different back-end from a set of volumes."""
+
+    hint = 'different_host'
+
+    def _affinity_passes(self, volumes, backend_state):
+        return not self._on_backend(volumes, backend_state)
+
+    def backend_passes(self, backend_state, filter_properties):
+        affinity_uuids = self._get_affinity_uuids(filter_properties)
+        if affinity_uuids is None:
             return False
 
         if affinity_uuids:
-            return not self._get_volumes(context, affinity_uuids,
-                                         backend_state)
+            return not self._get_volumes(filter_properties['context'],
+                                         affinity_uuids, backend_state)
         # With no different_host key
         return True
 
@@ -70,32 +133,19 @@ class DifferentBackendFilter(AffinityFilter):
 class SameBackendFilter(AffinityFilter):
     """Schedule volume on the same back-end as another volume."""
 
-    def backend_passes(self, backend_state, filter_properties):
-        context = filter_properties['context']
-        scheduler_hints = filter_properties.get('scheduler_hints') or {}
+    hint = 'same_host'
 
-        affinity_uuids = scheduler_hints.get('same_host', [])
+    def _affinity_passes(self, volumes, backend_state):
+        return self._on_backend(volumes, backend_state)
 
-        # scheduler hint verification: affinity_uuids can be a list of uuids
-        # or single uuid.  The checks here is to make sure every single string
-        # in the list looks like a uuid, otherwise, this filter will fail to
-        # pass.  Note that the filter does *NOT* ignore string doesn't look
-        # like a uuid, it is better to fail the request than serving it wrong.
-        if isinstance(affinity_uuids, list):
-            for uuid in affinity_uuids:
-                if uuidutils.is_uuid_like(uuid):
-                    continue
-                else:
-                    return False
-        elif uuidutils.is_uuid_like(affinity_uuids):
-            affinity_uuids = [affinity_uuids]
-        else:
-            # Not a list, not a string looks like uuid, don't pass it
-            # to DB for query to avoid potential risk.
+    def backend_passes(self, backend_state, filter_properties):
+        affinity_uuids = self._get_affinity_uuids(filter_properties)
+        if affinity_uuids is None:
             return False
 
         if affinity_uuids:
-            return self._get_volumes(context, affinity_uuids, backend_state)
+            return self._get_volumes(filter_properties['context'],
+                                     affinity_uuids, backend_state)
 
         # With no same_host key
         return True
@@ -22,6 +22,18 @@ class AvailabilityZoneFilter(filters.BaseBackendFilter):
     # Availability zones do not change within a request
     run_filter_once_per_request = True
 
+    @classmethod
+    def indexed_requirements(cls, filter_properties):
+        spec = filter_properties.get('request_spec', {})
+        availability_zones = spec.get('availability_zones')
+        if not availability_zones:
+            props = spec.get('resource_properties', {})
+            availability_zone = props.get('availability_zone')
+            if not availability_zone:
+                return []
+            availability_zones = [availability_zone]
+        return [[('availability_zone', az) for az in availability_zones]]
+
     def backend_passes(self, backend_state, filter_properties):
         spec = filter_properties.get('request_spec', {})
         availability_zones = spec.get('availability_zones')
@@ -90,6 +90,26 @@ class CapabilitiesFilter(filters.BaseBackendFilter):
                 return False
         return True
 
+    @classmethod
+    def indexed_requirements(cls, filter_properties):
+        """Return the plain equality extra specs of the resource type."""
+        resource_type = filter_properties.get('resource_type')
+        if not resource_type:
+            return []
+
+        requirements = []
+        for key, req in (resource_type.get('extra_specs', {}) or {}).items():
+            scope = key.split(':')
+            if scope[0] == 'capabilities':
+                del scope[0]
+            # Only top level capabilities are indexed, and requirements
+            # starting with an operator aren't plain equality comparisons.
+            if (len(scope) != 1 or not isinstance(req, str) or
+                    extra_specs_ops.has_operator(req)):
+                continue
+            requirements.append([('capabilities', scope[0], req)])
+        return requirements
+
     def backend_passes(self, backend_state, filter_properties):
         """Return a list of backends that can create resource_type."""
         # Note(zhiteng) Currently only Cinder and Nova are using
@@ -38,6 +38,12 @@ _op_methods = {'=': lambda x, y: float(x) >= float(y),
                's>=': operator.ge}
 
 
+def has_operator(req):
+    """Check if a requirement is anything other than a plain value."""
+    words = req.split()
+    return bool(words) and (words[0] == '<or>' or words[0] in _op_methods)
+
+
 def match(value, req):
     if req is None:
         if value is None:
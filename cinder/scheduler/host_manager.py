@@ -17,6 +17,7 @@
 
 from __future__ import annotations
 
+import collections
 from collections import abc
 import random
 import typing
@@ -452,6 +453,61 @@ class PoolState(BackendState):
         pass
 
 
+class PoolIndex(object):
+    """Inverted indexes of pools by capability and availability zone.
+
+    Pools are indexed under ('capabilities', <key>, <value>) for every top
+    level string capability, or string element of a list capability, and
+    under ('availability_zone', <zone>) for the zone of their service.
+    """
+
+    def __init__(self, pools: Iterable[BackendState]):
+        self.pools: set[BackendState] = set()
+        self._index: dict[tuple, set] = collections.defaultdict(set)
+        # The keys every pool is indexed under, to remove it later
+        self._pool_keys: dict[BackendState, list[tuple]] = {}
+        for pool in pools:
+            self.add(pool)
+
+    def add(self, pool: BackendState) -> None:
+        """Index a pool under its current capabilities and zone."""
+        service = pool.service or {}
+        keys = [('availability_zone', service.get('availability_zone'))]
+        for key, value in (pool.capabilities or {}).items():
+            values = value if isinstance(value, list) else [value]
+            keys.extend(('capabilities', key, item)
+                        for item in values if isinstance(item, str))
+        for key in keys:
+            self._index[key].add(pool)
+        self._pool_keys[pool] = keys
+        self.pools.add(pool)
+
+    def remove(self, pool: BackendState) -> None:
+        """Drop a pool from the index."""
+        for key in self._pool_keys.pop(pool, ()):
+            pools = self._index[key]
+            pools.discard(pool)
+            if not pools:
+                del self._index[key]
+        self.pools.discard(pool)
+
+    def lookup(self, requirements: list[list[tuple]]) -> frozenset:
+        """Return the pools that meet all the requirements.
+
+        Each requirement is a list of index keys, and a pool meets it if it
+        is indexed under any of them.
+        """
+        candidates: abc.Set = self.pools
+        for keys in requirements:
+            matching: set = set()
+            for key in keys:
+                matching.update(self._index.get(key, ()))
+            candidates = candidates.intersection(matching)
+            if not candidates:
+                break
+        return frozenset(candidates)
+
+
 class HostManager(object):
     """Base HostManager class."""
 
@@ -485,6 +541,13 @@ class HostManager(object):
         self.weight_classes = self.weight_handler.get_all_classes()
 
         self._no_capabilities_backends = set()  # Services without capabilities
+        # What each backend state was last updated from, keyed by backend
+        self._backend_state_sources: dict[str, tuple] = {}
+        # Index of all the pools, built on first use and then updated with
+        # the pools of the backends that change
+        self._all_pools: Optional[dict[str, PoolState]] = None
+        self._backend_pool_keys: dict[str, list[str]] = {}
+        self._pool_index: Optional[PoolIndex] = None
         self._update_backend_state_map(cinder_context.get_admin_context())
         self.service_states_last_update = {}
 
@@ -550,17 +613,39 @@ class HostManager(object):
             filter_classes = self._choose_backend_filters(filter_class_names)
         else:
             filter_classes = self.enabled_filters
+        backends = self._preselect_backends(filter_classes, backends,
+                                            filter_properties)
         return self.filter_handler.get_filtered_objects(filter_classes,
                                                         backends,
                                                         filter_properties)
 
+    def _preselect_backends(self, filter_classes, backends,
+                            filter_properties) -> Iterable:
+        """Drop the pools the pool index shows would fail the filters."""
+        requirements = []
+        for filter_class in filter_classes:
+            requirements.extend(
+                filter_class.indexed_requirements(filter_properties))
+        if not requirements:
+            return backends
+
+        if self._pool_index is None:
+            self._pool_index = PoolIndex(self._get_all_pools().values())
+        index = self._pool_index
+        candidates = index.lookup(requirements)
+        return [backend for backend in backends
+                if backend in candidates or backend not in index.pools]
+
     def get_weighed_backends(self, backends, weight_properties,
-                             weigher_class_names=None) -> list:
-        """Weigh the backends."""
+                             weigher_class_names=None, limit=None) -> list:
+        """Weigh the backends.
+
+        If limit is set only that many of the best backends are returned.
+        """
         weigher_classes = self._choose_backend_weighers(weigher_class_names)
 
         weighed_backends = self.weight_handler.get_weighed_objects(
-            weigher_classes, backends, weight_properties)
+            weigher_classes, backends, weight_properties, limit=limit)
 
         LOG.debug("Weighed %s", weighed_backends)
         return weighed_backends
@@ -710,6 +795,8 @@ class HostManager(object):
                 no_capabilities_backends.add(backend_key)
                 continue
 
+            active_backends.add(backend_key)
+
             # Since the service could have been added or remove from a cluster
             backend_state = self.backend_state_map.get(backend_key, None)
             if not backend_state:
@@ -719,11 +806,18 @@ class HostManager(object):
                     capabilities=capabilities,
                     service=dict(service))
                 self.backend_state_map[backend_key] = backend_state
+            elif self._backend_state_is_current(backend_key, backend_state,
+                                                capabilities, service):
+                # Applying the same report again wouldn't change anything
+                continue
 
             # update capabilities and attributes in backend_state
             backend_state.update_from_volume_capability(capabilities,
                                                         service=dict(service))
-            active_backends.add(backend_key)
+            self._backend_state_sources[backend_key] = (
+                backend_state, capabilities,
+                self._service_version(service))
+            self._update_backend_pools(backend_key, backend_state)
 
         self._no_capabilities_backends = no_capabilities_backends
 
@@ -737,6 +831,31 @@ class HostManager(object):
                 LOG.info("Removing non-active backend: %(backend)s from "
                          "scheduler cache.", {'backend': backend_key})
             del self.backend_state_map[backend_key]
+            self._backend_state_sources.pop(backend_key, None)
+            self._update_backend_pools(backend_key, None)
+
+    @staticmethod
+    def _service_version(service: objects.Service) -> tuple:
+        # Service fields that are copied into the backend state and can
+        # change without a new capabilities report.
+        return (service.id, service.host, service.cluster_name,
+                service.availability_zone, service.modified_at)
+
+    def _backend_state_is_current(self,
+                                  backend_key: str,
+                                  backend_state: BackendState,
+                                  capabilities: dict,
+                                  service: objects.Service) -> bool:
+        """Check if a backend state was updated from these same sources.
+
+        Every capabilities report is stored as a new dictionary, so the
+        identity of the dictionary tells if a new report has arrived.
+        """
+        source = self._backend_state_sources.get(backend_key)
+        return (source is not None and
+                source[0] is backend_state and
+                source[1] is capabilities and
+                source[2] == self._service_version(service))
 
     def revert_volume_consumed_capacity(self,
                                         pool_name: str,
@@ -761,18 +880,53 @@ class HostManager(object):
         """
 
         self._update_backend_state_map(context)
+        # The pool map is updated in place, so callers get a copy they can
+        # iterate while other requests update the backends.
+        return list(self._get_all_pools().values())
 
+    def _get_all_pools(self) -> dict[str, PoolState]:
         # build a pool_state map and return that map instead of
-        # backend_state_map
-        all_pools = {}
-        for backend_key, state in self.backend_state_map.items():
-            for key in state.pools:
-                pool = state.pools[key]
-                # use backend_key.pool_name to make sure key is unique
-                pool_key = '.'.join([backend_key, pool.pool_name])
-                all_pools[pool_key] = pool
+        # backend_state_map. It is only built once, later changes of the
+        # backends are applied by _update_backend_pools.
+        if self._all_pools is None:
+            self._all_pools = {}
+            self._backend_pool_keys = {}
+            for backend_key, state in self.backend_state_map.items():
+                self._add_backend_pools(backend_key, state)
+
+        return self._all_pools
+
+    def _update_backend_pools(self,
+                              backend_key: str,
+                              state: Optional[BackendState]) -> None:
+        """Replace the pools of a backend in the pool map and index.
+
+        The pools of the backend are removed, and the ones of its state are
+        added back unless the state is None because the backend is gone.
+        """
+        if self._all_pools is None:
+            # Not built yet, it will be built from the current states
+            return
 
-        return all_pools.values()
+        for pool_key in self._backend_pool_keys.pop(backend_key, ()):
+            pool = self._all_pools.pop(pool_key)
+            if self._pool_index is not None:
+                self._pool_index.remove(pool)
+        if state is not None:
+            self._add_backend_pools(backend_key, state)
+
+    def _add_backend_pools(self, backend_key: str,
+                           state: BackendState) -> None:
+        pool_keys = []
+        for key in state.pools:
+            pool = state.pools[key]
+            # use backend_key.pool_name to make sure key is unique
+            pool_key = '.'.join([backend_key, pool.pool_name])
+            self._all_pools[pool_key] = pool
+            pool_keys.append(pool_key)
+            if self._pool_index is not None:
+                self._pool_index.add(pool)
+        self._backend_pool_keys[backend_key] = pool_keys
 
     def _filter_pools_by_volume_type(
             self,
@@ -48,6 +48,7 @@ from cinder import quota
 from cinder import rpc
 from cinder.scheduler.flows import create_volume
 from cinder.scheduler import rpcapi as scheduler_rpcapi
+from cinder.scheduler import stats
 from cinder.volume import rpcapi as volume_rpcapi
 from cinder.volume import volume_utils as vol_utils
 
@@ -62,6 +63,14 @@ scheduler_manager_opts = [
                min=1,
                help='Maximum time in seconds to wait for the driver to '
                     'report as ready'),
+    cfg.IntOpt('scheduler_stats_interval',
+               default=0,
+               min=0,
+               help='Interval in seconds between the logs of the time spent '
+                    'in each scheduler filter and weigher, how often they '
+                    'ran, the database queries they issued and the backends '
+                    'they were given and returned. The statistics are reset '
+                    'after each log. 0 disables the logs.'),
 ]
 
 CONF = cfg.CONF
@@ -109,6 +118,8 @@ class SchedulerManager(manager.CleanableManager, manager.Manager):
         self.message_api = mess_api.API()
         self.rpc_api_version = versionutils.convert_version_to_int(
             self.RPC_API_VERSION)
+        if CONF.scheduler_stats_interval:
+            stats.STATS.count_db_queries()
 
     def init_host_with_rpc(self):
         ctxt = context.get_admin_context()
@@ -136,6 +147,11 @@ class SchedulerManager(manager.CleanableManager, manager.Manager):
     def _clean_expired_reservation(self, context):
         QUOTAS.expire(context)
 
+    @periodic_task.periodic_task(spacing=CONF.scheduler_stats_interval)
+    def _log_scheduler_stats(self, context):
+        if CONF.scheduler_stats_interval:
+            stats.STATS.log_stats(reset=True)
+
     def update_service_capabilities(self, context, service_name=None,
                                     host=None, capabilities=None,
                                     cluster_name=None, timestamp=None,
@@ -0,0 +1,102 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Timing statistics of the scheduler filters and weighers."""
+
+from __future__ import annotations
+
+import threading
+import time
+
+from oslo_log import log as logging
+from sqlalchemy import engine
+from sqlalchemy import event
+
+
+LOG = logging.getLogger(__name__)
+
+
+class HandlerStats(object):
+    """Aggregated statistics of the filters and weighers that have run.
+
+    For every filter and weigher class this keeps the number of calls, the
+    total and maximum time spent in them, the database queries they issued
+    and the number of backends they were given and returned.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats: dict[tuple[str, str], dict] = {}
+
+    def _db_queries(self) -> int:
+        return getattr(self._local, 'db_queries', 0)
+
+    def _count_db_query(self, *args, **kwargs) -> None:
+        self._local.db_queries = self._db_queries() + 1
+
+    def count_db_queries(self) -> None:
+        """Count the database queries issued by the current thread."""
+        if not event.contains(engine.Engine, 'before_cursor_execute',
+                              self._count_db_query):
+            event.listen(engine.Engine, 'before_cursor_execute',
+                         self._count_db_query)
+
+    def start(self) -> tuple[float, int]:
+        """Return the start marker to pass to record."""
+        return time.monotonic(), self._db_queries()
+
+    def record(self, kind: str, name: str, start: tuple[float, int],
+               backends_in: int, backends_out: int) -> None:
+        """Record a call to a filter or weigher that began at start."""
+        elapsed = time.monotonic() - start[0]
+        db_queries = self._db_queries() - start[1]
+        with self._lock:
+            stats = self._stats.get((kind, name))
+            if stats is None:
+                stats = self._stats[(kind, name)] = {
+                    'calls': 0, 'time': 0.0, 'max_time': 0.0,
+                    'db_queries': 0, 'backends_in': 0, 'backends_out': 0}
+            stats['calls'] += 1
+            stats['time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            stats['db_queries'] += db_queries
+            stats['backends_in'] += backends_in
+            stats['backends_out'] += backends_out
+
+    def get_stats(self, reset: bool = False) -> dict[tuple[str, str], dict]:
+        """Return a copy of the statistics keyed by (kind, class name)."""
+        with self._lock:
+            result = {key: dict(value) for key, value in self._stats.items()}
+            if reset:
+                self._stats = {}
+        return result
+
+    def log_stats(self, reset: bool = False) -> None:
+        """Log the statistics, the most time consuming first."""
+        stats = self.get_stats(reset)
+        for (kind, name), value in sorted(stats.items(),
+                                          key=lambda item: -item[1]['time']):
+            calls = value['calls']
+            LOG.info("Scheduler %(kind)s %(name)s: %(calls)d calls, "
+                     "%(avg).3f ms average, %(max).3f ms max, "
+                     "%(queries).2f DB queries per call, "
+                     "%(in).1f backends in and %(out).1f out per call.",
+                     {'kind': kind, 'name': name, 'calls': calls,
+                      'avg': value['time'] * 1000 / calls,
+                      'max': value['max_time'] * 1000,
+                      'queries': value['db_queries'] / calls,
+                      'in': value['backends_in'] / calls,
+                      'out': value['backends_out'] / calls})
+
+
+STATS = HandlerStats()
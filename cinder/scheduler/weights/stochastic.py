@@ -32,7 +32,7 @@ class StochasticHostWeightHandler(base_weight.BaseWeightHandler):
                                                           namespace)
 
     def get_weighed_objects(self, weigher_classes, obj_list,
-                            weighing_properties):
+                            weighing_properties, limit=None):
         # The normalization performed in the superclass is nonlinear, which
         # messes up the probabilities, so override it. The probabilistic
         # approach we use here is self-normalizing.
@@ -79,4 +79,6 @@ class StochasticHostWeightHandler(base_weight.BaseWeightHandler):
         # could only occur with very large numbers and floating point
         # rounding. In those cases the actual winner should have been the
         # last element, so return it.
-        return weighed_objs[winning_index:] + weighed_objs[0:winning_index]
+        weighed_objs = (weighed_objs[winning_index:] +
+                        weighed_objs[0:winning_index])
+        return weighed_objs[:limit]
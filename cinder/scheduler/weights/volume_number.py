@@ -38,15 +38,32 @@ class VolumeNumberWeigher(weights.BaseHostWeigher):
     number and the weighing has the opposite effect of the default.
     """
 
+    # Volume count of every host being weighed, keyed by host.
+    _volume_counts = None
+
     def weight_multiplier(self) -> float:
         """Override the weight multiplier."""
         return CONF.volume_number_multiplier
 
+    def weigh_objects(self, weighed_obj_list, weight_properties):
+        """Count the volumes of all the hosts with a single query."""
+        context = weight_properties['context'].elevated()
+        self._volume_counts = db.volume_count_get_for_hosts(
+            context, [obj.obj.host for obj in weighed_obj_list])
+        try:
+            return super(VolumeNumberWeigher, self).weigh_objects(
+                weighed_obj_list, weight_properties)
+        finally:
+            self._volume_counts = None
+
     def _weigh_object(self, host_state, weight_properties):
         """Less volume number weights win.
 
         We want spreading to be the default.
         """
+        if self._volume_counts is not None:
+            return self._volume_counts.get(host_state.host, 0)
+
         context = weight_properties['context']
         context = context.elevated()
         volume_number = db.volume_data_get_for_host(context=context,
@@ -22,7 +22,6 @@ import hashlib
 import os
 import shutil
 import tempfile
-import threading
 from unittest import mock
 import zlib
 
@@ -46,6 +45,9 @@ class FakeMD5(object):
     def __init__(self, *args, **kwargs):
         pass
 
+    def update(self, data):
+        pass
+
     @classmethod
     def digest(cls):
         return 'gcscindermd5'
@@ -587,53 +589,42 @@ class GoogleBackupDriverTestCase(test.TestCase):
         self.assertRaises(ValueError, service._get_compressor, 'fake')
 
     @gcs_client
-    def test_prepare_output_data_effective_compression(self):
-        """Test compression works on a native thread."""
-        # Use dictionary to share data between threads
-        thread_dict = {}
-        original_compress = zlib.compress
-
-        def my_compress(data):
-            thread_dict['compress'] = threading.current_thread()
-            return original_compress(data)
-
-        self.mock_object(zlib, 'compress', side_effect=my_compress)
-
+    def test_process_chunk_effective_compression(self):
         service = google_dr.GoogleBackupDriver(self.ctxt)
         # Set up buffer of 128 zeroed bytes
         fake_data = b'\0' * 128
 
-        result = service._prepare_output_data(fake_data)
+        _digests, _holes, objects = service._process_chunk(
+            fake_data, len(fake_data), 'zlib')
 
-        self.assertEqual('zlib', result[0])
-        self.assertGreater(len(fake_data), len(result[1]))
-        self.assertNotEqual(threading.current_thread(),
-                            thread_dict['compress'])
+        self.assertEqual([(0, 128, 'zlib', mock.ANY, mock.ANY)], objects)
+        self.assertGreater(len(fake_data), len(objects[0][3]))
 
     @gcs_client
-    def test_prepare_output_data_no_compression(self):
+    def test_process_chunk_no_compression(self):
         self.flags(backup_compression_algorithm='none')
         service = google_dr.GoogleBackupDriver(self.ctxt)
         # Set up buffer of 128 zeroed bytes
         fake_data = b'\0' * 128
 
-        result = service._prepare_output_data(fake_data)
+        _digests, _holes, objects = service._process_chunk(
+            fake_data, len(fake_data), 'none')
 
-        self.assertEqual('none', result[0])
-        self.assertEqual(fake_data, result[1])
+        self.assertEqual([(0, 128, 'none', fake_data, mock.ANY)], objects)
 
     @gcs_client
-    def test_prepare_output_data_ineffective_compression(self):
+    def test_process_chunk_ineffective_compression(self):
         service = google_dr.GoogleBackupDriver(self.ctxt)
         # Set up buffer of 128 zeroed bytes
         fake_data = b'\0' * 128
         # Pre-compress so that compression in the driver will be ineffective.
         already_compressed_data = service.compressor.compress(fake_data)
 
-        result = service._prepare_output_data(already_compressed_data)
+        _digests, _holes, objects = service._process_chunk(
+            already_compressed_data, len(already_compressed_data), 'zlib')
 
-        self.assertEqual('none', result[0])
-        self.assertEqual(already_compressed_data, result[1])
+        self.assertEqual([(0, len(already_compressed_data), 'none',
+                           already_compressed_data, mock.ANY)], objects)
 
     @mock.patch.object(google_dr, '_get_dist_version')
     @mock.patch.object(google_dr.client.GoogleCredentials, 'from_stream')
@@ -177,6 +177,9 @@ class BackupNFSShareTestCase(test.TestCase):
 
 def fake_md5(arg, usedforsecurity=False):
     class result(object):
+        def update(self, data):
+            pass
+
         def hexdigest(self):
             return 'fake-md5-sum'
 
@@ -320,6 +323,7 @@ class BackupNFSTestCase(test.TestCase):
             original_refresh()
 
         volume_id = fake.VOLUME_ID
+        self.flags(backup_status_check_interval=0)
         self._create_backup_db_entry(volume_id=volume_id,
                                      container=None,
                                      backup_id=FAKE_BACKUP_ID)
@@ -332,8 +336,8 @@ class BackupNFSTestCase(test.TestCase):
         # mock will raise AttributeError on context manager exit.
         with mock.patch('cinder.objects.base.CinderPersistentObject.refresh',
                         side_effect=my_refresh), \
-                mock.patch.object(service, 'delete_object',
-                                  side_effect=service.delete_object) as delete:
+                mock.patch.object(service, 'delete_backup',
+                                  side_effect=service.delete_backup) as delete:
             # Driver shouldn't raise the NotFound exception
             service.backup(backup, self.volume_file)
 
@@ -805,6 +809,7 @@ class BackupNFSTestCase(test.TestCase):
 
         self.flags(backup_file_size=(1024 * 8))
         self.flags(backup_sha_block_size_bytes=1024)
+        self.flags(backup_status_check_interval=0)
 
         container_name = self.temp_dir.replace(tempfile.gettempdir() + '/',
                                                '', 1)
@@ -920,39 +925,35 @@ class BackupNFSTestCase(test.TestCase):
         # Set up buffer of zeroed bytes
         return bytearray(size)
 
-    def test_prepare_output_data_effective_compression(self):
-        """Test compression works on a native thread."""
-        self.thread_original_method = zlib.compress
-        self.mock_object(zlib, 'compress', side_effect=self._store_thread)
-
+    def test_process_chunk_effective_compression(self):
         service = nfs.NFSBackupDriver(self.ctxt)
         fake_data = self.create_buffer(128)
 
-        result = service._prepare_output_data(fake_data)
+        _digests, _holes, objects = service._process_chunk(
+            fake_data, len(fake_data), 'zlib')
 
-        self.assertEqual('zlib', result[0])
-        self.assertGreater(len(fake_data), len(result[1]))
-        self.assertNotEqual(threading.current_thread(),
-                            self.thread_dict['thread'])
+        self.assertEqual([(0, 128, 'zlib', mock.ANY, mock.ANY)], objects)
+        self.assertGreater(len(fake_data), len(objects[0][3]))
 
-    def test_prepare_output_data_no_compresssion(self):
+    def test_process_chunk_no_compresssion(self):
         self.flags(backup_compression_algorithm='none')
         service = nfs.NFSBackupDriver(self.ctxt)
         fake_data = self.create_buffer(128)
 
-        result = service._prepare_output_data(fake_data)
+        _digests, _holes, objects = service._process_chunk(
+            fake_data, len(fake_data), 'none')
 
-        self.assertEqual('none', result[0])
-        self.assertEqual(fake_data, result[1])
+        self.assertEqual([(0, 128, 'none', fake_data, mock.ANY)], objects)
 
-    def test_prepare_output_data_ineffective_compression(self):
+    def test_process_chunk_ineffective_compression(self):
         service = nfs.NFSBackupDriver(self.ctxt)
         fake_data = self.create_buffer(128)
 
         # Pre-compress so that compression in the driver will be ineffective.
         already_compressed_data = service.compressor.compress(fake_data)
 
-        result = service._prepare_output_data(already_compressed_data)
+        _digests, _holes, objects = service._process_chunk(
+            already_compressed_data, len(already_compressed_data), 'zlib')
 
-        self.assertEqual('none', result[0])
-        self.assertEqual(already_compressed_data, result[1])
+        self.assertEqual([(0, len(already_compressed_data), 'none',
+                           already_compressed_data, mock.ANY)], objects)
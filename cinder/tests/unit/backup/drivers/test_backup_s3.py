@@ -21,7 +21,6 @@ import hashlib
 import os
 import shutil
 import tempfile
-import threading
 from unittest import mock
 import zlib
 
@@ -44,6 +43,9 @@ class FakeMD5(object):
     def __init__(self, *args, **kwargs):
         pass
 
+    def update(self, data):
+        pass
+
     @classmethod
     def digest(cls):
         return 's3cindermd5'.encode('utf-8')
@@ -435,53 +437,42 @@ class BackupS3TestCase(test.TestCase):
         self.assertRaises(ValueError, service._get_compressor, 'fake')
 
     @mock_aws
-    def test_prepare_output_data_effective_compression(self):
-        """Test compression works on a native thread."""
-        # Use dictionary to share data between threads
-        thread_dict = {}
-        original_compress = zlib.compress
-
-        def my_compress(data):
-            thread_dict['compress'] = threading.current_thread()
-            return original_compress(data)
-
-        self.mock_object(zlib, 'compress', side_effect=my_compress)
-
+    def test_process_chunk_effective_compression(self):
         service = s3_dr.S3BackupDriver(self.ctxt)
         # Set up buffer of 128 zeroed bytes
         fake_data = b'\0' * 128
 
-        result = service._prepare_output_data(fake_data)
+        _digests, _holes, objects = service._process_chunk(
+            fake_data, len(fake_data), 'zlib')
 
-        self.assertEqual('zlib', result[0])
-        self.assertGreater(len(fake_data), len(result[1]))
-        self.assertNotEqual(threading.current_thread(),
-                            thread_dict['compress'])
+        self.assertEqual([(0, 128, 'zlib', mock.ANY, mock.ANY)], objects)
+        self.assertGreater(len(fake_data), len(objects[0][3]))
 
     @mock_aws
-    def test_prepare_output_data_no_compression(self):
+    def test_process_chunk_no_compression(self):
         self.flags(backup_compression_algorithm='none')
         service = s3_dr.S3BackupDriver(self.ctxt)
         # Set up buffer of 128 zeroed bytes
         fake_data = b'\0' * 128
 
-        result = service._prepare_output_data(fake_data)
+        _digests, _holes, objects = service._process_chunk(
+            fake_data, len(fake_data), 'none')
 
-        self.assertEqual('none', result[0])
-        self.assertEqual(fake_data, result[1])
+        self.assertEqual([(0, 128, 'none', fake_data, mock.ANY)], objects)
 
     @mock_aws
-    def test_prepare_output_data_ineffective_compression(self):
+    def test_process_chunk_ineffective_compression(self):
         service = s3_dr.S3BackupDriver(self.ctxt)
         # Set up buffer of 128 zeroed bytes
         fake_data = b'\0' * 128
         # Pre-compress so that compression in the driver will be ineffective.
         already_compressed_data = service.compressor.compress(fake_data)
 
-        result = service._prepare_output_data(already_compressed_data)
+        _digests, _holes, objects = service._process_chunk(
+            already_compressed_data, len(already_compressed_data), 'zlib')
 
-        self.assertEqual('none', result[0])
-        self.assertEqual(already_compressed_data, result[1])
+        self.assertEqual([(0, len(already_compressed_data), 'none',
+                           already_compressed_data, mock.ANY)], objects)
 
     @mock_aws
     def test_no_config_option(self):
@@ -530,6 +521,28 @@ class BackupS3TestCase(test.TestCase):
         with tempfile.NamedTemporaryFile() as volume_file:
             service.restore(backup, volume_id, volume_file, False)
 
+    @mock_aws
+    def test_read_sha256_index_without_index(self):
+        volume_id = '04d83506-bcf7-4ff5-9c65-00000051bd2f'
+        backup = self._create_backup_db_entry(volume_id=volume_id)
+        service = s3_dr.S3BackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        service.backup(backup, self.volume_file)
+
+        block_size, digests = service._read_sha256_index(backup)
+
+        sha256file = service._read_sha256file(backup)
+        self.assertEqual(sha256file['chunk_size'], block_size)
+        self.assertEqual(''.join(sha256file['sha256s']), bytes(digests).hex())
+
+    @mock_aws
+    def test_read_sha256_index_missing_bucket(self):
+        service = s3_dr.S3BackupDriver(self.ctxt)
+        backup = {'id': fake.BACKUP_ID, 'container': 'missing-bucket',
+                  'service_metadata': 'prefix'}
+        self.assertRaises(s3_dr.S3ClientError,
+                          service._read_sha256_index, backup)
+
     @mock_aws
     def test_restore_delta(self):
         volume_id = '04d83506-bcf7-4ff5-9c65-00000051bd2e'
@@ -20,7 +20,6 @@ import hashlib
 import os
 import shutil
 import tempfile
-import threading
 from unittest import mock
 import zlib
 
@@ -51,6 +50,9 @@ ANY = mock.ANY
 
 def fake_md5(arg, usedforsecurity=False):
     class result(object):
+        def update(self, data):
+            pass
+
         def hexdigest(self):
             return 'fake-md5-sum'
 
@@ -801,6 +803,15 @@ class BackupSwiftTestCase(test.TestCase):
             backup.save()
             service.restore(backup, volume_id, volume_file, False)
 
+    def test_is_object_not_found(self):
+        service = swift_dr.SwiftBackupDriver(self.ctxt)
+        self.assertTrue(service._is_object_not_found(
+            swift.ClientException('fake', http_status=404)))
+        self.assertFalse(service._is_object_not_found(
+            swift.ClientException('fake', http_status=401)))
+        self.assertFalse(service._is_object_not_found(
+            exception.SwiftConnectionFailed(reason='fake')))
+
     def test_restore_delta(self):
         volume_id = '04d83506-bcf7-4ff5-9c65-00000051bd2e'
 
@@ -853,6 +864,55 @@ class BackupSwiftTestCase(test.TestCase):
             self.assertTrue(filecmp.cmp(self.volume_file.name,
                             restored_file.name))
 
+    @ddt.data(True, False)
+    def test_restore_delta_zeroed_block_to_new_volume(self, skip_zero_blocks):
+        volume_id = '04d83506-bcf7-4ff5-9c65-00000051bd2e'
+
+        def _fake_generate_object_name_prefix(self, backup):
+            return 'volume_%s_backup_%s' % (backup['volume_id'], backup['id'])
+
+        self.mock_object(swift_dr.SwiftBackupDriver,
+                         '_generate_object_name_prefix',
+                         _fake_generate_object_name_prefix)
+        self.flags(backup_swift_object_size=8 * 1024)
+        self.flags(backup_swift_block_size=1024)
+        self.flags(backup_skip_zero_blocks=skip_zero_blocks)
+        container_name = self.temp_dir.replace(tempfile.gettempdir() + '/',
+                                               '', 1)
+        self.mock_object(swift, 'Connection',
+                         fake_swift_client2.FakeSwiftClient2.Connection)
+        service = swift_dr.SwiftBackupDriver(self.ctxt)
+
+        self._create_backup_db_entry(volume_id=volume_id,
+                                     container=container_name,
+                                     backup_id=fake.BACKUP_ID)
+        backup = objects.Backup.get_by_id(self.ctxt, fake.BACKUP_ID)
+        self.volume_file.seek(0)
+        service.backup(backup, self.volume_file)
+
+        # Zero a whole hash block for the incremental backup.
+        self.volume_file.seek(16 * 1024)
+        self.volume_file.write(bytes(1024))
+        self.volume_file.flush()
+        self._create_backup_db_entry(volume_id=volume_id,
+                                     container=container_name,
+                                     backup_id=fake.BACKUP2_ID,
+                                     parent_id=fake.BACKUP_ID)
+        deltabackup = objects.Backup.get_by_id(self.ctxt, fake.BACKUP2_ID)
+        self.volume_file.seek(0)
+        service.backup(deltabackup, self.volume_file, True)
+
+        with tempfile.NamedTemporaryFile() as restored_file:
+            # A new volume only contains zeroes.
+            restored_file.truncate(self.size_volume_file)
+            deltabackup = objects.Backup.get_by_id(self.ctxt,
+                                                   fake.BACKUP2_ID)
+            deltabackup.status = objects.fields.BackupStatus.RESTORING
+            deltabackup.save()
+            service.restore(deltabackup, volume_id, restored_file, True)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                                        restored_file.name, shallow=False))
+
     def test_restore_wraps_socket_error(self):
         volume_id = 'c1160de7-2774-4f20-bf14-0000001ac139'
         container_name = 'socket_error_on_get'
@@ -942,51 +1002,40 @@ class BackupSwiftTestCase(test.TestCase):
         self.assertIsInstance(compressor, tpool.Proxy)
         self.assertRaises(ValueError, service._get_compressor, 'fake')
 
-    def test_prepare_output_data_effective_compression(self):
-        """Test compression works on a native thread."""
-        # Use dictionary to share data between threads
-        thread_dict = {}
-        original_compress = zlib.compress
-
-        def my_compress(data):
-            thread_dict['compress'] = threading.current_thread()
-            return original_compress(data)
-
-        self.mock_object(zlib, 'compress', side_effect=my_compress)
-
+    def test_process_chunk_effective_compression(self):
         service = swift_dr.SwiftBackupDriver(self.ctxt)
         # Set up buffer of 128 zeroed bytes
         fake_data = b'\0' * 128
 
-        result = service._prepare_output_data(fake_data)
+        _digests, _holes, objects = service._process_chunk(
+            fake_data, len(fake_data), 'zlib')
 
-        self.assertEqual('zlib', result[0])
-        self.assertGreater(len(fake_data), len(result[1]))
-        self.assertNotEqual(threading.current_thread(),
-                            thread_dict['compress'])
+        self.assertEqual([(0, 128, 'zlib', mock.ANY, mock.ANY)], objects)
+        self.assertGreater(len(fake_data), len(objects[0][3]))
 
-    def test_prepare_output_data_no_compresssion(self):
+    def test_process_chunk_no_compresssion(self):
         self.flags(backup_compression_algorithm='none')
         service = swift_dr.SwiftBackupDriver(self.ctxt)
         # Set up buffer of 128 zeroed bytes
         fake_data = b'\0' * 128
 
-        result = service._prepare_output_data(fake_data)
+        _digests, _holes, objects = service._process_chunk(
+            fake_data, len(fake_data), 'none')
 
-        self.assertEqual('none', result[0])
-        self.assertEqual(fake_data, result[1])
+        self.assertEqual([(0, 128, 'none', fake_data, mock.ANY)], objects)
 
-    def test_prepare_output_data_ineffective_compression(self):
+    def test_process_chunk_ineffective_compression(self):
         service = swift_dr.SwiftBackupDriver(self.ctxt)
         # Set up buffer of 128 zeroed bytes
         fake_data = b'\0' * 128
         # Pre-compress so that compression in the driver will be ineffective.
         already_compressed_data = service.compressor.compress(fake_data)
 
-        result = service._prepare_output_data(already_compressed_data)
+        _digests, _holes, objects = service._process_chunk(
+            already_compressed_data, len(already_compressed_data), 'zlib')
 
-        self.assertEqual('none', result[0])
-        self.assertEqual(already_compressed_data, result[1])
+        self.assertEqual([(0, len(already_compressed_data), 'none',
+                           already_compressed_data, mock.ANY)], objects)
 
     @mock.patch('cinder.backup.drivers.swift.SwiftBackupDriver.initialize')
     def test_no_user_context(self, mock_initialize):
@@ -17,6 +17,9 @@
 import os
 import tempfile
 
+from googleapiclient import errors
+import httplib2
+
 
 class FakeGoogleObjectInsertExecute(object):
 
@@ -124,6 +127,8 @@ class FakeGoogleMediaIoBaseDownload(object):
     def __init__(self, fh, req, chunksize=None):
         object_path = (tempfile.gettempdir() + '/' + req.bucket_name + '/' +
                        req.object_name)
+        if not os.path.exists(object_path):
+            raise errors.HttpError(httplib2.Response({'status': 404}), b'')
         with open(object_path, 'rb') as object_file:
             fh.write(object_file.read())
 
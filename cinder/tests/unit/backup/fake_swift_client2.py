@@ -69,6 +69,9 @@ class FakeSwiftConnection2(object):
         if container == 'socket_error_on_get':
             raise socket.error(111, 'ECONNREFUSED')
         object_path = tempfile.gettempdir() + '/' + container + '/' + name
+        if not os.path.exists(object_path):
+            raise swift.ClientException('fake exception',
+                                        http_status=http_client.NOT_FOUND)
         with open(object_path, 'rb') as object_file:
             return (None, object_file.read())
 
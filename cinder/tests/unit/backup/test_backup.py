@@ -30,6 +30,7 @@ from oslo_utils import timeutils
 
 import cinder
 from cinder.backup import api
+from cinder.backup import driver as backup_driver
 from cinder.backup import manager
 from cinder import context
 from cinder import db
@@ -1690,6 +1691,25 @@ class BackupTestCase(BaseBackupTest):
         self.assertGreaterEqual(timeutils.utcnow(), backup.deleted_at)
         self.assertEqual(fields.BackupStatus.DELETED, backup.status)
 
+    def test_delete_backup_cancels_running_backup(self):
+        """Test backup is flagged as cancelled while the driver deletes it."""
+        vol_id = self._create_volume_db_entry(size=1)
+        backup = self._create_backup_db_entry(
+            status=fields.BackupStatus.DELETING, volume_id=vol_id,
+            service='cinder.tests.unit.backup.fake_service.FakeBackupService')
+        cancelled = []
+
+        def _delete_backup(backup):
+            cancelled.append(backup_driver.is_backup_cancelled(backup.id))
+
+        with mock.patch('cinder.tests.unit.backup.fake_service.'
+                        'FakeBackupService.delete_backup',
+                        side_effect=_delete_backup):
+            self.backup_mgr.delete_backup(self.ctxt, backup)
+
+        self.assertEqual([True], cancelled)
+        self.assertFalse(backup_driver.is_backup_cancelled(backup.id))
+
     @mock.patch('cinder.volume.volume_utils.delete_encryption_key')
     def test_delete_backup_of_encrypted_volume(self,
                                                mock_delete_encryption_key):
@@ -13,13 +13,23 @@
 #    under the License.
 """Tests for the base chunkedbackupdriver class."""
 
+import errno
+import hashlib
+import io
 import json
+import os
+import tempfile
+import threading
 from unittest import mock
 
+import ddt
+import eventlet
 from oslo_config import cfg
+from oslo_utils import secretutils
 from oslo_utils import units
 
 from cinder.backup import chunkeddriver as cbd
+from cinder.backup import driver
 from cinder import context
 from cinder import exception
 from cinder import objects
@@ -78,7 +88,8 @@ class TestObjectWriter(object):
         pass
 
     def write(self, data):
-        self.written_data = data
+        # Chunk buffers are reused once the object has been written.
+        self.written_data = bytes(data)
         self.write_count += 1
 
 
@@ -113,6 +124,7 @@ class TestObjectReader(object):
         return json.dumps(self.metadata).encode('utf-8')
 
 
+@ddt.ddt
 class ChunkedDriverTestCase(test.TestCase):
 
     def _create_backup_db_entry(self, volume_id=fake.VOLUME_ID,
@@ -275,7 +287,7 @@ class ChunkedDriverTestCase(test.TestCase):
         with mock.patch.object(self.driver, 'get_object_writer',
                                return_value=obj_writer):
             self.driver._write_sha256file(self.backup, 'volid', 'contain_name',
-                                          ['sha'])
+                                          b'\x01' * 32 + b'\x02' * 32)
 
             self.assertIsNotNone(obj_writer.written_data)
             written_data = obj_writer.written_data.decode('utf-8')
@@ -290,7 +302,205 @@ class ChunkedDriverTestCase(test.TestCase):
                              metadata.get('backup_description'))
             self.assertEqual(self.driver.sha_block_size_bytes,
                              metadata.get('chunk_size'))
-            self.assertEqual(['sha'], metadata.get('sha256s'))
+            self.assertEqual(['01' * 32, '02' * 32], metadata.get('sha256s'))
+
+    def test_write_sha256_index(self):
+        obj_writer = TestObjectWriter('', '')
+        digests = bytes(range(64))
+        with mock.patch.object(self.driver, 'get_object_writer',
+                               return_value=obj_writer) as mock_writer:
+            self.driver._write_sha256_index(self.backup, 'contain_name',
+                                            digests)
+
+        mock_writer.assert_called_once_with(
+            'contain_name', 'test_metadata_sha256index', None)
+        block_size, read_digests = cbd._unpack_sha_index(
+            obj_writer.written_data)
+        self.assertEqual(self.driver.sha_block_size_bytes, block_size)
+        self.assertEqual(digests, read_digests)
+
+    def test_read_sha256_index(self):
+        digests = bytes(range(64))
+        obj_reader = mock.MagicMock()
+        obj_reader.__enter__.return_value.read.return_value = \
+            cbd._pack_sha_index(4, digests)
+        with mock.patch.object(self.driver, 'get_object_reader',
+                               return_value=obj_reader):
+            block_size, read_digests = self.driver._read_sha256_index(
+                self.backup)
+
+        self.assertEqual(4, block_size)
+        self.assertEqual(digests, read_digests)
+
+    @mock.patch.object(cbd.LOG, 'warning')
+    def test_read_sha256_index_fallback(self, mock_warning):
+        obj_reader = mock.MagicMock()
+        obj_reader.__enter__.return_value.read.return_value = b'garbage'
+        sha256file = {'chunk_size': 4, 'sha256s': ['00' * 32, 'ff' * 32]}
+        with mock.patch.object(self.driver, 'get_object_reader',
+                               return_value=obj_reader), \
+                mock.patch.object(self.driver, '_read_sha256file',
+                                  return_value=sha256file):
+            block_size, read_digests = self.driver._read_sha256_index(
+                self.backup)
+
+        self.assertEqual(4, block_size)
+        self.assertEqual(b'\x00' * 32 + b'\xff' * 32, read_digests)
+        mock_warning.assert_called_once()
+
+    @mock.patch.object(cbd.LOG, 'warning')
+    def test_read_sha256_index_missing(self, mock_warning):
+        obj_reader = mock.MagicMock()
+        obj_reader.__enter__.return_value.read.side_effect = (
+            FileNotFoundError(errno.ENOENT, 'missing'))
+        sha256file = {'chunk_size': 4, 'sha256s': ['ff' * 32]}
+        with mock.patch.object(self.driver, 'get_object_reader',
+                               return_value=obj_reader), \
+                mock.patch.object(self.driver, '_read_sha256file',
+                                  return_value=sha256file):
+            block_size, read_digests = self.driver._read_sha256_index(
+                self.backup)
+
+        self.assertEqual(4, block_size)
+        self.assertEqual(b'\xff' * 32, read_digests)
+        mock_warning.assert_not_called()
+
+    def test_read_sha256_index_error(self):
+        obj_reader = mock.MagicMock()
+        obj_reader.__enter__.return_value.read.side_effect = (
+            exception.BackupDriverException(reason='timeout'))
+        with mock.patch.object(self.driver, 'get_object_reader',
+                               return_value=obj_reader), \
+                mock.patch.object(self.driver,
+                                  '_read_sha256file') as mock_read:
+            self.assertRaises(exception.BackupDriverException,
+                              self.driver._read_sha256_index, self.backup)
+        mock_read.assert_not_called()
+
+    def test_process_chunk(self):
+        self.driver.sha_block_size_bytes = 4
+        blocks = [b'aaaa', b'bbbb', b'\0' * 4, b'\0' * 4, b'cccc', b'dd']
+        data = b''.join(blocks)
+        digests = [hashlib.sha256(block).digest() for block in blocks]
+        parent = list(digests)
+        # Only the second and the last blocks are unchanged.
+        parent[0] = parent[3] = parent[4] = b'\xff' * 32
+        parent = b''.join(parent[:5])
+
+        result = self.driver._process_chunk(
+            data, len(data), 'none', parent,
+            self.driver._zero_digests(len(data)))
+
+        def md5(data):
+            return secretutils.md5(data, usedforsecurity=False).hexdigest()
+
+        self.assertEqual((b''.join(digests), [(12, 4)],
+                          [(0, 4, 'none', data[0:4], md5(b'aaaa')),
+                           (16, 6, 'none', data[16:22], md5(b'ccccdd'))]),
+                         result)
+
+    def test_process_chunk_zeroes(self):
+        self.driver.sha_block_size_bytes = 4
+        zero_digests = self.driver._zero_digests(10)
+
+        result = self.driver._process_chunk(None, 10, 'none', None,
+                                            zero_digests)
+
+        self.assertEqual((zero_digests, [(0, 10)], []), result)
+
+    def test_diff_runs(self):
+        digests = b''.join(bytes([i]) * 32 for i in range(10))
+        other = bytearray(digests)
+        for i in (1, 2, 3, 7):
+            other[i * 32] = 0xff
+
+        self.assertEqual([(1, 4), (7, 8)],
+                         cbd._diff_runs(digests, other, 0, 10))
+        self.assertEqual([(2, 4)], cbd._diff_runs(digests, other, 2, 6))
+        self.assertEqual([], cbd._diff_runs(digests, digests, 0, 10))
+        # Blocks missing from the other index differ
+        self.assertEqual([(7, 10)],
+                         cbd._diff_runs(digests, other[:8 * 32], 4, 10))
+
+    @mock.patch.object(cbd, '_PROCESS_WINDOW_BYTES', 8)
+    def test_process_chunk_windows(self):
+        self.driver.sha_block_size_bytes = 4
+        self.driver.compressor = self.driver._get_compressor('none')
+        blocks = [b'aaaa', b'bbbb', b'cccc', b'\0' * 4, b'\0' * 4,
+                  b'\0' * 4, b'dddd', b'eeee', b'ffff']
+        data = b''.join(blocks)
+        digests = [hashlib.sha256(block).digest() for block in blocks]
+        parent = list(digests)
+        # Runs of changed blocks and of zeroes span windows of 2 blocks
+        parent[1] = parent[2] = parent[3] = parent[4] = parent[7] = (
+            b'\xff' * 32)
+
+        result_digests, holes, objects = self.driver._process_chunk(
+            data, len(data), 'none', b''.join(parent),
+            self.driver._zero_digests(len(data)))
+
+        self.assertEqual(b''.join(digests), result_digests)
+        self.assertEqual([(12, 8)], holes)
+        self.assertEqual([(4, 8, b'bbbbcccc'), (28, 4, b'eeee')],
+                         [(offset, length, bytes(output))
+                          for offset, length, _c, output, _m in objects])
+
+    @ddt.data('zlib', 'bz2', 'zstd')
+    def test_process_chunk_compression(self, algorithm):
+        self.driver.compressor = self.driver._get_compressor(algorithm)
+        self.driver.sha_block_size_bytes = 1024
+        data = b'cinder' * 1000
+
+        digests, holes, objects = self.driver._process_chunk(
+            data, len(data), algorithm)
+
+        self.assertEqual(
+            b''.join(hashlib.sha256(data[i:i + 1024]).digest()
+                     for i in range(0, len(data), 1024)),
+            digests)
+        self.assertEqual([], holes)
+        self.assertEqual(1, len(objects))
+        offset, length, compression, output, md5 = objects[0]
+        self.assertEqual((0, len(data), algorithm),
+                         (offset, length, compression))
+        self.assertEqual(data, self.driver.compressor.decompress(output))
+        self.assertEqual(
+            secretutils.md5(data, usedforsecurity=False).hexdigest(), md5)
+
+    def test_process_chunk_ineffective_compression(self):
+        self.driver.compressor = self.driver._get_compressor('zlib')
+        data = os.urandom(1024)
+
+        _digests, _holes, objects = self.driver._process_chunk(
+            data, len(data), 'zlib')
+
+        self.assertEqual('none', objects[0][2])
+        self.assertEqual(data, objects[0][3])
+
+    @mock.patch.object(cbd.ChunkedBackupDriver, '_send_progress_notification')
+    def test_backup_processes_chunks_in_native_threads(self, mock_notify):
+        self.driver.chunk_size_bytes = 8
+        self.driver.chunk_processing_threads = 2
+        content = b''.join(bytes([i]) * 8 for i in range(1, 7))
+        volume_file = io.BytesIO(content)
+        written = []
+
+        def _get_writer(container, object_name, extra_metadata=None):
+            writer = TestObjectWriter(container, object_name)
+            writer.write = lambda data: written.append(bytes(data))
+            return writer
+
+        with mock.patch.object(self.driver, 'get_object_writer',
+                               side_effect=_get_writer), \
+                mock.patch.object(eventlet.tpool, 'execute',
+                                  side_effect=eventlet.tpool.execute) as ex, \
+                mock.patch.object(self.driver, '_finalize_backup'):
+            self.driver.backup(self.backup, volume_file)
+
+        self.assertEqual(content, b''.join(written))
+        process_calls = [c for c in ex.call_args_list
+                         if c[0][0] == self.driver._process_chunk]
+        self.assertEqual(6, len(process_calls))
 
     def test_read_metadata(self):
         obj_reader = TestObjectReader('', '')
@@ -342,7 +552,7 @@ class ChunkedDriverTestCase(test.TestCase):
                               },
                              object_meta)
         self.assertDictEqual({'id': 1,
-                              'sha256s': [],
+                              'sha256s': bytearray(),
                               'prefix': 'test-',
                               },
                              object_sha256)
@@ -358,21 +568,11 @@ class ChunkedDriverTestCase(test.TestCase):
                           self.driver._prepare_backup,
                           backup)
 
-    def test_backup_chunk(self):
-        (object_meta, object_sha256, extra_metadata, container,
-         volume_size_bytes) = self.driver._prepare_backup(self.backup)
+    def test_backup_single_chunk(self):
+        object_meta, _object_sha256, writers = self._backup_file(TEST_DATA)
 
-        obj_writer = TestObjectWriter('', '')
-        with mock.patch.object(self.driver, 'get_object_writer',
-                               return_value=obj_writer):
-            self.driver._backup_chunk(self.backup,
-                                      self.backup.container,
-                                      TEST_DATA,
-                                      0,
-                                      object_meta,
-                                      extra_metadata)
-
-        self.assertEqual(TEST_DATA, obj_writer.written_data)
+        self.assertEqual(['test--00001'], list(writers))
+        self.assertEqual(TEST_DATA, writers['test--00001'].written_data)
         self.assertEqual(1, len(object_meta['list']))
         self.assertEqual(2, object_meta['id'])
 
@@ -382,19 +582,11 @@ class ChunkedDriverTestCase(test.TestCase):
         self.assertEqual(len(TEST_DATA), chunk['length'])
 
     def test_finalize_backup(self):
-        (object_meta, object_sha256, extra_metadata, container,
-         volume_size_bytes) = self.driver._prepare_backup(self.backup)
+        object_meta, object_sha256, _writers = self._backup_file(TEST_DATA)
 
         obj_writer = TestObjectWriter('', '')
         with mock.patch.object(self.driver, 'get_object_writer',
                                return_value=obj_writer):
-            self.driver._backup_chunk(self.backup,
-                                      self.backup.container,
-                                      TEST_DATA,
-                                      0,
-                                      object_meta,
-                                      extra_metadata)
-
             self.driver._finalize_backup(self.backup,
                                          self.backup.container,
                                          object_meta,
@@ -437,9 +629,8 @@ class ChunkedDriverTestCase(test.TestCase):
 
     @mock.patch('cinder.tests.unit.fake_notifier.FakeNotifier._notify')
     def test_backup(self, mock_notify):
-        volume_file = mock.Mock()
-        volume_file.tell.side_effect = [0, len(TEST_DATA)]
-        volume_file.read.side_effect = [TEST_DATA, b'']
+        self.driver.chunk_size_bytes = len(TEST_DATA)
+        volume_file = io.BytesIO(TEST_DATA)
         obj_writer = TestObjectWriter('', '')
         with mock.patch.object(self.driver, 'get_object_writer',
                                return_value=obj_writer):
@@ -447,6 +638,220 @@ class ChunkedDriverTestCase(test.TestCase):
         self.assert_notify_called(mock_notify,
                                   (['INFO', 'backup.createprogress'],))
 
+    @mock.patch('cinder.tests.unit.fake_notifier.FakeNotifier._notify')
+    def test_backup_concurrent_uploads(self, mock_notify):
+        self.driver.chunk_upload_workers = 3
+        self.driver.max_chunks_in_flight = 2
+        self.driver.chunk_size_bytes = 8
+        chunks = [bytes([i]) * 8 for i in range(1, 7)]
+        volume_file = io.BytesIO(b''.join(chunks))
+        writers = {}
+
+        def _get_writer(container, object_name, extra_metadata=None):
+            writers[object_name] = TestObjectWriter(container, object_name)
+            return writers[object_name]
+
+        with mock.patch.object(self.driver, 'get_object_writer',
+                               side_effect=_get_writer), \
+                mock.patch.object(self.driver, '_finalize_backup') as fin:
+            self.driver.backup(self.backup, volume_file)
+
+        object_meta = fin.call_args[0][2]
+        self.assertEqual(len(chunks) + 1, object_meta['id'])
+        for i, obj in enumerate(object_meta['list']):
+            name = 'test--%05d' % (i + 1)
+            self.assertEqual([name], list(obj))
+            self.assertEqual(i * 8, obj[name]['offset'])
+            self.assertEqual(8, obj[name]['length'])
+            self.assertEqual('none', obj[name]['compression'])
+            self.assertIn('md5', obj[name])
+            self.assertEqual(chunks[i], writers[name].written_data)
+
+    def test_backup_concurrent_upload_error(self):
+        self.driver.chunk_upload_workers = 2
+        volume_file = io.BytesIO(b'abc')
+
+        with mock.patch.object(self.driver, 'get_object_writer',
+                               side_effect=exception.BackupDriverException(
+                                   reason='write failed')), \
+                mock.patch.object(self.driver, '_finalize_backup') as fin:
+            self.assertRaises(exception.BackupDriverException,
+                              self.driver.backup, self.backup, volume_file)
+        fin.assert_not_called()
+
+    def _backup_file(self, content):
+        self.driver.chunk_size_bytes = 4096
+        self.driver.sha_block_size_bytes = 1024
+        writers = {}
+
+        def _get_writer(container, object_name, extra_metadata=None):
+            writers[object_name] = TestObjectWriter(container, object_name)
+            return writers[object_name]
+
+        with tempfile.NamedTemporaryFile() as volume_file, \
+                mock.patch.object(self.driver, 'get_object_writer',
+                                  side_effect=_get_writer), \
+                mock.patch.object(self.driver, '_finalize_backup') as fin:
+            volume_file.write(content)
+            volume_file.flush()
+            volume_file.seek(0)
+            self.driver.backup(self.backup, volume_file)
+
+        return fin.call_args[0][2], fin.call_args[0][3], writers
+
+    def test_backup_zero_blocks(self):
+        self.driver.skip_zero_blocks = True
+        content = bytes(1024) + b'a' * 1024 + bytes(2048) + b'b' * 512
+        object_meta, object_sha256, writers = self._backup_file(content)
+
+        self.assertEqual([[0, 1024], [2048, 2048]], object_meta['holes'])
+        self.assertEqual(
+            [{'test--00001': {'offset': 1024, 'length': 1024,
+                              'compression': 'none',
+                              'md5': mock.ANY}},
+             {'test--00002': {'offset': 4096, 'length': 512,
+                              'compression': 'none',
+                              'md5': mock.ANY}}],
+            object_meta['list'])
+        self.assertEqual(b'a' * 1024, writers['test--00001'].written_data)
+        self.assertEqual(5 * cbd.SHA256_DIGEST_SIZE,
+                         len(object_sha256['sha256s']))
+
+    def test_backup_zero_blocks_disabled(self):
+        self.driver.skip_zero_blocks = False
+        content = bytes(1024) + b'a' * 1024
+        object_meta, object_sha256, writers = self._backup_file(content)
+
+        self.assertNotIn('holes', object_meta)
+        self.assertEqual(content, writers['test--00001'].written_data)
+
+    @mock.patch('os.close')
+    @mock.patch('os.lseek')
+    @mock.patch('os.open', return_value=5)
+    def test_sparse_file_probe(self, mock_open, mock_lseek, mock_close):
+        mock_lseek.side_effect = [
+            16384, 8192, 8192, OSError(errno.ENXIO, 'No data')]
+        probe = cbd._SparseFileProbe(mock.Mock())
+
+        self.assertEqual(16384, probe.size)
+        self.assertEqual(4096, probe.hole_length(0, 4096))
+        self.assertEqual(0, probe.hole_length(8192, 4096))
+        self.assertEqual(4096, probe.hole_length(12288, 8192))
+        self.assertEqual(0, probe.hole_length(16384, 4096))
+        probe.close()
+        mock_close.assert_called_once_with(5)
+
+    @mock.patch('os.close')
+    @mock.patch('os.lseek')
+    @mock.patch('os.open', return_value=5)
+    def test_sparse_file_probe_unsupported(self, mock_open, mock_lseek,
+                                           mock_close):
+        mock_lseek.side_effect = [16384, OSError(errno.EINVAL, 'Invalid')]
+        probe = cbd._SparseFileProbe(mock.Mock())
+
+        self.assertEqual(0, probe.hole_length(0, 4096))
+        self.assertEqual(0, probe.hole_length(0, 4096))
+        mock_close.assert_called_once_with(5)
+
+    @mock.patch.object(cbd, 'time')
+    def test_backup_status_check_interval(self, mock_time):
+        mock_time.monotonic.side_effect = [0, 1, 2, 10]
+        self.driver.status_check_interval = 5
+        volume_file = io.BytesIO(b'abc')
+
+        with mock.patch.object(self.backup, 'refresh') as mock_refresh, \
+                mock.patch.object(self.driver, 'get_object_writer',
+                                  side_effect=TestObjectWriter), \
+                mock.patch.object(self.driver, '_finalize_backup'):
+            self.driver.backup(self.backup, volume_file)
+
+        self.assertEqual(2, mock_refresh.call_count)
+
+    def test_backup_cancelled_by_this_process(self):
+        volume_file = io.BytesIO(b'abc')
+        self.addCleanup(driver.clear_cancelled_backup, self.backup.id)
+        driver.cancel_backup(self.backup.id)
+
+        with mock.patch.object(self.backup, 'refresh') as mock_refresh, \
+                mock.patch.object(self.driver, 'delete_backup') as mock_del, \
+                mock.patch.object(self.driver, '_finalize_backup') as fin:
+            self.driver.backup(self.backup, volume_file)
+
+        mock_refresh.assert_not_called()
+        mock_del.assert_called_once_with(self.backup)
+        fin.assert_not_called()
+        self.assertEqual(0, volume_file.tell())
+
+    def test_backup_reuses_chunk_buffers(self):
+        self.driver.chunk_size_bytes = 8
+        content = b''.join(bytes([i]) * 8 for i in range(1, 7)) + b'c' * 4
+        volume_file = io.BytesIO(content)
+        written = []
+
+        def _get_writer(container, object_name, extra_metadata=None):
+            writer = TestObjectWriter(container, object_name)
+            writer.write = lambda data: written.append(bytes(data))
+            return writer
+
+        with mock.patch.object(self.driver, 'get_object_writer',
+                               side_effect=_get_writer), \
+                mock.patch.object(cbd, 'bytearray',
+                                  side_effect=bytearray,
+                                  create=True) as mock_bytearray, \
+                mock.patch.object(self.driver, '_finalize_backup'):
+            self.driver.backup(self.backup, volume_file)
+
+        self.assertEqual(content, b''.join(written))
+        self.assertEqual(7, len(written))
+        # One upload worker, one queued chunk and one chunk being processed
+        # plus the one being read.
+        buffers = [c for c in mock_bytearray.call_args_list
+                   if c == mock.call(self.driver.chunk_size_bytes)]
+        self.assertLessEqual(len(buffers), 4)
+
+    def test_process_chunk_memoryview_zstd(self):
+        self.driver.compressor = self.driver._get_compressor('zstd')
+        self.driver.sha_block_size_bytes = 1024
+        data = memoryview(bytearray(b'a' * 1024))
+
+        _digests, _holes, objects = self.driver._process_chunk(
+            data, len(data), 'zstd')
+
+        self.assertEqual([(0, 1024, 'zstd', mock.ANY, mock.ANY)], objects)
+        self.assertEqual(bytes(data),
+                         self.driver.compressor.decompress(objects[0][3]))
+
+    def test_backup_compresses_in_native_thread(self):
+        self.driver.compressor = self.driver._get_compressor('zlib')
+        self.flags(backup_compression_algorithm='zlib')
+        threads = []
+        original_process_chunk = self.driver._process_chunk
+
+        def _process_chunk(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return original_process_chunk(*args, **kwargs)
+
+        with mock.patch.object(self.driver, '_process_chunk',
+                               side_effect=_process_chunk):
+            object_meta, _object_sha256, writers = self._backup_file(
+                TEST_DATA)
+
+        self.assertEqual(1, len(threads))
+        self.assertNotEqual(threading.current_thread(), threads[0])
+        self.assertEqual(
+            'zlib', object_meta['list'][0]['test--00001']['compression'])
+        self.assertGreater(len(TEST_DATA),
+                           len(writers['test--00001'].written_data))
+
+    def test_read_into_without_readinto(self):
+        volume_file = mock.Mock(spec=['read'])
+        volume_file.read.return_value = b'abc'
+
+        data = cbd._read_into(volume_file, bytearray(8), 8)
+
+        self.assertEqual(b'abc', data)
+        volume_file.read.assert_called_once_with(8)
+
     def test_backup_invalid_size(self):
         self.driver.chunk_size_bytes = 999
         self.driver.sha_block_size_bytes = 1024
@@ -470,6 +875,80 @@ class ChunkedDriverTestCase(test.TestCase):
 
         restore_test.assert_called()
 
+    def test_restore_v1_prefetch(self):
+        self.driver.restore_prefetch_objects = 3
+        self.backup.status = fields.BackupStatus.RESTORING
+        self.backup.save()
+        names = ['test--%05d' % i for i in range(1, 6)]
+        metadata = {'objects': [{name: {'offset': i * 4, 'length': 4,
+                                        'compression': 'none'}}
+                                for i, name in enumerate(names)]}
+        fetched = []
+
+        class _Reader(TestObjectReader):
+            def read(reader_self):
+                fetched.append(reader_self.filename)
+                return reader_self.filename[-4:].encode('utf-8')
+
+        volume_file = io.BytesIO()
+        with mock.patch.object(self.driver, '_generate_object_names',
+                               return_value=names), \
+                mock.patch.object(self.driver, 'get_object_reader',
+                                  side_effect=_Reader):
+            self.driver._restore_v1(self.backup, self.volume, metadata,
+                                    volume_file, False, self.backup)
+
+        self.assertEqual(sorted(names), sorted(fetched))
+        self.assertEqual(b'00010002000300040005', volume_file.getvalue())
+
+    def test_restore_v1_holes(self):
+        self.backup.status = fields.BackupStatus.RESTORING
+        self.backup.save()
+        metadata = {'objects': [], 'holes': [[2, 3], [8, 1]]}
+
+        for volume_is_new, expected in ((False, b'xx\0\0\0xxx\0x'),
+                                        (True, b'x' * 10)):
+            volume_file = io.BytesIO(b'x' * 10)
+            with mock.patch.object(self.driver, '_generate_object_names',
+                                   return_value=[]):
+                self.driver._restore_v1(self.backup, self.volume, metadata,
+                                        volume_file, volume_is_new,
+                                        self.backup)
+            self.assertEqual(expected, volume_file.getvalue())
+
+    def test_restore_v1_holes_incremental(self):
+        self.backup.status = fields.BackupStatus.RESTORING
+        self.backup.save()
+        backup = self._create_backup_db_entry(
+            self.volume, parent_id=self.backup.id)
+        metadata = {'objects': [], 'holes': [[2, 3], [8, 1]]}
+
+        # Incremental backups are restored over the data of their parents,
+        # even on new volumes.
+        volume_file = io.BytesIO(b'x' * 10)
+        with mock.patch.object(self.driver, '_generate_object_names',
+                               return_value=[]):
+            self.driver._restore_v1(backup, self.volume, metadata,
+                                    volume_file, True, self.backup)
+        self.assertEqual(b'xx\0\0\0xxx\0x', volume_file.getvalue())
+
+    def test_object_prefetcher_max_bytes(self):
+        running = set()
+        max_running = []
+
+        def _fetch(name, obj):
+            running.add(name)
+            max_running.append(len(running))
+            eventlet.sleep(0)
+            running.discard(name)
+            return name
+
+        objs = [('obj%d' % i, {'length': 10}) for i in range(6)]
+        prefetcher = cbd._ObjectPrefetcher(_fetch, objs, 4, max_bytes=20)
+
+        self.assertEqual(['obj%d' % i for i in range(6)], list(prefetcher))
+        self.assertLessEqual(max(max_running), 2)
+
     def test_delete_backup(self):
         with mock.patch.object(self.driver, 'delete_object') as mock_delete:
             self.driver.delete_backup(self.backup)
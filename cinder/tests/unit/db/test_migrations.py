@@ -396,6 +396,12 @@ class MigrationsWalk(
         self.assertEqual({'backups', 'backup_gigabytes'},
                          {r[0] for r in res})
 
+    def _check_4224b69ac391(self, connection):
+        """Test resources have created_at indexes."""
+        for table in ('volumes', 'snapshots', 'backups'):
+            self.assertTrue(db_utils.index_exists_on_columns(
+                connection, table, ('deleted', 'created_at', 'id')))
+
     # TODO: (D Release) Uncomment method _check_afd7494d43b7 and create a
     # migration with hash afd7494d43b7 using the following command:
     #   $ tox -e venv -- alembic -c cinder/db/alembic.ini revision \
@@ -16,6 +16,7 @@
 """Tests for db purge."""
 
 import datetime
+from unittest import mock
 import uuid
 
 from oslo_db import exception as db_exc
@@ -345,6 +346,51 @@ class PurgeDeletedTest(test.TestCase):
         self.assertEqual(4, vol_glance_meta_rows)
         self.assertEqual(4, qos_rows)
 
+    def _count_rows(self):
+        tables = (self.volumes, self.vm, self.vol_types, self.vol_type_proj,
+                  self.snapshots, self.sm, self.vgm, self.qos)
+        with db_api.main_context_manager.reader.using(self.context):
+            return [self.context.session.query(table).count()
+                    for table in tables]
+
+    def test_purge_deleted_rows_in_batches(self):
+        progress = mock.Mock()
+
+        rows_purged = db.purge_deleted_rows(self.context, age_in_days=10,
+                                            batch_size=1, progress=progress)
+
+        # Same rows as test_purge_deleted_rows_older, one per transaction
+        self.assertEqual([2, 2, 5, 2, 2, 2, 4, 4], self._count_rows())
+        self.assertEqual(44, rows_purged)
+        progress.assert_has_calls([mock.call('volumes', 1),
+                                   mock.call('volumes', 2),
+                                   mock.call('volumes', 3),
+                                   mock.call('volumes', 4)])
+        self.assertEqual(44, progress.call_count)
+
+    @mock.patch('time.sleep')
+    def test_purge_deleted_rows_in_batches_sleep(self, mock_sleep):
+        db.purge_deleted_rows(self.context, age_in_days=30, batch_size=2,
+                              batch_sleep=0.5)
+
+        self.assertEqual([4, 4, 9, 4, 4, 4, 8, 8], self._count_rows())
+        mock_sleep.assert_any_call(0.5)
+
+    def test_purge_deleted_rows_in_batches_workers(self):
+        rows_purged = db.purge_deleted_rows(self.context, age_in_days=0,
+                                            batch_size=3, workers=4)
+
+        self.assertEqual([1, 1, 3, 1, 1, 1, 2, 2], self._count_rows())
+        self.assertEqual(55, rows_purged)
+
+    def test_purge_waves(self):
+        tables = [self.vgm, self.sm, self.snapshots, self.vm, self.volumes]
+
+        waves = list(db_api._purge_waves(tables))
+
+        self.assertEqual([[self.vgm, self.sm, self.vm], [self.snapshots],
+                          [self.volumes]], waves)
+
     def test_purge_deleted_rows_bad_args(self):
         # Test with no age argument
         self.assertRaises(TypeError, db.purge_deleted_rows, self.context)
@@ -376,3 +422,15 @@ class PurgeDeletedTest(test.TestCase):
         # Verify that purge_deleted_rows fails due to Foreign Key constraint
         self.assertRaises(db_exc.DBReferenceError, db.purge_deleted_rows,
                           self.context, age_in_days=10)
+
+    def test_purge_deleted_rows_in_batches_integrity_failure(self):
+        uuid_str = uuid.uuid4().hex
+        with db_api.main_context_manager.writer.using(self.context):
+            self.context.session.execute(self.volumes.insert().values(
+                id=uuid_str, volume_type_id=uuid_str, deleted=True,
+                deleted_at=timeutils.utcnow() - datetime.timedelta(days=20)))
+            self.context.session.execute(
+                self.vm.insert().values(volume_id=uuid_str))
+
+        self.assertRaises(db_exc.DBReferenceError, db.purge_deleted_rows,
+                          self.context, age_in_days=10, batch_size=1)
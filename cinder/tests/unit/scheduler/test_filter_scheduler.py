@@ -183,6 +183,29 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertIsNotNone(weighed_host.obj)
         self.assertTrue(_mock_service_get_all.called)
 
+    @mock.patch('cinder.db.service_get_all')
+    def test_schedule_weighs_top_backend_only(self, _mock_service_get_all):
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+        fakes.mock_host_manager_db_calls(_mock_service_get_all)
+        request_spec = {'volume_type': {'name': 'LVM_iSCSI'},
+                        'volume_properties': {'project_id': 1,
+                                              'size': 1}}
+        request_spec = objects.RequestSpec.from_primitives(request_spec)
+        expected = sched._get_weighted_candidates(fake_context, request_spec,
+                                                  {})
+
+        with mock.patch.object(sched.host_manager, 'get_weighed_backends',
+                               wraps=sched.host_manager.get_weighed_backends
+                               ) as mock_weigh:
+            weighed_host = sched._schedule(fake_context, request_spec, {})
+
+        self.assertEqual(1, mock_weigh.call_args[1]['limit'])
+        self.assertEqual(expected[0].obj.backend_id,
+                         weighed_host.obj.backend_id)
+
     @ddt.data(('host10@BackendA', True),
               ('host10@BackendB#openstack_nfs_1', True),
               ('host10', False))
@@ -25,6 +25,7 @@ from cinder import db
 from cinder import exception
 from cinder.scheduler import filters
 from cinder.scheduler.filters import extra_specs_ops
+from cinder.scheduler import host_manager
 from cinder.tests.unit import fake_constants as fake
 from cinder.tests.unit.scheduler import fakes
 from cinder.tests.unit import test
@@ -597,6 +598,7 @@ class CapacityFilterTestCase(BackendFiltersTestCase):
         self.assertTrue(filt_cls.backend_passes(host, filter_properties))
 
 
+@ddt.ddt
 class AffinityFilterTestCase(BackendFiltersTestCase):
     @mock.patch('cinder.objects.service.Service.is_up',
                 new_callable=mock.PropertyMock)
@@ -817,6 +819,79 @@ class AffinityFilterTestCase(BackendFiltersTestCase):
 
         self.assertFalse(filt_cls.backend_passes(host, filter_properties))
 
+    def test_different_filter_all(self):
+        filt_cls = self.class_map['DifferentBackendFilter']()
+        backends = [fakes.FakeBackendState('host1@lvm#pool0', {}),
+                    fakes.FakeBackendState('host1@lvm#pool1', {}),
+                    fakes.FakeBackendState('host2@lvm#pool0', {}),
+                    fakes.FakeBackendState('host3@lvm', {}),
+                    fakes.FakeBackendState('host4@lvm#pool0',
+                                           {'cluster_name': 'cluster@lvm'})]
+        volume1 = utils.create_volume(self.context, host='host1@lvm#pool1')
+        volume2 = utils.create_volume(self.context, host='host3@lvm#pool0')
+        volume3 = utils.create_volume(self.context, host='host5@lvm#pool0',
+                                      cluster_name='cluster@lvm#pool0')
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {
+            'different_host': [volume1.id, volume2.id, volume3.id], }}
+
+        with mock.patch.object(filt_cls.volume_api, 'get_all',
+                               wraps=filt_cls.volume_api.get_all) as get_all:
+            result = filt_cls.filter_all(backends, filter_properties)
+
+        self.assertEqual([backends[0], backends[2]], list(result))
+        get_all.assert_called_once()
+
+    def test_same_filter_all(self):
+        filt_cls = self.class_map['SameBackendFilter']()
+        backends = [fakes.FakeBackendState('host1@lvm#pool0', {}),
+                    fakes.FakeBackendState('host1@lvm#pool1', {}),
+                    fakes.FakeBackendState('host2@lvm#pool0', {}),
+                    fakes.FakeBackendState('host3@lvm', {}),
+                    fakes.FakeBackendState('host4@lvm#pool0',
+                                           {'cluster_name': 'cluster@lvm'})]
+        volume1 = utils.create_volume(self.context, host='host1@lvm#pool1')
+        volume2 = utils.create_volume(self.context, host='host3@lvm#pool0')
+        volume3 = utils.create_volume(self.context, host='host5@lvm#pool0',
+                                      cluster_name='cluster@lvm#pool0')
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {
+            'same_host': [volume1.id, volume2.id, volume3.id], }}
+
+        result = filt_cls.filter_all(backends, filter_properties)
+
+        self.assertEqual([backends[1], backends[3], backends[4]],
+                         list(result))
+
+    @ddt.data('DifferentBackendFilter', 'SameBackendFilter')
+    def test_affinity_filter_all_invalid_hint(self, filter_name):
+        filt_cls = self.class_map[filter_name]()
+        backends = [fakes.FakeBackendState('host1', {})]
+        hint = ('different_host' if filter_name == 'DifferentBackendFilter'
+                else 'same_host')
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {hint: "NOT-a-valid-UUID"}}
+
+        self.assertEqual([], list(filt_cls.filter_all(backends,
+                                                      filter_properties)))
+
+    @ddt.data('DifferentBackendFilter', 'SameBackendFilter')
+    def test_affinity_filter_all_no_hint(self, filter_name):
+        filt_cls = self.class_map[filter_name]()
+        backends = [fakes.FakeBackendState('host1', {})]
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': None}
+
+        with mock.patch.object(filt_cls.volume_api, 'get_all') as get_all:
+            result = filt_cls.filter_all(backends, filter_properties)
+
+        self.assertEqual(backends, list(result))
+        get_all.assert_not_called()
+
 
 class DriverFilterTestCase(BackendFiltersTestCase):
     def test_passing_function(self):
@@ -1250,6 +1325,30 @@ class BasicFiltersTestCase(BackendFiltersTestCase):
         assertion = self.assertTrue if passes else self.assertFalse
         assertion(filt_cls.backend_passes(host, filter_properties))
 
+        # The pool index must never drop a backend that passes the filter
+        if passes:
+            index = host_manager.PoolIndex([host])
+            self.assertIn(host, index.lookup(
+                filt_cls.indexed_requirements(filter_properties)))
+
+    def test_capability_filter_indexed_requirements(self):
+        filt_cls = self.class_map['CapabilitiesFilter']()
+        filter_properties = {'resource_type': {
+            'name': 'fake_type',
+            'extra_specs': {'volume_backend_name': 'lvm',
+                            'capabilities:storage_protocol': 'iSCSI',
+                            'capabilities:nested:key': 'value',
+                            'vendor:scoped': 'value',
+                            'opt1': '<in> value',
+                            'opt2': '<or> a <or> b',
+                            'opt3': '>= 10'}}}
+
+        self.assertEqual(
+            [[('capabilities', 'volume_backend_name', 'lvm')],
+             [('capabilities', 'storage_protocol', 'iSCSI')]],
+            filt_cls.indexed_requirements(filter_properties))
+        self.assertEqual([], filt_cls.indexed_requirements({}))
+
     def test_capability_filter_passes_extra_specs_simple(self):
         self._do_test_type_filter_extra_specs(
             ecaps={'opt1': '1', 'opt2': '2'},
@@ -1747,6 +1846,18 @@ class BasicFiltersTestCase(BackendFiltersTestCase):
         host = fakes.FakeBackendState('host1', {'service': service})
         self.assertFalse(filt_cls.backend_passes(host, request))
 
+    def test_availability_zone_filter_indexed_requirements(self):
+        filt_cls = self.class_map['AvailabilityZoneFilter']()
+
+        self.assertEqual(
+            [[('availability_zone', 'nova')]],
+            filt_cls.indexed_requirements(self._make_zone_request('nova')))
+        self.assertEqual(
+            [[('availability_zone', 'nova1'), ('availability_zone', 'nova2')]],
+            filt_cls.indexed_requirements(
+                {'request_spec': {'availability_zones': ['nova1', 'nova2']}}))
+        self.assertEqual([], filt_cls.indexed_requirements({}))
+
     def test_availability_zone_filter_empty(self):
         filt_cls = self.class_map['AvailabilityZoneFilter']()
         service = {'availability_zone': 'nova'}
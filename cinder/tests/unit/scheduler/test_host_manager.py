@@ -112,6 +112,135 @@ class HostManagerTestCase(test.TestCase):
         self.assertEqual(expected, mock_func.call_args_list)
         self.assertEqual(set(self.fake_backends), set(result))
 
+    def test_pool_index_lookup(self):
+        pools = []
+        for i, (backend_name, protocol, az) in enumerate((
+                ('lvm', ['iSCSI', 'iscsi'], 'az1'),
+                ('lvm', ['FC', 'fibre_channel'], 'az1'),
+                ('ceph', 'ceph', 'az2'),
+                ('lvm', ['iSCSI', 'iscsi'], 'az3'))):
+            pools.append(host_manager.PoolState(
+                'host%d' % i, None,
+                {'volume_backend_name': backend_name,
+                 'storage_protocol': protocol,
+                 'total_capacity_gb': 10},
+                'pool'))
+            pools[-1].update_capabilities(pools[-1].capabilities,
+                                          {'availability_zone': az})
+        index = host_manager.PoolIndex(pools)
+
+        self.assertEqual(frozenset(pools), index.lookup([]))
+        self.assertEqual(
+            {pools[0], pools[1], pools[3]},
+            index.lookup([[('capabilities', 'volume_backend_name', 'lvm')]]))
+        self.assertEqual(
+            {pools[0]},
+            index.lookup([[('capabilities', 'volume_backend_name', 'lvm')],
+                          [('capabilities', 'storage_protocol', 'iscsi')],
+                          [('availability_zone', 'az1'),
+                           ('availability_zone', 'az2')]]))
+        self.assertEqual(
+            set(),
+            index.lookup([[('capabilities', 'total_capacity_gb', '10')]]))
+
+        index.remove(pools[0])
+        pools[3].update_capabilities(
+            dict(pools[3].capabilities, volume_backend_name='ceph'),
+            {'availability_zone': 'az3'})
+        index.remove(pools[3])
+        index.add(pools[3])
+        self.assertEqual(
+            {pools[1]},
+            index.lookup([[('capabilities', 'volume_backend_name', 'lvm')]]))
+        self.assertEqual(
+            {pools[2], pools[3]},
+            index.lookup([[('capabilities', 'volume_backend_name', 'ceph')]]))
+        self.assertEqual({pools[1]},
+                         index.lookup([[('availability_zone', 'az1')]]))
+
+    @mock.patch('cinder.objects.Service.is_up', True)
+    def test_get_filtered_backends_preselects_indexed_pools(self):
+        ctxt = context.RequestContext(fake.USER_ID, fake.PROJECT_ID, True)
+        for host, backend_name in (('host1', 'lvm'), ('host2', 'ceph')):
+            db.service_create(ctxt,
+                              {'host': host,
+                               'topic': constants.VOLUME_TOPIC,
+                               'binary': constants.VOLUME_BINARY,
+                               'created_at': timeutils.utcnow()})
+            self.host_manager.update_service_capabilities(
+                'volume', host, {'volume_backend_name': backend_name}, None,
+                None)
+        pools = list(self.host_manager.get_all_backend_states(ctxt))
+        not_indexed = host_manager.BackendState('host3', None)
+        filter_properties = {'resource_type': {
+            'extra_specs': {'volume_backend_name': 'lvm'}}}
+
+        with mock.patch.object(host_manager.HostManager,
+                               '_choose_backend_filters',
+                               return_value=[FakeFilterClass1]), \
+                mock.patch.object(FakeFilterClass1, 'indexed_requirements',
+                                  return_value=[[('capabilities',
+                                                  'volume_backend_name',
+                                                  'lvm')]]), \
+                mock.patch.object(FakeFilterClass1, '_filter_one',
+                                  return_value=True) as mock_filter_one:
+            result = self.host_manager.get_filtered_backends(
+                pools + [not_indexed], filter_properties, ['FakeFilterClass1'])
+
+        lvm_pool = [pool for pool in pools if pool.host == 'host1#lvm']
+        self.assertEqual(lvm_pool + [not_indexed], result)
+        self.assertEqual(2, mock_filter_one.call_count)
+
+    @mock.patch('cinder.objects.Service.is_up', True)
+    def test_pool_index_updated_incrementally(self):
+        ctxt = context.RequestContext(fake.USER_ID, fake.PROJECT_ID, True)
+        for host, backend_name in (('host1', 'lvm'), ('host2', 'ceph')):
+            db.service_create(ctxt,
+                              {'host': host,
+                               'topic': constants.VOLUME_TOPIC,
+                               'binary': constants.VOLUME_BINARY,
+                               'created_at': timeutils.utcnow()})
+            self.host_manager.update_service_capabilities(
+                'volume', host, {'volume_backend_name': backend_name}, None,
+                None)
+        self.host_manager.get_all_backend_states(ctxt)
+        requirements = [[('capabilities', 'volume_backend_name', 'lvm')]]
+
+        with mock.patch.object(host_manager, 'PoolIndex',
+                               wraps=host_manager.PoolIndex) as mock_index:
+            self.host_manager._preselect_backends([], [], {})
+            self.assertEqual(
+                ['host1#lvm'],
+                [p.host for p in self.host_manager._preselect_backends(
+                    [mock.Mock(indexed_requirements=mock.Mock(
+                        return_value=requirements))],
+                    self.host_manager.get_all_backend_states(ctxt), {})])
+            index = self.host_manager._pool_index
+            all_pools = self.host_manager._all_pools
+
+            # A new report of host2 only replaces the pools of host2
+            self.host_manager.update_service_capabilities(
+                'volume', 'host2', {'volume_backend_name': 'lvm'}, None,
+                None)
+            backends = self.host_manager.get_all_backend_states(ctxt)
+            self.assertIs(index, self.host_manager._pool_index)
+            self.assertIs(all_pools, self.host_manager._all_pools)
+            self.assertEqual({'host1#lvm', 'host2#lvm'},
+                             {p.host for p in index.lookup(requirements)})
+            self.assertEqual(2, len(backends))
+
+            # A backend that goes away is dropped from the index
+            with mock.patch('cinder.objects.Service.is_up',
+                            new_callable=mock.PropertyMock,
+                            side_effect=[True, False]):
+                backends = self.host_manager.get_all_backend_states(ctxt)
+            self.assertEqual(['host1#lvm'], [p.host for p in backends])
+            self.assertEqual(['host1#lvm'],
+                             [p.host for p in index.lookup(requirements)])
+            self.assertEqual(['host1.lvm'], list(all_pools))
+
+        mock_index.assert_called_once()
+
     @mock.patch(
         'cinder.scheduler.host_manager.HostManager._is_just_initialized')
     @mock.patch('cinder.scheduler.host_manager.HostManager._get_updated_pools')
@@ -739,6 +868,49 @@ class HostManagerTestCase(test.TestCase):
                     ('non_clustered_host#_pool0', 4000)}
         self.assertSetEqual(expected, result)
 
+    @mock.patch('cinder.objects.Service.is_up', True)
+    def test_get_all_backend_states_incremental(self):
+        ctxt = context.RequestContext(fake.USER_ID, fake.PROJECT_ID, True)
+        for host in ('host1', 'host2'):
+            db.service_create(ctxt,
+                              {'host': host,
+                               'topic': constants.VOLUME_TOPIC,
+                               'binary': constants.VOLUME_BINARY,
+                               'created_at': timeutils.utcnow()})
+            self.host_manager.update_service_capabilities(
+                'volume', host, {'free_capacity_gb': 1000}, None, None)
+
+        with mock.patch.object(host_manager.BackendState,
+                               'update_from_volume_capability',
+                               autospec=True,
+                               side_effect=host_manager.BackendState.
+                               update_from_volume_capability) as mock_update:
+            pools = list(self.host_manager.get_all_backend_states(ctxt))
+            self.assertEqual(2, len(pools))
+
+            # Nothing changed, so the same pools are returned
+            mock_update.reset_mock()
+            self.assertEqual(
+                pools, list(self.host_manager.get_all_backend_states(ctxt)))
+            mock_update.assert_not_called()
+
+            # Only the backend with a new report is updated
+            self.host_manager.update_service_capabilities(
+                'volume', 'host2', {'free_capacity_gb': 500}, None, None)
+            res = self.host_manager.get_all_backend_states(ctxt)
+            self.assertEqual({('host1#_pool0', 1000), ('host2#_pool0', 500)},
+                             {(s.host, s.free_capacity_gb) for s in res})
+            mock_update.assert_called_once_with(
+                self.host_manager.backend_state_map['host2'], mock.ANY,
+                service=mock.ANY)
+
+        # A service going down removes its pools
+        with mock.patch('cinder.objects.Service.is_up',
+                        new_callable=mock.PropertyMock,
+                        side_effect=[True, False]):
+            res = self.host_manager.get_all_backend_states(ctxt)
+        self.assertEqual(['host1#_pool0'], [s.host for s in res])
+
     @mock.patch('cinder.db.service_get_all')
     @mock.patch('cinder.objects.service.Service.is_up',
                 new_callable=mock.PropertyMock)
@@ -245,6 +245,16 @@ class SchedulerManagerTestCase(test.TestCase):
 
         mock_clean.assert_called_once_with(self.context)
 
+    @mock.patch('cinder.scheduler.stats.STATS.log_stats')
+    def test_log_scheduler_stats(self, mock_log_stats):
+        # Disabled by default
+        self.manager._log_scheduler_stats(self.context)
+        mock_log_stats.assert_not_called()
+
+        self.flags(scheduler_stats_interval=300)
+        self.manager._log_scheduler_stats(self.context)
+        mock_log_stats.assert_called_once_with(reset=True)
+
     @mock.patch('cinder.scheduler.driver.Scheduler.'
                 'update_service_capabilities')
     def test_update_service_capabilities_empty_dict(self, _mock_update_cap):
@@ -0,0 +1,112 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For Scheduler Filter and Weigher Statistics.
+"""
+
+from unittest import mock
+
+from sqlalchemy import engine
+from sqlalchemy import event
+
+from cinder import context
+from cinder import db
+from cinder.scheduler import base_filter
+from cinder.scheduler import base_weight
+from cinder.scheduler import stats
+from cinder.tests.unit import test
+
+
+class FakeFilter(base_filter.BaseFilter):
+    def _filter_one(self, obj, filter_properties):
+        return obj % 2 == 0
+
+
+class FakeWeigher(base_weight.BaseWeigher):
+    def _weigh_object(self, obj, weight_properties):
+        return obj
+
+
+class HandlerStatsTestCase(test.TestCase):
+    def setUp(self):
+        super(HandlerStatsTestCase, self).setUp()
+        self.stats = stats.HandlerStats()
+
+    @mock.patch('time.monotonic')
+    def test_record(self, mock_monotonic):
+        mock_monotonic.side_effect = [10.0, 10.5, 20.0, 20.1]
+        start = self.stats.start()
+        self.stats.record('filter', 'FakeFilter', start, 10, 4)
+        start = self.stats.start()
+        self.stats.record('filter', 'FakeFilter', start, 4, 4)
+
+        result = self.stats.get_stats(reset=True)
+
+        self.assertEqual({('filter', 'FakeFilter')}, set(result))
+        value = result[('filter', 'FakeFilter')]
+        self.assertEqual(2, value['calls'])
+        self.assertAlmostEqual(0.6, value['time'])
+        self.assertAlmostEqual(0.5, value['max_time'])
+        self.assertEqual(0, value['db_queries'])
+        self.assertEqual(14, value['backends_in'])
+        self.assertEqual(8, value['backends_out'])
+        self.assertEqual({}, self.stats.get_stats())
+
+    def test_count_db_queries(self):
+        self.addCleanup(event.remove, engine.Engine, 'before_cursor_execute',
+                        self.stats._count_db_query)
+        ctxt = context.get_admin_context()
+        self.stats.count_db_queries()
+
+        start = self.stats.start()
+        db.volume_get_all(ctxt)
+        self.stats.record('weigher', 'FakeWeigher', start, 1, 1)
+        queries = self.stats.get_stats(reset=True)[
+            ('weigher', 'FakeWeigher')]['db_queries']
+        self.assertGreater(queries, 0)
+
+        # Enabling it twice doesn't count the queries twice
+        self.stats.count_db_queries()
+        start = self.stats.start()
+        db.volume_get_all(ctxt)
+        self.stats.record('weigher', 'FakeWeigher', start, 1, 1)
+        self.assertEqual(queries, self.stats.get_stats()[
+            ('weigher', 'FakeWeigher')]['db_queries'])
+
+    @mock.patch.object(stats, 'LOG')
+    def test_log_stats(self, mock_log):
+        start = self.stats.start()
+        self.stats.record('filter', 'FakeFilter', start, 10, 4)
+
+        self.stats.log_stats()
+
+        mock_log.info.assert_called_once()
+        self.assertEqual('FakeFilter', mock_log.info.call_args[0][1]['name'])
+        self.assertEqual(1, len(self.stats.get_stats()))
+
+    @mock.patch.object(stats, 'STATS', new_callable=stats.HandlerStats)
+    def test_handlers_record_stats(self, mock_stats):
+        filter_handler = base_filter.BaseFilterHandler(
+            base_filter.BaseFilter, 'fake_namespace')
+        weight_handler = base_weight.BaseWeightHandler(
+            base_weight.BaseWeigher, 'fake_namespace')
+
+        objs = filter_handler.get_filtered_objects([FakeFilter], range(5),
+                                                   {})
+        weight_handler.get_weighed_objects([FakeWeigher], objs, {})
+
+        result = mock_stats.get_stats()
+        self.assertEqual({('filter', 'FakeFilter'),
+                          ('weigher', 'FakeWeigher')}, set(result))
+        self.assertEqual(5, result[('filter', 'FakeFilter')]['backends_in'])
+        self.assertEqual(3, result[('filter', 'FakeFilter')]['backends_out'])
+        self.assertEqual(3, result[('weigher', 'FakeWeigher')]['backends_in'])
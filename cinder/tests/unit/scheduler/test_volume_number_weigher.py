@@ -44,6 +44,11 @@ def fake_volume_data_get_for_host(context, host, count_only=False):
         return 6
 
 
+def fake_volume_count_get_for_hosts(context, hosts):
+    return {host: fake_volume_data_get_for_host(context, host, True)
+            for host in hosts}
+
+
 class VolumeNumberWeigherTestCase(test.TestCase):
 
     def setUp(self):
@@ -91,8 +96,8 @@ class VolumeNumberWeigherTestCase(test.TestCase):
         # host4: 4 volumes
         # host5: 5 volumes   Norm=-1.0
         # so, host1 should win:
-        with mock.patch.object(api, 'volume_data_get_for_host',
-                               fake_volume_data_get_for_host):
+        with mock.patch.object(api, 'volume_count_get_for_hosts',
+                               fake_volume_count_get_for_hosts):
             weighed_host = self._get_weighed_host(backend_info_list)
             self.assertEqual(0.0, weighed_host.weight)
             self.assertEqual('host1',
@@ -108,9 +113,24 @@ class VolumeNumberWeigherTestCase(test.TestCase):
         # host4: 4 volumes
         # host5: 5 volumes     Norm=1
         # so, host5 should win:
-        with mock.patch.object(api, 'volume_data_get_for_host',
-                               fake_volume_data_get_for_host):
+        with mock.patch.object(api, 'volume_count_get_for_hosts',
+                               fake_volume_count_get_for_hosts):
             weighed_host = self._get_weighed_host(backend_info_list)
             self.assertEqual(1.0, weighed_host.weight)
             self.assertEqual('host5',
                              volume_utils.extract_host(weighed_host.obj.host))
+
+    @mock.patch.object(api, 'volume_data_get_for_host')
+    @mock.patch.object(api, 'volume_count_get_for_hosts',
+                       side_effect=fake_volume_count_get_for_hosts)
+    def test_volume_number_weight_single_query(self, mock_count,
+                                               mock_data_get):
+        backend_info_list = self._get_all_backends()
+
+        weighed_host = self._get_weighed_host(backend_info_list)
+
+        self.assertEqual('host1',
+                         volume_utils.extract_host(weighed_host.obj.host))
+        mock_count.assert_called_once_with(
+            mock.ANY, [backend.host for backend in backend_info_list])
+        mock_data_get.assert_not_called()
@@ -52,3 +52,39 @@ class TestWeightHandler(test.TestCase):
         for seq, result, minval, maxval in map_:
             ret = base_weight.normalize(seq, minval=minval, maxval=maxval)
             self.assertEqual(result, tuple(ret))
+
+    def _get_weighed_objects(self, limit=None):
+        class FirstWeigher(base_weight.BaseWeigher):
+            def _weigh_object(self, obj, weight_properties):
+                return obj[0]
+
+        class SecondWeigher(base_weight.BaseWeigher):
+            def weight_multiplier(self):
+                return 2.0
+
+            def _weigh_object(self, obj, weight_properties):
+                return obj[1]
+
+        objs = [(1, 10), (3, 10), (2, 20), (3, 0), (1, 20)]
+        handler = base_weight.BaseWeightHandler(base_weight.BaseWeigher,
+                                                'cinder.tests')
+        return handler.get_weighed_objects([FirstWeigher, SecondWeigher],
+                                           objs, {}, limit=limit)
+
+    def test_get_weighed_objects(self):
+        weighed_objs = self._get_weighed_objects()
+
+        self.assertEqual([(2, 20), (3, 10), (1, 20), (1, 10), (3, 0)],
+                         [weighed.obj for weighed in weighed_objs])
+        self.assertEqual([2.5, 2.0, 2.0, 1.0, 1.0],
+                         [weighed.weight for weighed in weighed_objs])
+
+    def test_get_weighed_objects_limit(self):
+        expected = self._get_weighed_objects()
+
+        for limit in range(1, 7):
+            weighed_objs = self._get_weighed_objects(limit=limit)
+            self.assertEqual([(weighed.obj, weighed.weight)
+                              for weighed in expected[:limit]],
+                             [(weighed.obj, weighed.weight)
+                              for weighed in weighed_objs])
@@ -287,6 +287,9 @@ class TestCase(testtools.TestCase):
         # clear out the cache.
         sqla_api._GET_METHODS = {}
 
+        # The probed O_DIRECT support of the copied paths is cached too.
+        volume_utils._ODIRECT_SUPPORT.clear()
+
         self.override_config('backend_url', 'file://' + lock_path,
                              group='coordination')
         coordination.COORDINATOR.start()
@@ -622,7 +622,36 @@ class TestCinderManageCmd(test.TestCase):
 
         get_admin_context.assert_called_once_with()
         purge_deleted_rows.assert_called_once_with(
-            ctxt, age_in_days=age_in_days)
+            ctxt, age_in_days=age_in_days, batch_size=None, batch_sleep=0,
+            workers=1, progress=None)
+
+    @mock.patch('cinder.db.sqlalchemy.api.purge_deleted_rows')
+    @mock.patch('cinder.context.get_admin_context')
+    def test_purge_in_batches(self, get_admin_context, purge_deleted_rows):
+        ctxt = context.RequestContext(fake.USER_ID, fake.PROJECT_ID,
+                                      is_admin=True)
+        get_admin_context.return_value = ctxt
+
+        db_cmds = cinder_manage.DbCommands()
+        with mock.patch('sys.stdout', new=io.StringIO()) as fake_out:
+            db_cmds.purge(30, batch_size=1000, batch_sleep=0.5, workers=4)
+            progress = purge_deleted_rows.call_args[1]['progress']
+            progress('volumes', 2000)
+
+        purge_deleted_rows.assert_called_once_with(
+            ctxt, age_in_days=30, batch_size=1000, batch_sleep=0.5,
+            workers=4, progress=mock.ANY)
+        self.assertEqual('Purged 2000 rows from volumes\n',
+                         fake_out.getvalue())
+
+    @ddt.data({'batch_size': 0}, {'batch_size': 10, 'batch_sleep': -1},
+              {'batch_size': 10, 'workers': 0})
+    @mock.patch('cinder.db.sqlalchemy.api.purge_deleted_rows')
+    def test_purge_invalid_batches(self, kwargs, purge_deleted_rows):
+        db_cmds = cinder_manage.DbCommands()
+        ex = self.assertRaises(SystemExit, db_cmds.purge, 30, **kwargs)
+        self.assertEqual(1, ex.code)
+        purge_deleted_rows.assert_not_called()
 
     @mock.patch('cinder.db.service_get_all')
     @mock.patch('cinder.context.get_admin_context')
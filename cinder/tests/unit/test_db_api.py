@@ -514,6 +514,29 @@ class DBAPIVolumeTestCase(BaseTest):
                              db.volume_data_get_for_host(
                                  self.ctxt, 'h%d@lvmdriver-1' % i))
 
+    def test_volume_count_get_for_hosts(self):
+        for host in ('h1', 'h1@lvm#pool1', 'h1@lvm#pool1', 'h1@lvm#pool2',
+                     'h1@lvm2#pool1', 'h10@lvm#pool1', 'h2@lvm'):
+            db.volume_create(self.ctxt,
+                             {'host': host,
+                              'size': ONE_HUNDREDS,
+                              'volume_type_id': fake.VOLUME_TYPE_ID})
+        hosts = ['h1', 'h1@lvm', 'h1@lvm#pool1', 'h1@lvm#pool3', 'h2@lvm',
+                 'h3']
+
+        counts = db.volume_count_get_for_hosts(self.ctxt, hosts)
+
+        self.assertEqual({'h1': 1, 'h1@lvm': 3, 'h1@lvm#pool1': 2,
+                          'h1@lvm#pool3': 0, 'h2@lvm': 1, 'h3': 0},
+                         counts)
+        for host in hosts:
+            self.assertEqual(counts[host],
+                             db.volume_data_get_for_host(self.ctxt, host,
+                                                         count_only=True))
+
+    def test_volume_count_get_for_hosts_no_hosts(self):
+        self.assertEqual({}, db.volume_count_get_for_hosts(self.ctxt, []))
+
     def test_volume_data_get_for_project(self):
         for i in range(THREE):
             for j in range(THREE):
@@ -793,6 +816,51 @@ class DBAPIVolumeTestCase(BaseTest):
         self._assertEqualListsOfObjects(volumes[2:], db.volume_get_all(
                                         self.ctxt, 2, 2, ['id'], ['asc']))
 
+    def test_volume_get_all_keyset_pagination(self):
+        self.flags(keyset_pagination=True)
+        now = timeutils.utcnow()
+        # Rows created in the same instant are ordered by id
+        volumes = [
+            db.volume_create(
+                self.ctxt, {'id': str(i),
+                            'created_at': now - datetime.timedelta(
+                                seconds=i // 2),
+                            'volume_type_id': fake.VOLUME_TYPE_ID})
+            for i in range(6)]
+        expected = sorted(volumes, key=lambda v: (v.created_at, v.id),
+                          reverse=True)
+
+        with mock.patch.object(sqlalchemy_api, '_volume_get') as get_mock:
+            page = db.volume_get_all(self.ctxt, marker=expected[1].id,
+                                     limit=3)
+        get_mock.assert_not_called()
+        self._assertEqualListsOfObjects(expected[2:5], page)
+        self._assertEqualListsOfObjects(
+            volumes[:1], db.volume_get_all(self.ctxt, marker='1', limit=3,
+                                           sort_keys=['id'],
+                                           sort_dirs=['desc']))
+
+    def test_volume_get_all_keyset_pagination_marker_not_found(self):
+        self.flags(keyset_pagination=True)
+        db.volume_create(self.ctxt, {'volume_type_id': fake.VOLUME_TYPE_ID})
+        self.assertRaises(exception.VolumeNotFound, db.volume_get_all,
+                          self.ctxt, marker=fake.VOLUME2_ID, limit=3)
+
+    def test_volume_get_all_keyset_pagination_nullable_key(self):
+        self.flags(keyset_pagination=True)
+        volumes = [
+            db.volume_create(self.ctxt, {'id': str(i),
+                                         'display_name': name,
+                                         'volume_type_id':
+                                             fake.VOLUME_TYPE_ID})
+            for i, name in enumerate(('a', None, 'c'))]
+        # NULL names still sort first, so the marker is fetched
+        self._assertEqualListsOfObjects(
+            [volumes[0], volumes[2]],
+            db.volume_get_all(self.ctxt, marker='1',
+                              sort_keys=['display_name', 'id'],
+                              sort_dirs=['asc', 'asc']))
+
     def test_volume_get_all_by_host(self):
         volumes = []
         for i in range(3):
@@ -1402,6 +1470,33 @@ class DBAPIVolumeTestCase(BaseTest):
         self.assertRaises(exception.VolumeNotFound, db.volume_update,
                           self.ctxt, 42, {})
 
+    def test_volumes_provider_id_update(self):
+        volumes = [db.volume_create(self.ctxt,
+                                    {'provider_id': 'old',
+                                     'volume_type_id': fake.VOLUME_TYPE_ID})
+                   for _i in range(3)]
+        db.volume_destroy(self.ctxt, volumes[2].id)
+
+        with mock.patch.object(sqlalchemy_api, '_provider_id_update',
+                               wraps=sqlalchemy_api._provider_id_update
+                               ) as mock_update:
+            db.volumes_provider_id_update(
+                self.ctxt,
+                {volumes[0].id: 'p0', volumes[2].id: 'p2',
+                 fake.VOLUME4_ID: 'p4'},
+                batch_size=2)
+
+        self.assertEqual(2, mock_update.call_count)
+        self.assertEqual('p0', db.volume_get(self.ctxt,
+                                             volumes[0].id).provider_id)
+        self.assertEqual('old', db.volume_get(self.ctxt,
+                                              volumes[1].id).provider_id)
+        deleted = db.volume_get(self.ctxt.elevated(read_deleted='yes'),
+                                volumes[2].id)
+        self.assertEqual('old', deleted.provider_id)
+        self.assertEqual([], db.volume_get_all(
+            self.ctxt, filters={'id': fake.VOLUME4_ID}))
+
     def test_volume_metadata_get(self):
         metadata = {'a': 'b', 'c': 'd'}
         db.volume_create(self.ctxt, {'id': 1, 'metadata': metadata,
@@ -1934,6 +2029,20 @@ class DBAPISnapshotTestCase(BaseTest):
             self.assertSetEqual({s.id for s in snapshots[:i + 1]},
                                 {s.id for s in result})
 
+    def test_snapshots_provider_id_update(self):
+        vol = utils.create_volume(self.ctxt)
+        snapshots = [utils.create_snapshot(self.ctxt, vol.id)
+                     for _i in range(2)]
+
+        db.snapshots_provider_id_update(self.ctxt,
+                                        {snapshots[0].id: 'p0',
+                                         fake.SNAPSHOT3_ID: 'p3'})
+
+        self.assertEqual('p0', db.snapshot_get(self.ctxt,
+                                               snapshots[0].id).provider_id)
+        self.assertIsNone(db.snapshot_get(self.ctxt,
+                                          snapshots[1].id).provider_id)
+
     def test_snapshot_get_all_by_host(self):
         db.volume_create(self.ctxt, {'id': 1, 'host': 'host1',
                                      'volume_type_id': fake.VOLUME_TYPE_ID})
@@ -2770,6 +2879,161 @@ class DBAPIReservationTestCase(BaseTest):
         self.assertEqual(expected, usages)
 
 
+class DBAPIAtomicReservationTestCase(BaseTest):
+
+    """Tests for the db.api.*_atomic quota reservation methods."""
+
+    def _reserve(self, project_id='project1', quotas=None, in_use=None,
+                 **deltas):
+        resources = quota.QUOTAS.resources
+        quotas = quotas or {resource: 10 for resource in deltas}
+        expire = timeutils.utcnow() + datetime.timedelta(seconds=3600)
+        sync_in_use = in_use or {}
+
+        def sync(ctxt, project_id, resources, resource):
+            return {resource: sync_in_use.get(resource, 0)}
+
+        with mock.patch.object(sqlalchemy_api, '_get_sync_updates',
+                               side_effect=sync):
+            return db.quota_reserve_atomic(self.ctxt, resources, quotas,
+                                           deltas, expire, 0, 0,
+                                           project_id=project_id)
+
+    def test_quota_reserve_atomic(self):
+        reservations = self._reserve(volumes=1, gigabytes=2,
+                                     in_use={'gigabytes': 3})
+        self.assertEqual(2, len(reservations))
+        reservations += self._reserve(volumes=1, gigabytes=2)
+        self.assertEqual(4, len(reservations))
+
+        expected = {'project_id': 'project1',
+                    'volumes': {'reserved': 2, 'in_use': 0},
+                    'gigabytes': {'reserved': 4, 'in_use': 3}}
+        self.assertEqual(expected,
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
+    def test_quota_reserve_atomic_over_quota(self):
+        self._reserve(quotas={'volumes': 3, 'gigabytes': 10},
+                      volumes=2, gigabytes=2)
+
+        exc = self.assertRaises(exception.OverQuota, self._reserve,
+                                quotas={'volumes': 3, 'gigabytes': 10},
+                                volumes=2, gigabytes=2)
+
+        self.assertEqual(['volumes'], exc.kwargs['overs'])
+        self.assertEqual({'volumes': {'reserved': 2, 'in_use': 0},
+                          'gigabytes': {'reserved': 2, 'in_use': 0}},
+                         exc.kwargs['usages'])
+        # The gigabytes that fit in the quota were not reserved either
+        expected = {'project_id': 'project1',
+                    'volumes': {'reserved': 2, 'in_use': 0},
+                    'gigabytes': {'reserved': 2, 'in_use': 0}}
+        self.assertEqual(expected,
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
+    def test_quota_reserve_atomic_zero_delta_concurrent(self):
+        quotas = {'volumes': 5}
+        self._reserve(quotas=quotas, volumes=0)
+        get_usages = sqlalchemy_api._get_quota_usages
+
+        def _get_usages(context, *args, **kwargs):
+            usages = get_usages(context, *args, **kwargs)
+            # Another reservation lands after the usages are read
+            sqlalchemy_api._quota_usage_update(
+                context, usages['volumes'].id,
+                {'reserved': models.QuotaUsage.reserved + 6})
+            return usages
+
+        with mock.patch.object(sqlalchemy_api, '_get_quota_usages',
+                               side_effect=_get_usages):
+            exc = self.assertRaises(exception.OverQuota, self._reserve,
+                                    quotas=quotas, volumes=0)
+
+        self.assertEqual(['volumes'], exc.kwargs['overs'])
+
+    def test_quota_reserve_atomic_zero_delta(self):
+        self._reserve(quotas={'volumes': 2}, volumes=2)
+        reservations = self._reserve(quotas={'volumes': 2}, volumes=0)
+        self.assertEqual(1, len(reservations))
+
+        self.assertRaises(exception.OverQuota, self._reserve,
+                          quotas={'volumes': 1}, volumes=0)
+        self._reserve(quotas={'volumes': -1}, volumes=0)
+        self.assertEqual({'reserved': 2, 'in_use': 0},
+                         db.quota_usage_get_all_by_project(
+                             self.ctxt, 'project1')['volumes'])
+
+    def test_quota_reserve_atomic_unlimited(self):
+        self._reserve(quotas={'volumes': -1}, volumes=100)
+        self._reserve(quotas={'volumes': -1}, volumes=100)
+        self.assertEqual({'reserved': 200, 'in_use': 0},
+                         db.quota_usage_get_all_by_project(
+                             self.ctxt, 'project1')['volumes'])
+
+    def test_quota_reserve_atomic_refresh(self):
+        self._reserve(volumes=1)
+        vol_usage = db.quota_usage_get(self.ctxt, 'project1', 'volumes')
+        with sqlalchemy_api.main_context_manager.writer.using(self.ctxt):
+            vol_usage.in_use = -1
+            vol_usage.save(self.ctxt.session)
+
+        self._reserve(in_use={'volumes': 4}, volumes=1)
+
+        self.assertEqual({'reserved': 2, 'in_use': 4},
+                         db.quota_usage_get_all_by_project(
+                             self.ctxt, 'project1')['volumes'])
+
+    def test_reservation_commit_atomic(self):
+        reservations = self._reserve(volumes=1, gigabytes=2)
+
+        db.reservation_commit_atomic(self.ctxt, reservations)
+        # Committing them again changes nothing
+        db.reservation_commit_atomic(self.ctxt, reservations)
+
+        expected = {'project_id': 'project1',
+                    'volumes': {'reserved': 0, 'in_use': 1},
+                    'gigabytes': {'reserved': 0, 'in_use': 2}}
+        self.assertEqual(expected,
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
+    def test_reservation_commit_atomic_negative_in_use(self):
+        reservations = self._reserve(volumes=-2, in_use={'volumes': 1})
+
+        db.reservation_commit_atomic(self.ctxt, reservations)
+
+        self.assertEqual({'project_id': 'project1',
+                          'volumes': {'reserved': 0, 'in_use': 0}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
+    def test_reservation_rollback_atomic(self):
+        reservations = self._reserve(volumes=2)
+        vol_usage = db.quota_usage_get(self.ctxt, 'project1', 'volumes')
+        with sqlalchemy_api.main_context_manager.writer.using(self.ctxt):
+            vol_usage.reserved -= 1
+            vol_usage.save(self.ctxt.session)
+
+        db.reservation_rollback_atomic(self.ctxt, reservations)
+        db.reservation_rollback_atomic(self.ctxt, reservations)
+
+        self.assertEqual({'project_id': 'project1',
+                          'volumes': {'reserved': 0, 'in_use': 0}},
+                         db.quota_usage_get_all_by_project(self.ctxt,
+                                                           'project1'))
+
+    def test_reservation_atomic_does_not_lock_usages(self):
+        with mock.patch.object(sqlalchemy_api, '_get_quota_usages',
+                               wraps=sqlalchemy_api._get_quota_usages) as m:
+            reservations = self._reserve(volumes=1)
+            db.reservation_commit_atomic(self.ctxt, reservations)
+
+        m.assert_called_once_with(self.ctxt, 'project1',
+                                  resources=mock.ANY, lock=False)
+
+
 class DBAPIMessageTestCase(BaseTest):
 
     """Tests for message operations"""
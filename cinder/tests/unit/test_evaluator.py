@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from unittest import mock
+
 from cinder import exception
 from cinder.scheduler.evaluator import evaluator
 from cinder.tests.unit import test
@@ -144,3 +146,36 @@ class EvaluatorTestCase(test.TestCase):
         self.assertGreater(evaluator.evaluate(
             '(((1 + max(1 + (10 / 20), 2, 3)) / 100) + 1)'),
             1)
+
+    def test_compiled_expression_cached(self):
+        evaluator.compile_expression.cache_clear()
+        self.addCleanup(evaluator.compile_expression.cache_clear)
+        with mock.patch.object(evaluator, '_parser') as mock_parser:
+            mock_parser.parseString.return_value = [mock.sentinel.tree]
+            self.assertEqual(mock.sentinel.tree,
+                             evaluator.compile_expression("1 + 1"))
+            self.assertEqual(mock.sentinel.tree,
+                             evaluator.compile_expression("1 + 1"))
+        mock_parser.parseString.assert_called_once_with("1 + 1",
+                                                        parseAll=True)
+
+    def test_compiled_expression_variables(self):
+        stats = {'free': 100, 'weight': 5}
+        expression = "stats.free * stats.weight"
+        self.assertEqual(500, evaluator.evaluate(expression, stats=stats))
+        stats['weight'] = 2
+        self.assertEqual(200, evaluator.evaluate(expression, stats=stats))
+        self.assertEqual(30,
+                         evaluator.evaluate(expression,
+                                            stats={'free': 10, 'weight': 3}))
+        self.assertRaises(exception.EvaluatorParseException,
+                          evaluator.evaluate, expression)
+
+    def test_bad_expression_cached(self):
+        evaluator.compile_expression.cache_clear()
+        self.addCleanup(evaluator.compile_expression.cache_clear)
+        for _ in range(2):
+            self.assertRaises(exception.EvaluatorParseException,
+                              evaluator.evaluate,
+                              "1/*1")
+        self.assertEqual(1, evaluator.compile_expression.cache_info().misses)
@@ -40,3 +40,23 @@ class TestPaginateQuery(test.TestCase):
                                                   'size'],
                                        marker=marker_object,
                                        sort_dirs=['desc', 'asc', 'desc'])
+
+    def test_keyset_sortable(self):
+        self.assertTrue(sqlalchemyutils.keyset_sortable(
+            self.model, ['created_at', 'id']))
+        # Nullable without default, relationship and unknown keys
+        for sort_key in ('display_name', 'volume_type', 'unknown'):
+            self.assertFalse(sqlalchemyutils.keyset_sortable(
+                self.model, ['created_at', sort_key]))
+
+    def test_paginate_query_marker_query(self):
+        with db_api.main_context_manager.reader.using(self.ctxt):
+            marker_query = db_api.model_query(
+                self.ctxt, self.model).filter(self.model.id == fake.VOLUME_ID)
+        query = sqlalchemyutils.paginate_query(
+            self.query, self.model, 10, sort_keys=['created_at', 'id'],
+            sort_dirs=['desc', 'asc'], marker_query=marker_query)
+        sql = str(query.statement).lower()
+        self.assertIn('volumes.created_at <= (select volumes.created_at',
+                      sql)
+        self.assertNotIn('case', sql)
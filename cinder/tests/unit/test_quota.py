@@ -335,6 +335,16 @@ class QuotaIntegrationTestCase(test.TestCase):
         vol_ref.destroy()
 
 
+class AtomicQuotaIntegrationTestCase(QuotaIntegrationTestCase):
+    """Run the integration tests with the atomic quota driver."""
+
+    def setUp(self):
+        super(AtomicQuotaIntegrationTestCase, self).setUp()
+        driver = quota.AtomicDbQuotaDriver()
+        for engine in (quota.QUOTAS, quota.GROUP_QUOTAS):
+            self.mock_object(engine, '_driver_class', driver)
+
+
 class FakeContext(object):
     def __init__(self, project_id, quota_class):
         self.is_admin = False
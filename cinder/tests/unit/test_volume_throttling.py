@@ -61,3 +61,19 @@ class ThrottleTestCase(test.TestCase):
             # a nested job ends; bps limit is resumed
             mock.call('fake_group', 'read', '253:0', 1024),
             mock.call('fake_group', 'write', '253:1', 1024)])
+
+    @mock.patch('time.sleep')
+    @mock.patch('time.monotonic', return_value=100.0)
+    def test_consume(self, mock_time, mock_sleep):
+        throttle = throttling.Throttle()
+        throttle.consume(1024)
+        throttle.bps_limit = 1024
+
+        throttle.consume(2048)
+        mock_sleep.assert_not_called()
+        # The limit is shared, the next transfers wait for the previous ones
+        throttle.consume(512)
+        mock_sleep.assert_called_once_with(2.0)
+        mock_time.return_value = 101.0
+        throttle.consume(512)
+        mock_sleep.assert_called_with(1.5)
@@ -17,13 +17,16 @@
 
 
 import datetime
+import errno
 import functools
 import io
+import os
 import time
 from unittest import mock
 
 from castellan import key_manager
 import ddt
+import fixtures
 from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_utils import units
@@ -682,7 +685,8 @@ class CopyVolumeTestCase(test.TestCase):
         handle2 = io.RawIOBase()
         output = volume_utils.copy_volume(handle1, handle2, 1024, 1)
         self.assertIsNone(output)
-        mock_copy.assert_called_once_with(handle1, handle2, 1024)
+        mock_copy.assert_called_once_with(handle1, handle2, 1024,
+                                          throttle=mock.ANY, sparse=False)
 
     @mock.patch('cinder.volume.volume_utils._transfer_data')
     @mock.patch('cinder.volume.volume_utils._open_volume_with_path')
@@ -691,7 +695,200 @@ class CopyVolumeTestCase(test.TestCase):
         output = volume_utils.copy_volume('/foo/bar', handle, 1024, 1)
         self.assertIsNone(output)
         mock_transfer.assert_called_once_with(mock.ANY, mock.ANY,
-                                              1073741824, mock.ANY)
+                                              1073741824, mock.ANY,
+                                              throttle=mock.ANY, sparse=False)
+
+    def _transfer(self, src_data, chunk_size, **kwargs):
+        dest = _RecordingBytesIO()
+        volume_utils._transfer_data(io.BytesIO(src_data), dest,
+                                    len(src_data), chunk_size, **kwargs)
+        return dest
+
+    def test_transfer_data(self):
+        data = bytes(range(256)) * 40
+        dest = self._transfer(data, 1000)
+        self.assertEqual(data, dest.getvalue())
+        self.assertEqual(11, len(dest.writes))
+
+    def test_transfer_data_reads_ahead(self):
+        src = io.BytesIO(b'x' * 4000)
+        events = []
+
+        def _readinto(buf):
+            events.append('read')
+            return io.BytesIO.readinto(src, buf)
+
+        def _write(data):
+            events.append('write')
+            return len(data)
+
+        dest = mock.Mock(spec=io.BufferedWriter, write=_write)
+        with mock.patch.object(volume_utils, '_supports_readinto',
+                               return_value=True), \
+                mock.patch.object(src, 'readinto', _readinto, create=True):
+            volume_utils._transfer_data(src, dest, 4000, 1000)
+
+        # The second chunk is read before the first one is written
+        self.assertEqual(['read', 'read', 'write'], events[:3])
+        self.assertEqual(4, events.count('write'))
+
+    def test_transfer_data_read_only_source(self):
+        class _Source(io.RawIOBase):
+            def __init__(self, data):
+                self._data = io.BytesIO(data)
+
+            def read(self, length=-1):
+                return self._data.read(length)
+
+        data = b'abc' * 1000
+        dest = _RecordingBytesIO()
+        volume_utils._transfer_data(_Source(data), dest, len(data), 1024)
+        self.assertEqual(data, dest.getvalue())
+
+    def test_transfer_data_short_source(self):
+        dest = _RecordingBytesIO()
+        volume_utils._transfer_data(io.BytesIO(b'abc'), dest, 4096, 1024)
+        self.assertEqual(b'abc', dest.getvalue())
+
+    def test_transfer_data_sparse(self):
+        data = b'a' * 100 + bytes(200) + b'b' * 100 + bytes(200)
+        dest = self._transfer(data, 100, sparse=True)
+        self.assertEqual(data, dest.getvalue())
+        self.assertEqual([b'a' * 100, b'b' * 100, b'\0'], dest.writes)
+
+    def test_transfer_data_throttle(self):
+        throttle = mock.Mock(spec=throttling.Throttle)
+        self._transfer(b'a' * 250, 100, throttle=throttle)
+        self.assertEqual([mock.call(100), mock.call(100), mock.call(50)],
+                         throttle.consume.call_args_list)
+
+    def test_transfer_data_read_error(self):
+        src = mock.Mock(spec=['read'])
+        src.read.side_effect = [b'a' * 10, IOError]
+        dest = _RecordingBytesIO()
+        self.assertRaises(IOError, volume_utils._transfer_data, src, dest,
+                          100, 10)
+
+    def test_transfer_data_write_error(self):
+        src = io.BytesIO(b'a' * 100)
+        dest = mock.Mock(spec=io.BufferedWriter)
+        dest.write.side_effect = IOError
+        self.assertRaises(IOError, volume_utils._transfer_data, src, dest,
+                          100, 10)
+
+    def _make_volume_files(self, src_data, dest_data=b'old'):
+        tmpdir = self.useFixture(fixtures.TempDir()).path
+        src = os.path.join(tmpdir, 'src')
+        dest = os.path.join(tmpdir, 'dest')
+        with open(src, 'wb') as f:
+            f.write(src_data)
+        with open(dest, 'wb') as f:
+            f.write(dest_data)
+        return src, dest
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    @mock.patch('cinder.utils.execute')
+    @mock.patch('fcntl.ioctl', side_effect=OSError(errno.EOPNOTSUPP, ''))
+    def test_copy_volume_in_process(self, mock_ioctl, mock_exec):
+        self.flags(volume_copy_offload=True)
+        data = os.urandom(units.Mi)
+        src, dest = self._make_volume_files(data)
+
+        volume_utils.copy_volume(src, dest, 1, '1M', sync=True)
+
+        self.assertEqual(data, self._read(dest))
+        mock_ioctl.assert_called_once_with(mock.ANY, volume_utils.FICLONE,
+                                           mock.ANY)
+        mock_exec.assert_not_called()
+
+    @mock.patch.object(volume_utils, '_IN_PROCESS_CHUNK_SIZE', 4096)
+    @mock.patch('os.copy_file_range', side_effect=OSError(errno.EXDEV, ''))
+    @mock.patch('fcntl.ioctl', side_effect=OSError(errno.EXDEV, ''))
+    def test_copy_volume_in_process_read_write_sparse(self, mock_ioctl,
+                                                      mock_copy_range):
+        self.flags(volume_copy_offload=True)
+        data = (os.urandom(4096) + bytes(units.Mi - 8192) +
+                os.urandom(4096))
+        src, dest = self._make_volume_files(data, os.urandom(units.Mi))
+
+        with mock.patch('os.pwrite', wraps=os.pwrite) as mock_pwrite:
+            volume_utils.copy_volume(src, dest, 1, '1M', sparse=True)
+
+        self.assertEqual(data, self._read(dest))
+        mock_copy_range.assert_called_once()
+        self.assertEqual([0, units.Mi - 4096],
+                         [call[0][2] for call in mock_pwrite.call_args_list])
+
+    @mock.patch('fcntl.ioctl')
+    def test_copy_volume_in_process_partial(self, mock_ioctl):
+        self.flags(volume_copy_offload=True)
+        data = os.urandom(2 * units.Mi)
+        src, dest = self._make_volume_files(data)
+
+        volume_utils.copy_volume(src, dest, 1, '1M')
+
+        self.assertEqual(data[:units.Mi], self._read(dest))
+        mock_ioctl.assert_not_called()
+
+    @mock.patch('cinder.volume.volume_utils._copy_volume_in_process')
+    @mock.patch('cinder.volume.volume_utils.check_for_odirect_support',
+                return_value=False)
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume_in_process_throttled(self, mock_exec, mock_support,
+                                              mock_in_process):
+        self.flags(volume_copy_offload=True)
+        fake_throttle = throttling.Throttle(['fake_throttle'])
+        volume_utils.copy_volume('/tmp/src', '/tmp/dest', 1, '1M',
+                                 execute=utils.execute,
+                                 throttle=fake_throttle)
+        mock_in_process.assert_not_called()
+        mock_exec.assert_called_once_with('fake_throttle', 'dd',
+                                          'if=/tmp/src', 'of=/tmp/dest',
+                                          'count=%s' % units.Mi, 'bs=1M',
+                                          'iflag=count_bytes',
+                                          run_as_root=True)
+
+    @mock.patch('cinder.volume.volume_utils.check_for_odirect_support',
+                return_value=False)
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume_in_process_block_device(self, mock_exec,
+                                                 mock_support):
+        self.flags(volume_copy_offload=True)
+        src, dest = self._make_volume_files(b'')
+        volume_utils.copy_volume('/dev/zero', dest, 1, '1M',
+                                 execute=utils.execute)
+        mock_exec.assert_called_once_with('dd', 'if=/dev/zero',
+                                          'of=%s' % dest,
+                                          'count=%s' % units.Mi, 'bs=1M',
+                                          'iflag=count_bytes',
+                                          run_as_root=True)
+
+    @mock.patch('cinder.volume.volume_utils.check_for_odirect_support',
+                return_value=True)
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume_caches_odirect_support(self, mock_exec,
+                                                mock_support):
+        for _copy in range(2):
+            volume_utils.copy_volume('/dev/abc', '/dev/def', 1, '1M',
+                                     sync=True, execute=utils.execute)
+        self.assertEqual(
+            [mock.call('/dev/abc', '/dev/def', 'iflag=direct'),
+             mock.call('/dev/abc', '/dev/def', 'oflag=direct')],
+            mock_support.call_args_list)
+        self.assertEqual(2, mock_exec.call_count)
+
+
+class _RecordingBytesIO(io.BytesIO):
+    def __init__(self):
+        super(_RecordingBytesIO, self).__init__()
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(bytes(data))
+        return super(_RecordingBytesIO, self).write(data)
 
 
 @ddt.ddt
@@ -25,6 +25,8 @@ from typing import Tuple
 from unittest import mock
 import uuid
 
+import eventlet
+
 from cinder import context
 from cinder import db
 from cinder import exception
@@ -278,6 +280,11 @@ class LightOSStorageVolumeDriverTest(test.TestCase):
         configuration.num_volume_device_scan_tries = (
             DEVICE_SCAN_ATTEMPTS_DEFAULT)
         configuration.lightos_api_service_timeout = LIGHTOS_API_SERVICE_TIMEOUT
+        configuration.lightos_api_connection_pool_size = 10
+        configuration.lightos_api_connection_idle_timeout = 60
+        configuration.lightos_api_poll_min_interval = 0.02
+        configuration.lightos_api_poll_max_interval = 1.0
+        configuration.lightos_acl_batch_window = 0
         configuration.driver_ssl_cert_verify = False
         # for some reason this value is not initialized by the driver parent
         # configs
@@ -366,6 +373,101 @@ class LightOSStorageVolumeDriverTest(test.TestCase):
 
         self.driver.cluster.send_cmd = send_cmd_default_mock
 
+    def _create_lightos_connection(self, sessions):
+        def _new_session():
+            session = mock.Mock()
+            session.send.return_value.status_code = httpstatus.OK
+            session.send.return_value.json.return_value = (
+                FAKE_LIGHTOS_CLUSTER_INFO)
+            sessions.append(session)
+            return session
+
+        self.mock_object(lightos.requests, 'Session',
+                         side_effect=_new_session)
+        self.driver.configuration.lightos_api_address = ['10.10.10.71',
+                                                         '10.10.10.72']
+        connection = lightos.LightOSConnection(self.driver.configuration)
+        connection._cur_api_server_idx = 0
+        return connection
+
+    def test_send_cmd_reuses_session(self):
+        sessions = []
+        connection = self._create_lightos_connection(sessions)
+
+        for _i in range(3):
+            self.assertEqual(
+                (httpstatus.OK, FAKE_LIGHTOS_CLUSTER_INFO),
+                connection.send_cmd('get_cluster_info', timeout=10))
+
+        self.assertEqual(1, len(sessions))
+        self.assertEqual(3, sessions[0].send.call_count)
+        sessions[0].close.assert_not_called()
+
+    def test_send_cmd_discards_session_of_failed_server(self):
+        sessions = []
+        connection = self._create_lightos_connection(sessions)
+        connection.sessions.get('10.10.10.71:443').send.side_effect = (
+            lightos.requests.ConnectionError())
+
+        self.assertEqual((httpstatus.OK, FAKE_LIGHTOS_CLUSTER_INFO),
+                         connection.send_cmd('get_cluster_info', timeout=10))
+
+        self.assertEqual(2, len(sessions))
+        sessions[0].close.assert_called_once_with()
+        self.assertEqual('https://10.10.10.72:443/api/v2/clusterinfo',
+                         sessions[1].send.call_args[0][0].url)
+        self.assertEqual(1, connection._cur_api_server_idx)
+
+    @mock.patch.object(lightos.time, 'monotonic', side_effect=[0, 10, 100])
+    def test_session_pool_idle_timeout(self, mock_monotonic):
+        sessions = []
+        self._create_lightos_connection(sessions)
+        pool = lightos.LightOSSessionPool(pool_size=4, idle_timeout=60)
+
+        first = pool.get('10.10.10.71:443')
+        self.assertIs(first, pool.get('10.10.10.71:443'))
+        second = pool.get('10.10.10.71:443')
+
+        self.assertIsNot(first, second)
+        first.close.assert_called_once_with()
+        second.mount.assert_called_with('http://', mock.ANY)
+        self.assertEqual(4, second.mount.call_args[0][1]._pool_maxsize)
+
+    @mock.patch.object(lightos.time, 'sleep')
+    @mock.patch.object(lightos.time, 'monotonic', return_value=0)
+    def test_waiter_backs_off(self, mock_monotonic, mock_sleep):
+        waiter = lightos.LightOSWaiter(min_interval=0.02, max_interval=0.1)
+        poll = mock.Mock(side_effect=[(False, 'Creating')] * 4 +
+                         [(True, 'Available')])
+
+        self.assertEqual((True, 'Available'),
+                         waiter.wait('volume_available', poll, 10))
+
+        self.assertEqual([mock.call(0.02), mock.call(0.04), mock.call(0.08),
+                          mock.call(0.1)], mock_sleep.call_args_list)
+        histograms = waiter.get_histograms()
+        self.assertEqual(['volume_available'], list(histograms))
+        self.assertEqual(1, histograms['volume_available']['count'])
+        self.assertEqual(1, histograms['volume_available']['buckets']['0.05'])
+
+    @mock.patch.object(lightos.time, 'sleep')
+    @mock.patch.object(lightos.time, 'monotonic',
+                       side_effect=[0, 0.5, 2, 3.5, 3.5])
+    def test_waiter_timeout(self, mock_monotonic, mock_sleep):
+        waiter = lightos.LightOSWaiter(min_interval=1, max_interval=1)
+        poll = mock.Mock(return_value=(False, 'Creating'))
+
+        self.assertEqual((False, 'Creating'),
+                         waiter.wait('volume_acl', poll, 3))
+
+        self.assertEqual(3, poll.call_count)
+        self.assertEqual([mock.call(1), mock.call(1)],
+                         mock_sleep.call_args_list)
+        histogram = waiter.get_histograms()['volume_acl']
+        self.assertEqual(3.5, histogram['sum'])
+        self.assertEqual(1, histogram['buckets']['5'])
+        self.assertEqual(0, histogram['buckets']['inf'])
+
     def test_setup_should_fail_if_lightos_client_cant_auth_cluster(self):
         """Verify lightos_client fail with bad auth."""
 
@@ -661,6 +763,97 @@ class LightOSStorageVolumeDriverTest(test.TestCase):
         self.driver.delete_volume(volume)
         db.volume_destroy(self.ctxt, volume.id)
 
+    def _create_volume_for_acl_batching(self):
+        self.driver.do_setup(None)
+        self.driver.acl_batcher.window = 0.05
+        vol_type = test_utils.create_volume_type(self.ctxt, self,
+                                                 name='my_vol_type')
+        volume = test_utils.create_volume(self.ctxt, size=4,
+                                          volume_type_id=vol_type.id)
+        self.driver.create_volume(volume)
+        self.addCleanup(db.volume_destroy, self.ctxt, volume.id)
+
+        cluster_send_cmd = self.driver.cluster.send_cmd
+        sent = []
+
+        def send_cmd_mock(cmd, timeout, **kwargs):
+            sent.append(cmd)
+            return cluster_send_cmd(cmd, timeout, **kwargs)
+
+        self.driver.cluster.send_cmd = send_cmd_mock
+        return volume, sent
+
+    def test_add_volume_acl_batches_concurrent_changes(self):
+        volume, sent = self._create_volume_for_acl_batching()
+        hostnqns = ['hostnqn1', 'hostnqn2', 'hostnqn3']
+
+        threads = [eventlet.spawn(self.driver.add_volume_acl, 'default',
+                                  volume, hostnqn)
+                   for hostnqn in hostnqns]
+
+        self.assertEqual([True] * 3, [thread.wait() for thread in threads])
+        self.assertEqual(1, sent.count('update_volume'))
+        lightos_volume = self.db.data['projects']['default']['volumes'][0]
+        self.assertEqual(hostnqns, sorted(lightos_volume['acl']['values']))
+
+    def test_volume_acl_batch_keeps_last_change(self):
+        volume, sent = self._create_volume_for_acl_batching()
+
+        add = eventlet.spawn(self.driver.add_volume_acl, 'default', volume,
+                             'hostnqn1')
+        remove = eventlet.spawn(self.driver.remove_volume_acl, 'default',
+                                volume, 'hostnqn1')
+
+        self.assertFalse(add.wait())
+        self.assertTrue(remove.wait())
+        self.assertEqual(1, sent.count('update_volume'))
+        lightos_volume = self.db.data['projects']['default']['volumes'][0]
+        self.assertEqual(['ALLOW_NONE'], lightos_volume['acl']['values'])
+
+    def _change_volume_acl(self, values, changes):
+        self.driver.do_setup(None)
+        data = {'UUID': 'fake-uuid', 'acl': {'values': values},
+                'ETag': 'fake-etag'}
+        with mock.patch.object(self.driver, '_get_lightos_volume',
+                               return_value=(httpstatus.OK, data)), \
+                mock.patch.object(self.driver, 'set_volume_acl',
+                                  return_value=(httpstatus.OK, {})
+                                  ) as mock_set:
+            result = self.driver._LightOSVolumeDriver__change_volume_acl(
+                'default', 'volume-1', changes)
+        return result, mock_set
+
+    def test_change_volume_acl_remove_without_values(self):
+        for values in (None, []):
+            result, mock_set = self._change_volume_acl(
+                values, {'hostnqn1': False})
+
+            self.assertFalse(result)
+            mock_set.assert_not_called()
+
+    def test_change_volume_acl_add_and_remove_without_values(self):
+        result, mock_set = self._change_volume_acl(
+            [], {'hostnqn1': True, 'hostnqn2': False})
+
+        self.assertEqual((httpstatus.OK, {}), result)
+        mock_set.assert_called_once_with('default', 'fake-uuid',
+                                         ['hostnqn1'], etag='fake-etag')
+
+    def test_acl_batcher_raises_error_to_every_caller(self):
+        apply = mock.Mock(side_effect=exception.VolumeBackendAPIException(
+            message='fake'))
+        batcher = lightos.LightOSAclBatcher(apply, 0.01)
+
+        threads = [eventlet.spawn(batcher.update, 'default', 'volume-1',
+                                  hostnqn, True)
+                   for hostnqn in ('hostnqn1', 'hostnqn2')]
+
+        for thread in threads:
+            self.assertRaises(exception.VolumeBackendAPIException,
+                              thread.wait)
+        apply.assert_called_once_with(
+            'default', 'volume-1', {'hostnqn1': True, 'hostnqn2': True})
+
     def test_initialize_connection_mirgrating_volume(self):
         InitialConnectorMock.nqn = "hostnqn1"
         InitialConnectorMock.found_discovery_client = True
@@ -191,6 +191,10 @@ class RBDTestCase(test.TestCase):
         cfg.rbd_store_chunk_size = 4
         cfg.rados_connection_retries = 3
         cfg.rados_connection_interval = 5
+        cfg.rados_connection_pool_size = 0
+        cfg.rbd_usage_workers = 8
+        cfg.rbd_usage_cache_time = 0
+        cfg.rbd_usage_pool_stats = False
         cfg.backup_use_temp_snapshot = False
         cfg.enable_deferred_deletion = False
         cfg.rbd_concurrent_flatten_operations = 3
@@ -2809,7 +2813,7 @@ class RBDTestCase(test.TestCase):
                 'vol_pool', None, None)
 
         mock_driver._disconnect_from_rados.assert_called_once_with(
-            'fake_cl', 'fake_io')
+            'fake_cl', 'fake_io', error=None)
 
     def test_rbd_volume_proxy_external_conn_error(self):
         mock_driver = mock.Mock(name='driver')
@@ -2846,7 +2850,7 @@ class RBDTestCase(test.TestCase):
         mock_driver._connect_to_rados.assert_called_once_with(
             'fake-volumes', None, None)
         mock_driver._disconnect_from_rados.assert_called_once_with(
-            'fake_client', 'fake_ioctx')
+            'fake_client', 'fake_ioctx', error=mock.ANY)
 
     @common_mocks
     def test_connect_to_rados(self):
@@ -2896,6 +2900,92 @@ class RBDTestCase(test.TestCase):
         self.assertEqual(
             3, self.mock_rados.Rados.return_value.shutdown.call_count)
 
+    def _mock_rados_clients(self):
+        clients = []
+
+        def _rados(*args, **kwargs):
+            client = mock.Mock(state='connected')
+            client.open_ioctx.side_effect = lambda pool: mock.Mock(pool=pool)
+            clients.append(client)
+            return client
+
+        self.mock_rados.Rados.side_effect = _rados
+        self.cfg.rados_connect_timeout = -1
+        self.cfg.rados_connection_pool_size = 1
+        return clients
+
+    @common_mocks
+    def test_connect_to_rados_pooled(self):
+        clients = self._mock_rados_clients()
+
+        client, ioctx = self.driver._connect_to_rados()
+        self.driver._disconnect_from_rados(client, ioctx)
+        self.assertEqual((client, ioctx), self.driver._connect_to_rados())
+        self.driver._disconnect_from_rados(client, ioctx)
+        client, alt_ioctx = self.driver._connect_to_rados('alt_pool')
+        self.assertEqual('alt_pool', alt_ioctx.pool)
+        self.driver._disconnect_from_rados(client, alt_ioctx)
+
+        self.assertEqual(1, len(clients))
+        clients[0].connect.assert_called_once_with()
+        self.assertEqual([mock.call(self.cfg.rbd_pool),
+                          mock.call('alt_pool')],
+                         clients[0].open_ioctx.call_args_list)
+        clients[0].shutdown.assert_not_called()
+
+    @common_mocks
+    def test_connect_to_rados_pooled_size(self):
+        clients = self._mock_rados_clients()
+
+        conn1 = self.driver._connect_to_rados()
+        conn2 = self.driver._connect_to_rados()
+        self.driver._disconnect_from_rados(*conn2)
+        # The pool is full, the other client is shut down
+        self.driver._disconnect_from_rados(*conn1)
+        clients[1].shutdown.assert_not_called()
+        clients[0].shutdown.assert_called_once_with()
+        conn1[1].close.assert_called_once_with()
+
+        self.assertEqual(conn2, self.driver._connect_to_rados())
+        self.assertEqual(2, len(clients))
+
+    @common_mocks
+    def test_connect_to_rados_pooled_reconnect(self):
+        clients = self._mock_rados_clients()
+
+        self.driver._disconnect_from_rados(*self.driver._connect_to_rados())
+        clients[0].state = 'shutdown'
+        conn = self.driver._connect_to_rados()
+        clients[0].shutdown.assert_called_once_with()
+
+        # Connections that failed are not reused
+        self.driver._disconnect_from_rados(*conn,
+                                           error=self.mock_rados.Error())
+        clients[1].shutdown.assert_called_once_with()
+
+        # Other errors don't affect the connection
+        self.mock_rados.Error = MockException
+        conn = self.driver._connect_to_rados()
+        self.driver._disconnect_from_rados(*conn, error=ValueError())
+        self.assertEqual(conn, self.driver._connect_to_rados())
+        self.assertEqual(3, len(clients))
+        clients[2].shutdown.assert_not_called()
+
+    @common_mocks
+    def test_connect_to_rados_pooled_clear(self):
+        clients = self._mock_rados_clients()
+
+        conn1 = self.driver._connect_to_rados()
+        self.driver._disconnect_from_rados(*self.driver._connect_to_rados())
+        self.driver._rados_pool.clear()
+        clients[1].shutdown.assert_called_once_with()
+        clients[0].shutdown.assert_not_called()
+        self.driver._disconnect_from_rados(*conn1)
+        clients[0].shutdown.assert_called_once_with()
+
+        self.driver._connect_to_rados()
+        self.assertEqual(3, len(clients))
+
     @common_mocks
     def test_failover_host_no_replication(self):
         self.driver._is_replication_enabled = False
@@ -3192,10 +3282,136 @@ class RBDTestCase(test.TestCase):
             mock.call(self.driver, v, read_only=True,
                       client=client.cluster, ioctx=client.ioctx)
             for v in volumes]
-        self.assertEqual(expected_volproxy_calls, volproxy_mock.mock_calls)
+        self.assertCountEqual(expected_volproxy_calls,
+                              volproxy_mock.mock_calls)
 
         self.assertEqual(3.00, total_provision)
 
+    @mock.patch('cinder.volume.drivers.rbd.time.monotonic')
+    @mock.patch('cinder.volume.drivers.rbd.RBDVolumeProxy')
+    @mock.patch('cinder.volume.drivers.rbd.RADOSClient')
+    @mock.patch('cinder.volume.drivers.rbd.RBDDriver.RBDProxy')
+    def test__get_usage_info_cached(self, rbdproxy_mock, client_mock,
+                                    volproxy_mock, mock_time):
+        sizes = {'volume-1': 1 * units.Gi, 'volume-2': 2 * units.Gi,
+                 'volume-3': 4 * units.Gi}
+        read = []
+
+        def _volproxy(driver, name, **kwargs):
+            read.append(name)
+            proxy = mock.MagicMock()
+            proxy.__enter__.return_value.size.return_value = sizes[name]
+            return proxy
+
+        volproxy_mock.side_effect = _volproxy
+        images = rbdproxy_mock.return_value.list
+        images.return_value = ['volume-1', 'volume-2']
+        mock_time.return_value = 1000
+        self.cfg.rbd_usage_cache_time = 600
+
+        self.assertEqual(3, self.driver._get_usage_info())
+        self.assertCountEqual(['volume-1', 'volume-2'], read)
+
+        # Only new and changed images are read
+        del read[:]
+        images.return_value = ['volume-1', 'volume-2', 'volume-3']
+        sizes['volume-1'] = 3 * units.Gi
+        sizes['volume-2'] = 5 * units.Gi
+        self.driver._usage.invalidate('volume-2')
+        self.assertEqual(10, self.driver._get_usage_info())
+        self.assertCountEqual(['volume-2', 'volume-3'], read)
+
+        # Deleted images are dropped and cached sizes expire
+        del read[:]
+        images.return_value = ['volume-1', 'volume-3']
+        mock_time.return_value = 1000 + self.cfg.rbd_usage_cache_time
+        self.assertEqual(7, self.driver._get_usage_info())
+        self.assertCountEqual(['volume-1', 'volume-3'], read)
+
+    @mock.patch('cinder.volume.drivers.rbd.RBDVolumeProxy')
+    @mock.patch('cinder.volume.drivers.rbd.RADOSClient')
+    @mock.patch('cinder.volume.drivers.rbd.RBDDriver.RBDProxy')
+    def test__get_usage_info_pool_stats(self, rbdproxy_mock, client_mock,
+                                        volproxy_mock):
+        self.cfg.rbd_usage_pool_stats = True
+        client = client_mock.return_value.__enter__.return_value
+        pool_stats = rbdproxy_mock.return_value.pool_stats_get
+        pool_stats.return_value = {'image_provisioned_bytes': 5 * units.Gi,
+                                   'image_max_provisioned_bytes': 9 * units.Gi}
+
+        self.assertEqual(5, self.driver._get_usage_info())
+        pool_stats.assert_called_once_with(client.ioctx)
+        rbdproxy_mock.return_value.list.assert_not_called()
+        volproxy_mock.assert_not_called()
+
+    @mock.patch('cinder.volume.drivers.rbd.RBDVolumeProxy')
+    @mock.patch('cinder.volume.drivers.rbd.RADOSClient')
+    @mock.patch('cinder.volume.drivers.rbd.RBDDriver.RBDProxy')
+    def test__get_usage_info_pool_stats_unsupported(self, rbdproxy_mock,
+                                                    client_mock,
+                                                    volproxy_mock):
+        self.cfg.rbd_usage_pool_stats = True
+        self.mock_object(self.driver, 'rbd',
+                         mock.Mock(FunctionNotSupported=MockException))
+        pool_stats = rbdproxy_mock.return_value.pool_stats_get
+        pool_stats.side_effect = MockException
+        rbdproxy_mock.return_value.list.return_value = ['volume-1']
+        volproxy_mock.return_value.__enter__.return_value.size.return_value = (
+            2 * units.Gi)
+
+        self.assertEqual(2, self.driver._get_usage_info())
+        self.assertEqual(2, self.driver._get_usage_info())
+        pool_stats.assert_called_once()
+        self.assertEqual(2, volproxy_mock.call_count)
+
+    @mock.patch('cinder.volume.drivers.rbd.RBDVolumeProxy')
+    @mock.patch('cinder.volume.drivers.rbd.RADOSClient')
+    @mock.patch('cinder.volume.drivers.rbd.RBDDriver.RBDProxy')
+    def test__get_usage_info_not_cached(self, rbdproxy_mock, client_mock,
+                                        volproxy_mock):
+        rbdproxy_mock.return_value.list.return_value = ['volume-1']
+        volproxy_mock.return_value.__enter__.return_value.size.return_value = (
+            2 * units.Gi)
+
+        self.assertEqual(2, self.driver._get_usage_info())
+        self.assertEqual(2, self.driver._get_usage_info())
+        self.assertEqual(2, volproxy_mock.call_count)
+
+    @mock.patch('cinder.volume.drivers.rbd.tpool.execute')
+    @mock.patch('cinder.volume.drivers.rbd.RADOSClient')
+    @mock.patch('cinder.volume.drivers.rbd.RBDDriver.RBDProxy')
+    def test__get_usage_info_native_thread(self, rbdproxy_mock, client_mock,
+                                           mock_execute):
+        client = client_mock.return_value.__enter__.return_value
+        rbdproxy_mock.return_value.list.return_value = ['volume-1']
+        mock_execute.return_value = 2 * units.Gi
+
+        self.assertEqual(2, self.driver._get_usage_info())
+        mock_execute.assert_called_once_with(
+            self.driver._usage._read_image_size, client, 'volume-1')
+
+    @mock.patch('cinder.volume.drivers.rbd.RBDVolumeProxy')
+    @mock.patch('cinder.volume.drivers.rbd.RADOSClient')
+    @mock.patch('cinder.volume.drivers.rbd.RBDDriver.RBDProxy')
+    def test__get_usage_info_error_keeps_changed(self, rbdproxy_mock,
+                                                 client_mock, volproxy_mock):
+        rbdproxy_mock.return_value.list.return_value = ['volume-1']
+        self.mock_object(self.driver, 'rbd',
+                         mock.Mock(ImageNotFound=MockImageNotFoundException,
+                                   OSError=MockOSErrorException))
+        volproxy_mock.side_effect = exception.VolumeBackendAPIException(
+            data='error')
+        self.driver._usage.invalidate('volume-1')
+
+        self.assertRaises(exception.VolumeBackendAPIException,
+                          self.driver._get_usage_info)
+        self.assertEqual({'volume-1'}, self.driver._usage._changed)
+
+    @common_mocks
+    def test_extend_volume_invalidates_usage(self):
+        self.driver.extend_volume(self.volume_a, 2)
+        self.assertIn(self.volume_a.name, self.driver._usage._changed)
+
     def test_migrate_volume_bad_volume_status(self):
         self.volume_a.status = 'backingup'
         ret = self.driver.migrate_volume(context, self.volume_a, None)
@@ -23,6 +23,7 @@ from oslo_utils import importutils
 from cinder import context
 from cinder import exception
 from cinder import objects
+from cinder.tests.unit import fake_constants as fake
 from cinder.tests.unit import utils as tests_utils
 from cinder.tests.unit import volume as base
 from cinder.volume import driver
@@ -179,6 +180,45 @@ class VolumeInitHostTestCase(base.BaseVolumeTestCase):
         finally:
             CONF.init_host_max_objects_retrieval = old_val
 
+    @mock.patch.object(driver.BaseVD, "update_provider_info")
+    def test_init_host_sync_provider_info_only_changes(self, mock_update):
+        vol0 = tests_utils.create_volume(
+            self.context, size=1, host=CONF.host, provider_id='same')
+        vol1 = tests_utils.create_volume(
+            self.context, size=1, host=CONF.host, provider_id='old')
+        snap0 = tests_utils.create_snapshot(self.context, vol0.id,
+                                            provider_id='kept')
+        snap1 = tests_utils.create_snapshot(self.context, vol1.id)
+        mock_update.return_value = (
+            [{'id': vol0.id, 'provider_id': 'same'},
+             {'id': vol1.id, 'provider_id': 'new'},
+             {'id': fake.VOLUME3_ID, 'provider_id': 'unknown'}],
+            [{'id': snap0.id, 'provider_id': 'ignored'},
+             {'id': snap1.id, 'provider_id': 'snap'},
+             {'id': fake.SNAPSHOT3_ID, 'provider_id': 'unknown'}])
+
+        db = self.volume.db
+        mock_volumes = self.mock_object(
+            db, 'volumes_provider_id_update',
+            wraps=db.volumes_provider_id_update)
+        mock_snapshots = self.mock_object(
+            db, 'snapshots_provider_id_update',
+            wraps=db.snapshots_provider_id_update)
+        self.volume._sync_provider_info(
+            self.context,
+            objects.VolumeList.get_all(self.context),
+            objects.SnapshotList.get_all(self.context, None))
+
+        mock_volumes.assert_called_once_with(self.context, {vol1.id: 'new'})
+        mock_snapshots.assert_called_once_with(self.context,
+                                               {snap1.id: 'snap'})
+        self.assertEqual('new', objects.Volume.get_by_id(
+            self.context, vol1.id).provider_id)
+        self.assertEqual('kept', objects.Snapshot.get_by_id(
+            self.context, snap0.id).provider_id)
+        self.assertEqual('snap', objects.Snapshot.get_by_id(
+            self.context, snap1.id).provider_id)
+
     @mock.patch.object(driver.BaseVD, "update_provider_info")
     def test_init_host_sync_provider_info_no_update(self, mock_update):
         vol0 = tests_utils.create_volume(
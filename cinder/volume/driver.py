@@ -127,6 +127,13 @@ volume_opts = [
                default=0,
                help='The upper limit of bandwidth of volume copy. '
                     '0 => unlimited'),
+    cfg.BoolOpt('volume_copy_offload',
+                default=False,
+                help='Copy volumes stored in files in the volume service '
+                     'process instead of with dd, cloning them with '
+                     'reflinks or copy_file_range when the filesystem '
+                     'supports it. Copies of block devices and copies that '
+                     'are throttled or use ionice are still done with dd.'),
     cfg.StrOpt('iscsi_write_cache',
                default='on',
                choices=['on', 'off'],
@@ -14,9 +14,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import bisect
+import collections
 import http.client as httpstatus
 import json
 import random
+import threading
 import time
 from typing import Dict
 from urllib.parse import urlparse
@@ -77,7 +80,44 @@ lightos_opts = [
     cfg.IntOpt('lightos_api_service_timeout',
                default=30,
                help='The default amount of time (in seconds) to wait for'
-               ' an API endpoint response.')
+               ' an API endpoint response.'),
+    cfg.IntOpt('lightos_api_connection_pool_size',
+               default=10,
+               min=1,
+               help='The maximum number of keep-alive connections kept open'
+                    ' to each LightOS API server. Concurrent API calls'
+                    ' beyond this number open extra connections that are'
+                    ' closed once they are done.'),
+    cfg.IntOpt('lightos_api_connection_idle_timeout',
+               default=60,
+               min=0,
+               help='The amount of time (in seconds) after which the'
+                    ' keep-alive connections to a LightOS API server that'
+                    ' has not been used are closed instead of reused.'
+                    ' 0 means they are kept open until they fail.'),
+    cfg.FloatOpt('lightos_api_poll_min_interval',
+                 default=0.02,
+                 min=0.001,
+                 help='The initial amount of time (in seconds) to wait'
+                      ' between two queries of the LightOS API while waiting'
+                      ' for a volume or snapshot to change state. The'
+                      ' interval doubles after every query up to'
+                      ' lightos_api_poll_max_interval.'),
+    cfg.FloatOpt('lightos_api_poll_max_interval',
+                 default=1.0,
+                 min=0.001,
+                 help='The maximum amount of time (in seconds) to wait'
+                      ' between two queries of the LightOS API while waiting'
+                      ' for a volume or snapshot to change state.'),
+    cfg.FloatOpt('lightos_acl_batch_window',
+                 default=0.05,
+                 min=0,
+                 help='The amount of time (in seconds) during which the ACL'
+                      ' changes requested for the same LightOS volume, when'
+                      ' hosts attach to or detach from it, are collected'
+                      ' and then applied with a single update. Changes'
+                      ' requested while an update of the volume is in'
+                      ' progress are always merged into the next one.'),
 ]
 
 CONF = cfg.CONF
@@ -87,11 +127,207 @@ LIGHTOS = "LIGHTOS"
 INTERM_SNAPSHOT_PREFIX = "for_clone_"
 
 
+class LightOSSessionPool(object):
+    """Keep-alive HTTP sessions to the LightOS API servers.
+
+    A session with its own pool of connections is kept for every API server,
+    so API calls reuse connections instead of paying for a TCP and TLS
+    handshake each time.  Sessions are shared by all the greenthreads of the
+    driver.
+    """
+
+    def __init__(self, pool_size, idle_timeout):
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get(self, endpoint):
+        """Return the session of an API server, creating it if needed."""
+        now = time.monotonic()
+        stale = None
+        with self._lock:
+            session, last_used = self._sessions.get(endpoint, (None, None))
+            if (session is not None and self.idle_timeout and
+                    now - last_used > self.idle_timeout):
+                stale, session = session, None
+            if session is None:
+                session = self._new_session()
+            self._sessions[endpoint] = (session, now)
+        if stale is not None:
+            LOG.debug('Closing idle connections to %s', endpoint)
+            stale.close()
+        return session
+
+    def discard(self, endpoint):
+        """Close the connections to an API server that failed.
+
+        The next call to the server, once the round-robin of the API servers
+        gets back to it, opens new connections instead of reusing ones that
+        may be broken.
+        """
+        with self._lock:
+            session, _last_used = self._sessions.pop(endpoint, (None, None))
+        if session is not None:
+            session.close()
+
+    def close(self):
+        """Close the connections to all the API servers."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session, _last_used in sessions:
+            session.close()
+
+
+class LightOSWaiter(object):
+    """Wait for asynchronous LightOS operations with exponential backoff.
+
+    The LightOS API does not notify clients of state changes, so the state
+    is polled, first after a short interval that doubles after every query
+    so fast operations finish quickly without flooding the API servers with
+    queries while slow ones complete.  The time spent waiting is recorded in
+    a histogram for every kind of operation.
+    """
+
+    # Upper bounds, in seconds, of the wait time histogram buckets.
+    HISTOGRAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, min_interval, max_interval):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self._histograms = collections.defaultdict(
+            lambda: [0] * (len(self.HISTOGRAM_BUCKETS) + 1))
+        self._totals = collections.defaultdict(float)
+
+    def wait(self, operation, poll, timeout):
+        """Call poll until it is done or the timeout expires.
+
+        poll returns a (done, result) tuple.  It is called at least once, and
+        the last tuple it returned is returned.
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+        interval = self.min_interval
+        while True:
+            done, result = poll()
+            now = time.monotonic()
+            if done or now >= deadline:
+                break
+            time.sleep(min(interval, deadline - now))
+            interval = min(interval * 2, self.max_interval)
+
+        elapsed = time.monotonic() - start
+        self._histograms[operation][
+            bisect.bisect_left(self.HISTOGRAM_BUCKETS, elapsed)] += 1
+        self._totals[operation] += elapsed
+        LOG.debug('Waited %(elapsed).3f seconds for %(operation)s, '
+                  'done: %(done)s',
+                  {'elapsed': elapsed, 'operation': operation, 'done': done})
+        return done, result
+
+    def get_histograms(self):
+        """Return the wait time histogram of every kind of operation.
+
+        Buckets are keyed by their upper bound in seconds, the last one being
+        'inf', and count the waits that took at most that long.
+        """
+        bounds = [str(bound) for bound in self.HISTOGRAM_BUCKETS] + ['inf']
+        return {operation: {'count': sum(counts),
+                            'sum': self._totals[operation],
+                            'buckets': dict(zip(bounds, counts))}
+                for operation, counts in self._histograms.items()}
+
+
+class LightOSAclBatcher(object):
+    """Coalesce concurrent ACL changes of the same LightOS volume.
+
+    Every ACL update is a read-modify-write of the whole ACL of the volume,
+    guarded by its etag, so concurrent updates conflict and retry.  Instead,
+    the first change requested for a volume waits for the batching window
+    and for the previous update of the volume to finish, and then applies
+    all the changes requested in the meantime with a single update.  Its
+    result is returned to every caller.
+    """
+
+    class _Batch(object):
+        def __init__(self, previous):
+            self.previous = previous
+            self.changes = {}
+            self.done = threading.Event()
+            self.result = False
+            self.error = None
+
+    def __init__(self, apply, window):
+        # apply(project_name, lightos_volname, changes) applies a dict of
+        # ACL to membership changes and returns whether it succeeded.
+        self._apply = apply
+        self.window = window
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last = {}
+
+    def update(self, project_name, lightos_volname, acl, add):
+        """Add or remove an ACL of a volume, return whether it succeeded."""
+        key = (project_name, lightos_volname)
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._Batch(self._last.get(key))
+                self._pending[key] = batch
+                self._last[key] = batch
+            batch.changes[acl] = add
+
+        if leader:
+            self._run(key, batch)
+        else:
+            batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        # A later request of the same batch may have reverted this change.
+        return batch.result and batch.changes[acl] == add
+
+    def _run(self, key, batch):
+        time.sleep(self.window)
+        if batch.previous is not None:
+            batch.previous.done.wait()
+        with self._lock:
+            # Changes requested from now on go to the next batch.
+            del self._pending[key]
+            batch.previous = None
+
+        LOG.debug('Applying %(count)d ACL changes to LightOS volume '
+                  '%(volume)s project %(project)s: %(changes)s',
+                  {'count': len(batch.changes), 'volume': key[1],
+                   'project': key[0], 'changes': batch.changes})
+        try:
+            batch.result = self._apply(key[0], key[1], batch.changes)
+        except Exception as e:
+            batch.error = e
+        finally:
+            with self._lock:
+                if self._last.get(key) is batch:
+                    del self._last[key]
+            batch.done.set()
+
+
 class LightOSConnection(object):
     def __init__(self, conf):
         self.conf = conf
         self.access_key = None
         self.apiservers = self._init_api_servers()
+        self.sessions = LightOSSessionPool(
+            self.conf.lightos_api_connection_pool_size,
+            self.conf.lightos_api_connection_idle_timeout)
         self._cur_api_server_idx = random.randint(0, len(self.apiservers) - 1)
         self.targets = dict()
         self.lightos_cluster_uuid = None
@@ -312,30 +548,32 @@ class LightOSConnection(object):
             {'cmd': cmd, 'method': method, 'url': url, 'body': body,
              'ssl_verify': ssl_verify})
 
-        api_url = "https://%s%s" % (self._format_endpoint(host, port), url)
+        endpoint = self._format_endpoint(host, port)
+        api_url = "https://%s%s" % (endpoint, url)
 
         try:
-            with requests.Session() as session:
-                req = requests.Request(
-                    method, api_url, data=json.dumps(body) if body else None)
-                req.headers.update({'Accept': 'application/json'})
-                # -H 'Expect:'  will prevent us from getting
-                # the 100 Continue response from curl
-                req.headers.update({'Expect': ''})
-                if method in ('POST', 'PUT'):
-                    req.headers.update({'Content-Type': 'application/json'})
-                if kwargs.get("etag"):
-                    req.headers.update({'If-Match': kwargs['etag']})
-                if self.conf.lightos_jwt:
-                    req.headers.update(
-                        {'Authorization':
-                         'Bearer %s' % self.conf.lightos_jwt})
-                prepped = req.prepare()
-                self.pretty_print_req(prepped, timeout)
-                response = session.send(
-                    prepped, timeout=timeout, verify=ssl_verify)
+            session = self.sessions.get(endpoint)
+            req = requests.Request(
+                method, api_url, data=json.dumps(body) if body else None)
+            req.headers.update({'Accept': 'application/json'})
+            # -H 'Expect:'  will prevent us from getting
+            # the 100 Continue response from curl
+            req.headers.update({'Expect': ''})
+            if method in ('POST', 'PUT'):
+                req.headers.update({'Content-Type': 'application/json'})
+            if kwargs.get("etag"):
+                req.headers.update({'If-Match': kwargs['etag']})
+            if self.conf.lightos_jwt:
+                req.headers.update(
+                    {'Authorization':
+                     'Bearer %s' % self.conf.lightos_jwt})
+            prepped = req.prepare()
+            self.pretty_print_req(prepped, timeout)
+            response = session.send(
+                prepped, timeout=timeout, verify=ssl_verify)
         except Exception:
             LOG.exception("REST server not responding at '%s'", api_url)
+            self.sessions.discard(endpoint)
             return (False, None, None)
 
         try:
@@ -393,6 +631,12 @@ class LightOSVolumeDriver(driver.VolumeDriver):
 
         self.logical_op_timeout = \
             self.configuration.lightos_api_service_timeout * 3 + 10
+        self.waiter = LightOSWaiter(
+            self.configuration.lightos_api_poll_min_interval,
+            self.configuration.lightos_api_poll_max_interval)
+        self.acl_batcher = LightOSAclBatcher(
+            self._apply_volume_acl_changes,
+            self.configuration.lightos_acl_batch_window)
 
     @classmethod
     def get_driver_options(cls):
@@ -548,8 +792,7 @@ class LightOSVolumeDriver(driver.VolumeDriver):
         states = ('Available', 'Deleting', 'Deleted', 'Failed', 'UNKNOWN',
                   'Migrating', 'Rollback')
 
-        stop = time.time() + timeout
-        while time.time() <= stop:
+        def _poll():
             (status_code,
              resp) = self._get_lightos_volume(project_name,
                                               timeout=self.logical_op_timeout,
@@ -557,10 +800,10 @@ class LightOSVolumeDriver(driver.VolumeDriver):
                                               vol_name=vol_name)
             state = resp.get('state', 'UNKNOWN') if \
                 status_code == httpstatus.OK and resp else 'UNKNOWN'
-            if state in states and status_code != httpstatus.NOT_FOUND:
-                break
-            time.sleep(1)
+            return (state in states and status_code != httpstatus.NOT_FOUND,
+                    state)
 
+        _done, state = self.waiter.wait('volume_available', _poll, timeout)
         return state
 
     def _parse_extra_spec(self, extra_spec_value, default_value):
@@ -715,8 +958,7 @@ class LightOSVolumeDriver(driver.VolumeDriver):
         # Failed, Updating
         states = ('Available', 'Deleting', 'Deleted', 'Failed', 'UNKNOWN')
 
-        stop = time.time() + timeout
-        while time.time() <= stop:
+        def _poll():
             (status_code,
              resp) = self._get_lightos_snapshot(project_name,
                                                 timeout=
@@ -725,10 +967,10 @@ class LightOSVolumeDriver(driver.VolumeDriver):
                                                 snapshot_name=snapshot_name)
             state = resp.get('state', 'UNKNOWN') if \
                 status_code == httpstatus.OK and resp else 'UNKNOWN'
-            if state in states and status_code != httpstatus.NOT_FOUND:
-                break
-            time.sleep(1)
+            return (state in states and status_code != httpstatus.NOT_FOUND,
+                    state)
 
+        _done, state = self.waiter.wait('snapshot_available', _poll, timeout)
         return state
 
     def _wait_for_snapshot_deleted(self,
@@ -739,20 +981,18 @@ class LightOSVolumeDriver(driver.VolumeDriver):
         assert snapshot_uuid, 'LightOS snapshot UUID must be specified'
         states = ('Deleted', 'Deleting', 'UNKNOWN')
 
-        stop = time.time() + timeout
-        while time.time() <= stop:
+        def _poll():
             status_code, resp = (
                 self._get_lightos_snapshot(project_name,
                                            timeout=self.logical_op_timeout,
                                            snapshot_uuid=snapshot_uuid))
             if status_code == httpstatus.NOT_FOUND:
-                return 'Deleted'
+                return True, 'Deleted'
             state = resp.get('state', 'UNKNOWN') if \
                 status_code == httpstatus.OK and resp else 'UNKNOWN'
-            if state in states:
-                break
-            time.sleep(1)
+            return state in states, state
 
+        _done, state = self.waiter.wait('snapshot_deleted', _poll, timeout)
         return state
 
     def _wait_for_volume_deleted(self, project_name, timeout, vol_uuid):
@@ -760,20 +1000,18 @@ class LightOSVolumeDriver(driver.VolumeDriver):
         assert vol_uuid, 'LightOS volume UUID must be specified'
         states = ('Deleted', 'Deleting', 'UNKNOWN')
 
-        stop = time.time() + timeout
-        while time.time() <= stop:
+        def _poll():
             (status_code,
              resp) = self._get_lightos_volume(project_name,
                                               timeout=self.logical_op_timeout,
                                               vol_uuid=vol_uuid)
             if status_code == httpstatus.NOT_FOUND:
-                return 'Deleted'
+                return True, 'Deleted'
             state = resp.get('state', 'UNKNOWN') if \
                 status_code == httpstatus.OK and resp else 'UNKNOWN'
-            if state in states:
-                break
-            time.sleep(1)
+            return state in states, state
 
+        _done, state = self.waiter.wait('volume_deleted', _poll, timeout)
         return state
 
     def _delete_lightos_volume(self, project_name, lightos_uuid):
@@ -1014,6 +1252,9 @@ class LightOSVolumeDriver(driver.VolumeDriver):
         data['free_capacity_gb'] = 'infinite'
         self._stats = data
 
+        LOG.debug('LightOS wait time histograms: %s',
+                  self.waiter.get_histograms())
+
         return self._stats
 
     def _get_connection_properties(self, project_name, volume):
@@ -1044,7 +1285,7 @@ class LightOSVolumeDriver(driver.VolumeDriver):
             etag=etag
         )
 
-    def __add_volume_acl(self, project_name, lightos_volname, acl_to_add):
+    def __change_volume_acl(self, project_name, lightos_volname, changes):
         (status, data) = self._get_lightos_volume(project_name,
                                                   self.logical_op_timeout,
                                                   vol_name=lightos_volname)
@@ -1063,13 +1304,35 @@ class LightOSVolumeDriver(driver.VolumeDriver):
             LOG.warning('Got LightOS volume without ACL?! data: %s', data)
             return False
 
-        acl = acl.get('values', [])
+        values = acl.get('values')
+        if not values and not any(changes.values()):
+            # There is nothing to remove the ACLs from.
+            LOG.warning(
+                'Got LightOS volume without ACL values?! data: %s', data)
+            return False
+        acl = values or []
+
+        for acl_to_change, add in changes.items():
+            if add:
+                # remove ALLOW_NONE and add our acl if not already there
+                if 'ALLOW_NONE' in acl:
+                    acl.remove('ALLOW_NONE')
+                if acl_to_change not in acl:
+                    acl.append(acl_to_change)
+            elif acl_to_change in acl:
+                acl.remove(acl_to_change)
+            else:
+                LOG.warning(
+                    'Could not remove acl %s from LightOS volume %s project \
+                    %s with acl %s',
+                    acl_to_change,
+                    lightos_volname,
+                    project_name,
+                    acl)
 
-        # remove ALLOW_NONE and add our acl_to_add if not already there
-        if 'ALLOW_NONE' in acl:
-            acl.remove('ALLOW_NONE')
-        if acl_to_add not in acl:
-            acl.append(acl_to_add)
+        # if the ACL is empty here, put in ALLOW_NONE
+        if not acl:
+            acl.append('ALLOW_NONE')
 
         return self.set_volume_acl(
             project_name,
@@ -1079,6 +1342,16 @@ class LightOSVolumeDriver(driver.VolumeDriver):
                 'ETag',
                 ''))
 
+    def _apply_volume_acl_changes(self, project_name, lightos_volname,
+                                  changes):
+        """Apply a batch of ACL changes and wait for them to settle."""
+        return (self.update_volume_acl(self.__change_volume_acl,
+                                       project_name,
+                                       lightos_volname,
+                                       changes) and
+                self._wait_for_volume_acl(project_name, lightos_volname,
+                                          changes))
+
     def add_volume_acl(self, project_name, volume, acl_to_add):
         LOG.debug(
             'add_volume_acl got volume %s project %s acl %s',
@@ -1086,65 +1359,8 @@ class LightOSVolumeDriver(driver.VolumeDriver):
             project_name,
             acl_to_add)
         lightos_volname = self._lightos_volname(volume)
-        return self.update_volume_acl(
-            self.__add_volume_acl,
-            project_name,
-            lightos_volname,
-            acl_to_add)
-
-    def __remove_volume_acl(
-            self,
-            project_name,
-            lightos_volname,
-            acl_to_remove):
-        (status, data) = self._get_lightos_volume(project_name,
-                                                  self.logical_op_timeout,
-                                                  vol_name=lightos_volname)
-        if not data:
-            LOG.error(
-                'Could not get data for LightOS volume %s project %s',
-                lightos_volname,
-                project_name)
-            return False
-
-        lightos_uuid = data.get('UUID')
-        if not lightos_uuid:
-            LOG.warning('Got LightOS volume without UUID?! data: %s', data)
-            return False
-
-        acl = data.get('acl')
-        if not acl:
-            LOG.warning('Got LightOS volume without ACL?! data: %s', data)
-            return False
-
-        acl = acl.get('values')
-        if not acl:
-            LOG.warning(
-                'Got LightOS volume without ACL values?! data: %s', data)
-            return False
-
-        try:
-            acl.remove(acl_to_remove)
-        except ValueError:
-            LOG.warning(
-                'Could not remove acl %s from LightOS volume %s project \
-                %s with acl %s',
-                acl_to_remove,
-                lightos_volname,
-                project_name,
-                acl)
-
-        # if the ACL is empty here, put in ALLOW_NONE
-        if not acl:
-            acl.append('ALLOW_NONE')
-
-        return self.set_volume_acl(
-            project_name,
-            lightos_uuid,
-            acl,
-            etag=data.get(
-                'ETag',
-                ''))
+        return self.acl_batcher.update(project_name, lightos_volname,
+                                       acl_to_add, True)
 
     def __overwrite_volume_acl(
             self,
@@ -1178,11 +1394,8 @@ class LightOSVolumeDriver(driver.VolumeDriver):
         lightos_volname = self._lightos_volname(volume)
         LOG.debug('remove_volume_acl volume %s project %s acl %s',
                   volume, project_name, acl_to_remove)
-        return self.update_volume_acl(
-            self.__remove_volume_acl,
-            project_name,
-            lightos_volname,
-            acl_to_remove)
+        return self.acl_batcher.update(project_name, lightos_volname,
+                                       acl_to_remove, False)
 
     def remove_all_volume_acls(self, project_name, volume):
         lightos_volname = self._lightos_volname(volume)
@@ -1251,10 +1464,9 @@ class LightOSVolumeDriver(driver.VolumeDriver):
             self,
             project_name,
             lightos_volname,
-            acl,
-            requested_membership):
-        end = time.time() + self.logical_op_timeout
-        while (time.time() < end):
+            changes):
+        """Wait until every ACL of changes is added or removed."""
+        def _poll():
             (status, resp) = self._get_lightos_volume(
                 project_name,
                 self.logical_op_timeout,
@@ -1265,12 +1477,12 @@ class LightOSVolumeDriver(driver.VolumeDriver):
                         'Got LightOS volume %s without ACL?! data: %s',
                         lightos_volname,
                         resp)
-                    return False
+                    return True, False
 
                 volume_acls = resp.get('acl').get('values', [])
-                membership = acl in volume_acls
-                if membership == requested_membership:
-                    return True
+                if all((acl in volume_acls) == requested_membership
+                       for acl, requested_membership in changes.items()):
+                    return True, True
 
             LOG.debug(
                 'ACL did not settle for volume %s project %s, status \
@@ -1279,11 +1491,15 @@ class LightOSVolumeDriver(driver.VolumeDriver):
                 project_name,
                 status,
                 resp)
-            time.sleep(1)
-        LOG.warning(
-            'ACL did not settle for volume %s, giving up',
-            lightos_volname)
-        return False
+            return False, False
+
+        done, settled = self.waiter.wait('volume_acl', _poll,
+                                         self.logical_op_timeout)
+        if not done:
+            LOG.warning(
+                'ACL did not settle for volume %s, giving up',
+                lightos_volname)
+        return settled
 
     def create_snapshot(self, snapshot):
         snapshot_name = self._lightos_snapshotname(snapshot["id"])
@@ -1426,9 +1642,7 @@ class LightOSVolumeDriver(driver.VolumeDriver):
 
         lightos_volname = self._lightos_volname(volume)
         project_name = self._get_lightos_project_name(volume)
-        success = self.add_volume_acl(project_name, volume, hostnqn)
-        if not success or not self._wait_for_volume_acl(
-                project_name, lightos_volname, hostnqn, True):
+        if not self.add_volume_acl(project_name, volume, hostnqn):
             msg = ('Could not add ACL for hostnqn %s LightOS volume'
                    ' %s, aborting' % (hostnqn, lightos_volname))
             raise exception.VolumeBackendAPIException(message=_(msg))
@@ -1462,9 +1676,7 @@ class LightOSVolumeDriver(driver.VolumeDriver):
 
         lightos_volname = self._lightos_volname(volume)
         project_name = self._get_lightos_project_name(volume)
-        success = self.remove_volume_acl(project_name, volume, hostnqn)
-        if not success or not self._wait_for_volume_acl(
-                project_name, lightos_volname, hostnqn, False):
+        if not self.remove_volume_acl(project_name, volume, hostnqn):
             LOG.warning(
                 'Could not remove ACL for hostnqn %s LightOS \
                 volume %s, limping along',
@@ -18,15 +18,19 @@ from __future__ import annotations
 
 import binascii
 import errno
+import functools
 import json
 import math
 import os
 import tempfile
+import threading
+import time
 import typing
 from typing import Any, Optional, Union
 import urllib.parse
 
 from castellan import key_manager
+from eventlet import greenpool
 from eventlet import tpool
 from os_brick.initiator import linuxrbd
 from oslo_config import cfg
@@ -103,6 +107,14 @@ RBD_OPTS = [
     cfg.IntOpt('rados_connection_interval', default=5,
                help='Interval value (in seconds) between connection '
                     'retries to ceph cluster.'),
+    cfg.IntOpt('rados_connection_pool_size', default=0, min=0,
+               help='Number of idle connections to every ceph cluster kept '
+                    'by the volume service, along with the ioctxs of the '
+                    'pools they have used, to be reused by later operations '
+                    'instead of connecting to the cluster every time. '
+                    'Connections that are no longer connected or that got '
+                    'a connection error are replaced. Set to 0 to connect '
+                    'to the cluster for every operation.'),
     cfg.IntOpt('replication_connect_timeout', default=5,
                help='Timeout value (in seconds) used when connecting to '
                     'ceph cluster to do a demotion/promotion of volumes. '
@@ -123,6 +135,24 @@ RBD_OPTS = [
                      "the Ceph cluster for per image used disk, this is an "
                      "intensive operation having an independent request for "
                      "each image."),
+    cfg.IntOpt('rbd_usage_workers', default=8, min=1,
+               help='Number of images whose provisioned size is read '
+                    'concurrently for the stats reports when '
+                    'rbd_exclusive_cinder_pool is False.'),
+    cfg.IntOpt('rbd_usage_cache_time', default=0, min=0,
+               help='Number of seconds the provisioned size read for an '
+                    'image is reused by the stats reports when '
+                    'rbd_exclusive_cinder_pool is False. Images created, '
+                    'resized, renamed or deleted by the driver are read '
+                    'again on the next report, but images resized outside '
+                    'of Cinder are only read again once this time expires. '
+                    'The default of 0 reads every image on every report.'),
+    cfg.BoolOpt('rbd_usage_pool_stats', default=False,
+                help='Get the provisioned size of the images from the pool '
+                     'statistics of librbd, available since Ceph Nautilus, '
+                     'when rbd_exclusive_cinder_pool is False, instead of '
+                     'reading the size of every image. The size of every '
+                     'image is read when they are not supported.'),
     cfg.BoolOpt('enable_deferred_deletion', default=False,
                 help='Enable deferred deletion. Upon deletion, volumes are '
                      'tagged for deletion but will only be removed '
@@ -236,9 +266,10 @@ class RBDVolumeProxy(object):
                                            snapshot=snapshot,
                                            read_only=read_only)
             self.volume = tpool.Proxy(self.volume)
-        except driver.rbd.Error:
+        except driver.rbd.Error as e:
             if self._close_conn:
-                driver._disconnect_from_rados(rados_client, rados_ioctx)
+                driver._disconnect_from_rados(rados_client, rados_ioctx,
+                                              error=e)
             raise
         self.driver = driver
         self.client = rados_client
@@ -255,7 +286,8 @@ class RBDVolumeProxy(object):
             self.volume.close()
         finally:
             if self._close_conn:
-                self.driver._disconnect_from_rados(self.client, self.ioctx)
+                self.driver._disconnect_from_rados(self.client, self.ioctx,
+                                                   error=value)
 
     def __getattr__(self, attrib: str):
         return getattr(self.volume, attrib)
@@ -273,7 +305,8 @@ class RADOSClient(object):
         return self
 
     def __exit__(self, type_, value, traceback) -> None:
-        self.driver._disconnect_from_rados(self.cluster, self.ioctx)
+        self.driver._disconnect_from_rados(self.cluster, self.ioctx,
+                                           error=value)
 
     @property
     def features(self) -> int:
@@ -283,6 +316,220 @@ class RADOSClient(object):
         return int(features)
 
 
+class _PooledConnection(object):
+    def __init__(self, key: tuple, generation: int,
+                 client: 'rados.Rados') -> None:
+        self.key = key
+        self.generation = generation
+        self.client = client
+        self.ioctxs: dict[str, 'rados.Ioctx'] = {}
+
+
+class RADOSConnectionPool(object):
+    """Connected RADOS clients of a driver kept to be reused.
+
+    Clients are lent exclusively through the driver's _connect_to_rados and
+    _disconnect_from_rados methods.  When no idle client is available for the
+    cluster configuration a new one is connected, and up to
+    rados_connection_pool_size of them are kept idle when returned, along
+    with the ioctxs of the pools they were used for.  Idle clients that are
+    no longer connected are replaced on borrow, and clients returned after a
+    connection error are shut down.
+    """
+
+    def __init__(self, driver: 'RBDDriver') -> None:
+        self.driver = driver
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._idle: dict[tuple, list[_PooledConnection]] = {}
+        self._lent: dict[int, _PooledConnection] = {}
+
+    @property
+    def size(self) -> int:
+        return self.driver.configuration.rados_connection_pool_size
+
+    def get(self,
+            pool: Optional[str] = None,
+            remote: Optional[dict] = None,
+            timeout: Optional[int] = None) -> tuple['rados.Rados',
+                                                    'rados.Ioctx']:
+        """Borrow a connected client and an ioctx for a RADOS pool."""
+        if pool is None:
+            pool = self.driver.configuration.rbd_pool
+        if timeout is None:
+            timeout = self.driver.configuration.rados_connect_timeout
+        key = self.driver._get_config_tuple(remote)[:3] + (timeout,)
+
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                conn = idle.pop() if idle else None
+            if conn is None:
+                break
+            if conn.client.state == 'connected':
+                try:
+                    ioctx = conn.ioctxs.get(pool)
+                    if ioctx is None:
+                        ioctx = conn.ioctxs[pool] = conn.client.open_ioctx(
+                            pool)
+                except self.driver.rados.Error:
+                    LOG.warning('Failed opening pool %s with a pooled '
+                                'connection, reconnecting.', pool)
+                else:
+                    return self._lend(conn, ioctx)
+            self._shutdown(conn)
+
+        client, ioctx = self.driver._new_rados_connection(pool, remote,
+                                                          timeout)
+        conn = _PooledConnection(key, self._generation, client)
+        conn.ioctxs[pool] = ioctx
+        return self._lend(conn, ioctx)
+
+    def _lend(self,
+              conn: _PooledConnection,
+              ioctx: 'rados.Ioctx') -> tuple['rados.Rados', 'rados.Ioctx']:
+        with self._lock:
+            self._lent[id(conn.client)] = conn
+        return conn.client, ioctx
+
+    def put(self,
+            client: 'rados.Rados',
+            ioctx: 'rados.Ioctx',
+            error: Optional[BaseException] = None) -> bool:
+        """Return a borrowed client, False if it wasn't from the pool."""
+        with self._lock:
+            conn = self._lent.pop(id(client), None)
+            if conn is None:
+                return False
+            if (conn.generation == self._generation and
+                    not self._is_connection_error(error)):
+                idle = self._idle.setdefault(conn.key, [])
+                if len(idle) < self.size:
+                    idle.append(conn)
+                    return True
+        self._shutdown(conn)
+        return True
+
+    def clear(self) -> None:
+        """Shut down the idle clients, and the lent ones once returned."""
+        with self._lock:
+            self._generation += 1
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            self._idle = {}
+        for conn in idle:
+            self._shutdown(conn)
+
+    def _is_connection_error(self, error: Optional[BaseException]) -> bool:
+        if error is None:
+            return False
+        if isinstance(error, self.driver.rados.Error):
+            return True
+        return getattr(error, 'errno', None) in (errno.ETIMEDOUT,
+                                                 errno.ESHUTDOWN,
+                                                 errno.ENOTCONN)
+
+    @staticmethod
+    def _shutdown(conn: _PooledConnection) -> None:
+        try:
+            for ioctx in conn.ioctxs.values():
+                ioctx.close()
+            conn.client.shutdown()
+        except Exception:
+            LOG.warning('Failed shutting down a pooled RADOS connection.',
+                        exc_info=True)
+
+
+class RBDUsageTracker(object):
+    """Provisioned size of the images in the pool of a driver.
+
+    The size read for an image is reused by later calls for up to
+    rbd_usage_cache_time seconds, unless the driver changed the image in the
+    meantime, and the sizes that must be read are read by up to
+    rbd_usage_workers native threads.  The pool statistics of librbd are used
+    instead when rbd_usage_pool_stats is set and they are supported.
+    """
+
+    def __init__(self, driver: 'RBDDriver') -> None:
+        self.driver = driver
+        self._sizes: dict[str, tuple[int, float]] = {}
+        self._changed: set[str] = set()
+        self._pool_stats_supported = True
+
+    def invalidate(self, name: str) -> None:
+        """Read the size of an image again on the next call."""
+        self._changed.add(name)
+
+    def get_provisioned_bytes(self) -> int:
+        # Images changed while reading the sizes are read on the next call
+        changed, self._changed = self._changed, set()
+        try:
+            return self._get_provisioned_bytes(changed)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._changed |= changed
+
+    def _get_provisioned_bytes(self, changed: set[str]) -> int:
+        config = self.driver.configuration
+        with RADOSClient(self.driver) as client:
+            if config.rbd_usage_pool_stats and self._pool_stats_supported:
+                provisioned = self._get_pool_stats_provisioned(client)
+                if provisioned is not None:
+                    return provisioned
+
+            now = time.monotonic()
+            sizes = {}
+            to_read = []
+            for name in self.driver.RBDProxy().list(client.ioctx):
+                cached = self._sizes.get(name)
+                if (cached is None or name in changed or
+                        now - cached[1] >= config.rbd_usage_cache_time):
+                    to_read.append(name)
+                else:
+                    sizes[name] = cached
+
+            pool = greenpool.GreenPool(config.rbd_usage_workers)
+            for name, size in pool.imap(
+                    functools.partial(self._read_size, client), to_read):
+                if size is not None:
+                    sizes[name] = (size, now)
+
+        # Images that are gone are dropped from the cache
+        self._sizes = sizes
+        return sum(size for size, _read_at in sizes.values())
+
+    def _read_size(self,
+                   client: RADOSClient,
+                   name: str) -> tuple[str, Optional[int]]:
+        # Opening the image is the costly round trip, so the whole lookup
+        # runs in a native thread for the lookups of the workers to overlap.
+        size = tpool.execute(self._read_image_size, client, name)
+        if size is None:
+            LOG.debug("Image %s is not found.", name)
+        return name, size
+
+    def _read_image_size(self,
+                         client: RADOSClient,
+                         name: str) -> Optional[int]:
+        try:
+            with RBDVolumeProxy(self.driver, name, read_only=True,
+                                client=client.cluster,
+                                ioctx=client.ioctx) as v:
+                return v.size()
+        except (self.driver.rbd.ImageNotFound, self.driver.rbd.OSError):
+            return None
+
+    def _get_pool_stats_provisioned(self,
+                                    client: RADOSClient) -> Optional[int]:
+        try:
+            stats = self.driver.RBDProxy().pool_stats_get(client.ioctx)
+        except (AttributeError, self.driver.rbd.FunctionNotSupported):
+            LOG.info('RBD pool statistics are not supported, reading the '
+                     'size of every image instead.')
+            self._pool_stats_supported = False
+            return None
+        return stats['image_provisioned_bytes']
+
+
 @interface.volumedriver
 class RBDDriver(driver.CloneableImageVD, driver.MigrateVD,
                 driver.ManageableVD, driver.ManageableSnapshotsVD,
@@ -364,6 +611,9 @@ class RBDDriver(driver.CloneableImageVD, driver.MigrateVD,
             limit=self.configuration.rbd_concurrent_flatten_operations,
             concurrent_processes=1)
 
+        self._rados_pool = RADOSConnectionPool(self)
+        self._usage = RBDUsageTracker(self)
+
     def _set_keyring_attributes(self) -> None:
         # The rbd_keyring_conf option is not available for OpenStack usage
         # for security reasons (OSSN-0085) and in OpenStack we use
@@ -587,6 +837,15 @@ class RBDDriver(driver.CloneableImageVD, driver.MigrateVD,
                           remote: Optional[dict] = None,
                           timeout: Optional[int] = None) -> \
             tuple['rados.Rados', 'rados.Ioctx']:
+        if self.configuration.rados_connection_pool_size:
+            return self._rados_pool.get(pool, remote, timeout)
+        return self._new_rados_connection(pool, remote, timeout)
+
+    def _new_rados_connection(self,
+                              pool: Optional[str] = None,
+                              remote: Optional[dict] = None,
+                              timeout: Optional[int] = None) -> \
+            tuple['rados.Rados', 'rados.Ioctx']:
         @utils.retry(exception.VolumeBackendAPIException,
                      self.configuration.rados_connection_interval,
                      self.configuration.rados_connection_retries)
@@ -630,9 +889,12 @@ class RBDDriver(driver.CloneableImageVD, driver.MigrateVD,
 
         return _do_conn(pool, remote, timeout)
 
-    @staticmethod
-    def _disconnect_from_rados(client: 'rados.Rados',
-                               ioctx: 'rados.Ioctx') -> None:
+    def _disconnect_from_rados(self,
+                               client: 'rados.Rados',
+                               ioctx: 'rados.Ioctx',
+                               error: Optional[BaseException] = None) -> None:
+        if self._rados_pool.put(client, ioctx, error):
+            return
         # closing an ioctx cannot raise an exception
         ioctx.close()
         client.shutdown()
@@ -682,19 +944,7 @@ class RBDDriver(driver.CloneableImageVD, driver.MigrateVD,
         Cinder created volumes are reported by the Cinder core code as
         allocated_capacity_gb.
         """
-        total_provisioned = 0
-        with RADOSClient(self) as client:
-            for t in self.RBDProxy().list(client.ioctx):
-                try:
-                    with RBDVolumeProxy(self, t, read_only=True,
-                                        client=client.cluster,
-                                        ioctx=client.ioctx) as v:
-                        size = v.size()
-                except (self.rbd.ImageNotFound, self.rbd.OSError):
-                    LOG.debug("Image %s is not found.", t)
-                else:
-                    total_provisioned += size
-
+        total_provisioned = self._usage.get_provisioned_bytes()
         total_provisioned = math.ceil(float(total_provisioned) / units.Gi)
         return total_provisioned
 
@@ -1255,6 +1505,7 @@ class RBDDriver(driver.CloneableImageVD, driver.MigrateVD,
         if not size:
             size = int(volume.size) * units.Gi
 
+        self._usage.invalidate(volume.name)
         with RBDVolumeProxy(self, volume.name) as vol:
             vol.resize(size)
 
@@ -1531,6 +1782,8 @@ class RBDDriver(driver.CloneableImageVD, driver.MigrateVD,
 
     def delete_volume(self, volume: Volume) -> None:
         """Deletes an RBD volume."""
+        # A new image may be created with the same name
+        self._usage.invalidate(volume.name)
         with RADOSClient(self) as client:
             self._delete_volume(volume, client)
 
@@ -1814,6 +2067,8 @@ class RBDDriver(driver.CloneableImageVD, driver.MigrateVD,
 
         self._active_backend_id = secondary_id
         self._active_config = remote
+        # Pooled connections were made to the previously active cluster
+        self._rados_pool.clear()
         self._set_default_secret_uuid()
         LOG.info('RBD driver failover completion completed.')
 
@@ -2128,6 +2383,7 @@ class RBDDriver(driver.CloneableImageVD, driver.MigrateVD,
             {'source-name': <name of RBD image>}
         """
         # Raise an exception if we didn't find a suitable rbd image.
+        self._usage.invalidate(volume.name)
         with RADOSClient(self) as client:
             rbd_name = existing_ref['source-name']
             self.RBDProxy().rename(client.ioctx,
@@ -2275,6 +2531,7 @@ class RBDDriver(driver.CloneableImageVD, driver.MigrateVD,
 
         existing_name = CONF.volume_name_template % new_volume.id
         wanted_name = CONF.volume_name_template % volume.id
+        self._usage.invalidate(wanted_name)
         with RADOSClient(self) as client:
             try:
                 self.RBDProxy().rename(client.ioctx,
@@ -434,32 +434,26 @@ class VolumeManager(manager.CleanableManager,
         updates, snapshot_updates = self.driver.update_provider_info(
             volumes, snapshots)
 
-        update: Any
         if updates:
-            for volume in volumes:
-                # NOTE(JDG): Make sure returned item is in this hosts volumes
-                update = (
-                    [updt for updt in updates if updt['id'] ==
-                        volume['id']])
-                if update:
-                    update = update[0]
-                    self.db.volume_update(
-                        ctxt,
-                        update['id'],
-                        {'provider_id': update['provider_id']})
+            # NOTE(JDG): Make sure returned item is in this hosts volumes
+            provider_ids = {volume['id']: volume.get('provider_id')
+                            for volume in volumes}
+            changed = {update['id']: update['provider_id']
+                       for update in updates
+                       if update['id'] in provider_ids and
+                       provider_ids[update['id']] != update['provider_id']}
+            if changed:
+                self.db.volumes_provider_id_update(ctxt, changed)
 
         if snapshot_updates:
-            for snap in snapshots:
-                # NOTE(jdg): For now we only update those that have no entry
-                if not snap.get('provider_id', None):
-                    update = (
-                        [updt for updt in snapshot_updates if updt['id'] ==
-                            snap['id']][0])
-                    if update:
-                        self.db.snapshot_update(
-                            ctxt,
-                            update['id'],
-                            {'provider_id': update['provider_id']})
+            # NOTE(jdg): For now we only update those that have no entry
+            missing = {snap['id'] for snap in snapshots
+                       if not snap.get('provider_id', None)}
+            changed = {update['id']: update['provider_id']
+                       for update in snapshot_updates
+                       if update['id'] in missing}
+            if changed:
+                self.db.snapshots_provider_id_update(ctxt, changed)
 
     def _include_resources_in_cluster(self, ctxt) -> None:
 
@@ -17,6 +17,8 @@
 
 
 import contextlib
+import threading
+import time
 
 from oslo_concurrency import processutils
 from oslo_log import log as logging
@@ -34,6 +36,9 @@ class Throttle(object):
 
     DEFAULT = None
 
+    # Bandwidth limit in bytes per second of the copies done in Python
+    bps_limit = 0
+
     @staticmethod
     def set_default(throttle):
         Throttle.DEFAULT = throttle
@@ -44,6 +49,8 @@ class Throttle(object):
 
     def __init__(self, prefix=None):
         self.prefix = prefix or []
+        self._rate_lock = threading.Lock()
+        self._next_transfer = 0.0
 
     @contextlib.contextmanager
     def subcommand(self, srcpath, dstpath):
@@ -55,11 +62,28 @@ class Throttle(object):
         """
         yield {'prefix': self.prefix}
 
+    def consume(self, nbytes):
+        """Wait until nbytes can be transferred within the bandwidth limit.
+
+        Copies done in Python, between file handles that a sub-command can't
+        use, call this before transferring every chunk.  They share the
+        bps_limit of the throttle.
+        """
+        if not self.bps_limit:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            start = max(now, self._next_transfer)
+            self._next_transfer = start + float(nbytes) / self.bps_limit
+        if start > now:
+            time.sleep(start - now)
+
 
 class BlkioCgroup(Throttle):
     """Throttle disk I/O bandwidth using blkio cgroups."""
 
     def __init__(self, bps_limit, cgroup_name):
+        super(BlkioCgroup, self).__init__()
         self.bps_limit = bps_limit
         self.cgroup = cgroup_name
         self.srcdevs = {}
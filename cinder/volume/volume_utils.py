@@ -18,8 +18,13 @@ from __future__ import annotations  # Remove when only supporting python 3.9+
 
 import abc
 import ast
+import contextlib
+import errno
+import fcntl
 import functools
 import inspect
+import io
+import itertools
 import json
 import logging as py_logging
 import math
@@ -29,6 +34,7 @@ from os import urandom
 from random import shuffle
 import re
 import socket
+import stat
 import tempfile
 import time
 import types
@@ -41,6 +47,7 @@ from castellan.common.credentials import keystone_password
 from castellan.common import exception as castellan_exception
 from castellan import key_manager as castellan_key_manager
 import eventlet
+from eventlet import queue
 from eventlet import tpool
 from keystoneauth1 import loading as ks_loading
 from os_brick import encryptors
@@ -462,29 +469,188 @@ def check_for_odirect_support(src: str, dest: str,
         return False
 
 
+# Probed O_DIRECT support of the paths copied with dd, by (path, flag)
+_ODIRECT_SUPPORT: dict[tuple[str, str], bool] = {}
+_ODIRECT_SUPPORT_SIZE = 1024
+
+
+def _check_for_odirect_support_cached(src: str, dest: str, flag: str) -> bool:
+    path = src if flag.startswith('iflag') else dest
+    supported = _ODIRECT_SUPPORT.get((path, flag))
+    if supported is None:
+        supported = check_for_odirect_support(src, dest, flag)
+        if len(_ODIRECT_SUPPORT) >= _ODIRECT_SUPPORT_SIZE:
+            _ODIRECT_SUPPORT.clear()
+        _ODIRECT_SUPPORT[(path, flag)] = supported
+    return supported
+
+
+# ioctl cloning a whole file, from linux/fs.h
+FICLONE = 0x40049409
+_COPY_OFFLOAD_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP,
+                             errno.EINVAL, errno.ENOTTY, errno.EBADF)
+_IN_PROCESS_CHUNK_SIZE = 4 * units.Mi
+
+
+def _data_segments(fd: int, length: int,
+                   sparse: bool) -> typing.Iterator[tuple[int, int]]:
+    """Yield the (start, end) offsets of the data of a file up to length."""
+    pos = 0
+    while pos < length:
+        if not sparse:
+            yield pos, length
+            return
+        try:
+            data = os.lseek(fd, pos, os.SEEK_DATA)
+            hole = os.lseek(fd, data, os.SEEK_HOLE)
+        except OSError as exc:
+            # ENXIO means there is no data after pos
+            if exc.errno != errno.ENXIO:
+                yield pos, length
+            return
+        if data >= length:
+            return
+        yield data, min(hole, length)
+        pos = hole
+
+
+def _copy_range_with_read_write(src_fd: int, dest_fd: int, start: int,
+                                end: int, sparse: bool,
+                                buf: bytearray) -> int:
+    """Copy a range of a file with pread/pwrite, returns the end copied."""
+    view = memoryview(buf)
+    pos = start
+    while pos < end:
+        size = os.preadv(src_fd, [view[:min(len(buf), end - pos)]], pos)
+        if not size:
+            break
+        if not (sparse and is_all_zero(view[:size])):
+            written = 0
+            while written < size:
+                written += os.pwrite(dest_fd, view[written:size],
+                                     pos + written)
+        pos += size
+    return pos
+
+
+def _copy_fd(src_fd: int, dest_fd: int, length: int, whole_file: bool,
+             sparse: bool) -> str:
+    """Copy length bytes of a file, returns the method used."""
+    # Like dd, the destination ends up with the length copied.
+    os.ftruncate(dest_fd, 0)
+    if whole_file:
+        try:
+            fcntl.ioctl(dest_fd, FICLONE, src_fd)
+            return 'reflink'
+        except OSError as exc:
+            if exc.errno not in _COPY_OFFLOAD_UNSUPPORTED:
+                raise
+
+    method = ('copy_file_range' if hasattr(os, 'copy_file_range')
+              else 'read/write')
+    buf = None
+    for start, end in _data_segments(src_fd, length, sparse):
+        pos = start
+        while pos < end and method == 'copy_file_range':
+            try:
+                copied = os.copy_file_range(src_fd, dest_fd, end - pos,
+                                            pos, pos)
+            except OSError as exc:
+                if exc.errno not in _COPY_OFFLOAD_UNSUPPORTED:
+                    raise
+                method = 'read/write'
+                break
+            if not copied:
+                end = pos
+                break
+            pos += copied
+        if pos < end:
+            if buf is None:
+                buf = bytearray(_IN_PROCESS_CHUNK_SIZE)
+            _copy_range_with_read_write(src_fd, dest_fd, pos, end, sparse,
+                                        buf)
+    os.ftruncate(dest_fd, length)
+    return method
+
+
+def _copy_volume_in_process(srcstr: str, deststr: str, size_in_bytes: int,
+                            sync: bool = False, sparse: bool = False) -> bool:
+    """Copy a volume stored in a file in this process.
+
+    Returns False when the volume must be copied with dd instead, because
+    the source or destination aren't files or can't be copied here.
+    """
+    try:
+        src_stat = os.stat(srcstr)
+        dest_stat = os.stat(deststr)
+    except OSError:
+        return False
+    if not (stat.S_ISREG(src_stat.st_mode) and
+            stat.S_ISREG(dest_stat.st_mode)):
+        return False
+    if (src_stat.st_dev, src_stat.st_ino) == (dest_stat.st_dev,
+                                              dest_stat.st_ino):
+        return False
+
+    length = min(size_in_bytes, src_stat.st_size)
+    start_time = timeutils.utcnow()
+    try:
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(utils.temporary_chown(srcstr))
+            stack.enter_context(utils.temporary_chown(deststr))
+            src_fd = os.open(srcstr, os.O_RDONLY)
+            stack.callback(os.close, src_fd)
+            dest_fd = os.open(deststr, os.O_WRONLY)
+            stack.callback(os.close, dest_fd)
+            method = tpool.execute(_copy_fd, src_fd, dest_fd, length,
+                                   length == src_stat.st_size, sparse)
+            if sync:
+                tpool.execute(os.fdatasync, dest_fd)
+    except (OSError, processutils.ProcessExecutionError) as exc:
+        LOG.warning("Failed copying %(src)s to %(dest)s in process, "
+                    "copying with dd instead: %(exc)s",
+                    {'src': srcstr, 'dest': deststr, 'exc': exc})
+        return False
+
+    duration = max(1, timeutils.delta_seconds(start_time, timeutils.utcnow()))
+    size_in_m = length / units.Mi
+    LOG.info("Volume copy %(size_in_m).2f MB at %(mbps).2f MB/s with "
+             "%(method)s.",
+             {'size_in_m': size_in_m, 'mbps': size_in_m / duration,
+              'method': method})
+    return True
+
+
 def _copy_volume_with_path(prefix, srcstr: str, deststr: str,
                            size_in_m: int, blocksize: Union[str, int],
                            sync: bool = False,
                            execute: Callable = utils.execute,
                            ionice=None,
                            sparse: bool = False) -> None:
+    size_in_bytes = size_in_m * units.Mi
+    # Throttling and ionice only apply to dd
+    if (CONF.volume_copy_offload and not prefix and not ionice and
+            _copy_volume_in_process(srcstr, deststr, size_in_bytes,
+                                    sync=sync, sparse=sparse)):
+        return
+
     cmd = prefix[:]
 
     if ionice:
         cmd.extend(('ionice', ionice))
 
     blocksize = _check_blocksize(blocksize)
-    size_in_bytes = size_in_m * units.Mi
 
     cmd.extend(('dd', 'if=%s' % srcstr, 'of=%s' % deststr,
                 'count=%d' % size_in_bytes, 'bs=%s' % blocksize))
 
     # Use O_DIRECT to avoid thrashing the system buffer cache
-    odirect = check_for_odirect_support(srcstr, deststr, 'iflag=direct')
+    odirect = _check_for_odirect_support_cached(srcstr, deststr,
+                                                'iflag=direct')
 
     cmd.append('iflag=count_bytes,direct' if odirect else 'iflag=count_bytes')
 
-    if check_for_odirect_support(srcstr, deststr, 'oflag=direct'):
+    if _check_for_odirect_support_cached(srcstr, deststr, 'oflag=direct'):
         cmd.append('oflag=direct')
         odirect = True
 
@@ -530,41 +696,108 @@ def _open_volume_with_path(path: str, mode: str) -> IO[Any]:
         raise
 
 
+def _supports_readinto(handle: IO) -> bool:
+    # Handles like os-brick's RBDVolumeIOWrapper only implement read
+    readinto = getattr(type(handle), 'readinto', None)
+    return readinto is not None and readinto is not io.RawIOBase.readinto
+
+
 def _transfer_data(src: IO, dest: IO,
-                   length: int, chunk_size: int) -> None:
-    """Transfer data between files (Python IO objects)."""
+                   length: int, chunk_size: int,
+                   throttle: Optional[throttling.Throttle] = None,
+                   sparse: bool = False,
+                   depth: int = 2) -> None:
+    """Transfer data between files (Python IO objects).
+
+    A green thread reads up to depth chunks ahead while the previous ones are
+    written, and both do the I/O in native threads, so reads and writes
+    overlap.  The chunk buffers are reused when the source supports readinto
+    and the destination is a regular file object, all zero chunks are skipped
+    by seeking the destination when sparse is set, and the throttle bandwidth
+    limit is applied to every chunk written.
+    """
 
     chunks = int(math.ceil(length / chunk_size))
-    remaining_length = length
 
     LOG.debug("%(chunks)s chunks of %(bytes)s bytes to be transferred.",
               {'chunks': chunks, 'bytes': chunk_size})
 
-    for chunk in range(0, chunks):
-        before = time.time()
-        data = tpool.execute(src.read, min(chunk_size, remaining_length))
-
-        # If we have reached end of source, discard any extraneous bytes from
-        # destination volume if trim is enabled and stop writing.
-        if data == b'':
-            break
+    reuse = (_supports_readinto(src) and
+             isinstance(dest, (io.BufferedIOBase, io.FileIO)))
+    free: queue.LightQueue = queue.LightQueue()
+    if reuse:
+        for _buffer in range(depth):
+            free.put(bytearray(chunk_size))
+    filled: queue.LightQueue = queue.LightQueue(depth)
 
-        tpool.execute(dest.write, data)
-        remaining_length -= len(data)
-        delta = (time.time() - before)
-        rate = (chunk_size / delta) / units.Ki
-        LOG.debug("Transferred chunk %(chunk)s of %(chunks)s (%(rate)dK/s).",
-                  {'chunk': chunk + 1, 'chunks': chunks, 'rate': rate})
-
-        # yield to any other pending operations
-        eventlet.sleep(0)
+    def _reader() -> None:
+        remaining_length = length
+        try:
+            while remaining_length > 0:
+                size = min(chunk_size, remaining_length)
+                if reuse:
+                    buf = free.get()
+                    view = memoryview(buf)[:size]
+                    data = view[:tpool.execute(src.readinto, view) or 0]
+                else:
+                    buf = None
+                    data = tpool.execute(src.read, size)
+                # If we have reached end of source, stop writing.
+                if not data:
+                    break
+                filled.put((buf, data))
+                remaining_length -= len(data)
+        except Exception as exc:
+            filled.put(exc)
+        else:
+            filled.put(None)
 
-    tpool.execute(dest.flush)
+    skip_zeros = sparse and dest.seekable()
+    skipped = False
+    reader = eventlet.spawn(_reader)
+    try:
+        for chunk in itertools.count():
+            item = filled.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            buf, data = item
+
+            before = time.time()
+            if throttle:
+                throttle.consume(len(data))
+            skipped = skip_zeros and is_all_zero(data)
+            if skipped:
+                tpool.execute(dest.seek, len(data), os.SEEK_CUR)
+            else:
+                tpool.execute(dest.write, data)
+            if buf is not None:
+                free.put(buf)
+            delta = (time.time() - before)
+            rate = (len(data) / max(delta, 1e-6)) / units.Ki
+            LOG.debug("Transferred chunk %(chunk)s of %(chunks)s "
+                      "(%(rate)dK/s).",
+                      {'chunk': chunk + 1, 'chunks': chunks, 'rate': rate})
+
+            # yield to any other pending operations
+            eventlet.sleep(0)
+
+        # Extend the destination to its full length if the data ended with
+        # skipped zeroes.
+        if skipped:
+            tpool.execute(dest.seek, -1, os.SEEK_CUR)
+            tpool.execute(dest.write, b'\0')
+        tpool.execute(dest.flush)
+    finally:
+        reader.kill()
 
 
 def _copy_volume_with_file(src: Union[str, IO],
                            dest: Union[str, IO],
-                           size_in_m: int) -> None:
+                           size_in_m: int,
+                           throttle: Optional[throttling.Throttle] = None,
+                           sparse: bool = False) -> None:
     src_handle = src
     if isinstance(src, str):
         src_handle = _open_volume_with_path(src, 'rb')
@@ -587,7 +820,8 @@ def _copy_volume_with_file(src: Union[str, IO],
 
     start_time = timeutils.utcnow()
 
-    _transfer_data(src_handle, dest_handle, size_in_m * units.Mi, units.Mi * 4)
+    _transfer_data(src_handle, dest_handle, size_in_m * units.Mi, units.Mi * 4,
+                   throttle=throttle, sparse=sparse)
 
     duration = max(1, timeutils.delta_seconds(start_time, timeutils.utcnow()))
 
@@ -618,20 +852,22 @@ def copy_volume(src: Union[str, BinaryIO],
     If either 'src' or 'dest' are not of type str, then they are assumed to be
     of type RawIOBase or any derivative that supports file operations such as
     read and write.  In this case, the handles are treated as file handles
-    instead of file paths and, at present moment, throttling is unavailable.
+    instead of file paths, and copied in Python with the bandwidth limit of
+    the throttle.
     """
 
+    if not throttle:
+        throttle = throttling.Throttle.get_default()
     if (isinstance(src, str) and
             isinstance(dest, str)):
-        if not throttle:
-            throttle = throttling.Throttle.get_default()
         with throttle.subcommand(src, dest) as throttle_cmd:
             _copy_volume_with_path(throttle_cmd['prefix'], src, dest,
                                    size_in_m, blocksize, sync=sync,
                                    execute=execute, ionice=ionice,
                                    sparse=sparse)
     else:
-        _copy_volume_with_file(src, dest, size_in_m)
+        _copy_volume_with_file(src, dest, size_in_m, throttle=throttle,
+                               sparse=sparse)
 
 
 def clear_volume(volume_size: int,
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Replay synthetic volume create requests against the filter scheduler.
+
+Creates the volume services of the fake backends in an in-memory SQLite
+database, feeds their capabilities to the host manager, and then schedules
+create requests with the configured scheduler filters and weighers.  The
+latency of the requests is printed along with the time spent in every filter
+and weigher, and the database queries they issued.
+
+Example:
+
+    tools/scheduler_benchmark.py --backends 1000 --pools 4 --requests 200
+"""
+
+import argparse
+import random
+import time
+
+from oslo_config import cfg
+from oslo_utils import importutils
+from oslo_utils import timeutils
+
+from cinder.common import constants
+from cinder import context
+from cinder import db
+from cinder.db.sqlalchemy import api as sqlalchemy_api
+from cinder.db.sqlalchemy import models
+from cinder import objects
+from cinder.objects import base as objects_base
+from cinder import rpc
+from cinder.scheduler import stats
+from cinder.volume import rpcapi as volume_rpcapi
+
+
+objects.register_all()
+CONF = cfg.CONF
+
+PROTOCOLS = ('iSCSI', 'FC', 'NVMe-oF', 'NFS')
+
+
+def _capabilities(index, args, timestamp):
+    name_index = index % args.backend_names
+    pools = [{'pool_name': 'pool%d' % pool,
+              'total_capacity_gb': 10000,
+              'free_capacity_gb': random.randint(0, 10000),
+              'allocated_capacity_gb': random.randint(0, 10000),
+              'provisioned_capacity_gb': random.randint(0, 20000),
+              'max_over_subscription_ratio': 20.0,
+              'thin_provisioning_support': True,
+              'thick_provisioning_support': False,
+              'reserved_percentage': 0,
+              'multiattach': True}
+             for pool in range(args.pools)]
+    return {'volume_backend_name': 'backend%d' % name_index,
+            'vendor_name': 'OpenStack',
+            'driver_version': '1.0',
+            'storage_protocol': PROTOCOLS[name_index % len(PROTOCOLS)],
+            'timestamp': timestamp,
+            'pools': pools}
+
+
+def _request_spec(args):
+    name_index = random.randrange(args.backend_names)
+    extra_specs = {
+        'volume_backend_name': 'backend%d' % name_index,
+        'storage_protocol': PROTOCOLS[name_index % len(PROTOCOLS)],
+        'thin_provisioning_support': '<is> True',
+    }
+    volume_type = {'name': 'type', 'extra_specs': extra_specs}
+    volume_properties = {
+        'size': random.randint(1, 100),
+        'availability_zone': 'az%d' % random.randrange(args.zones),
+    }
+    return {'volume_type': volume_type,
+            'volume_properties': volume_properties,
+            'resource_properties': volume_properties}
+
+
+def run(args):
+    CONF([], project='cinder')
+    # Imported once the objects are registered, and before the options it
+    # registers are set.
+    scheduler_cls = importutils.import_class(
+        'cinder.scheduler.filter_scheduler.FilterScheduler')
+    CONF.set_override('connection', 'sqlite://', group='database')
+    # The run must finish before the fake services are considered down.
+    CONF.set_override('service_down_time', 24 * 3600)
+    if args.filters:
+        CONF.set_override('scheduler_default_filters', args.filters)
+    if args.weighers:
+        CONF.set_override('scheduler_default_weighers', args.weighers)
+    random.seed(args.seed)
+
+    models.BASE.metadata.create_all(sqlalchemy_api.get_engine())
+    ctxt = context.get_admin_context()
+    for index in range(args.backends):
+        db.service_create(ctxt, {'host': 'host%d@lvm' % index,
+                                 'topic': constants.VOLUME_TOPIC,
+                                 'binary': constants.VOLUME_BINARY,
+                                 'availability_zone': 'az%d' % (
+                                     index % args.zones),
+                                 'rpc_current_version':
+                                     volume_rpcapi.VolumeAPI.RPC_API_VERSION,
+                                 'object_current_version':
+                                     objects_base.OBJ_VERSIONS.get_current(),
+                                 'updated_at': timeutils.utcnow()})
+
+    rpc.init(CONF)
+    scheduler = scheduler_cls()
+    timestamp = timeutils.utcnow()
+    for index in range(args.backends):
+        scheduler.host_manager.update_service_capabilities(
+            'volume', 'host%d@lvm' % index,
+            _capabilities(index, args, timestamp), None, timestamp)
+
+    stats.STATS.count_db_queries()
+    stats.STATS.get_stats(reset=True)
+    latencies = []
+    scheduled = 0
+    for _request in range(args.requests):
+        request_spec = _request_spec(args)
+        start = time.monotonic()
+        if scheduler._schedule(ctxt, request_spec, {}):
+            scheduled += 1
+        latencies.append(time.monotonic() - start)
+
+    latencies.sort()
+    print('%(requests)d requests, %(scheduled)d scheduled, against '
+          '%(backends)d backends with %(pools)d pools each: '
+          '%(avg).2f ms average, %(p50).2f ms p50, %(p99).2f ms p99' %
+          {'requests': args.requests, 'scheduled': scheduled,
+           'backends': args.backends, 'pools': args.pools,
+           'avg': sum(latencies) * 1000 / len(latencies),
+           'p50': latencies[len(latencies) // 2] * 1000,
+           'p99': latencies[int(len(latencies) * 0.99)] * 1000})
+
+    results = stats.STATS.get_stats()
+    for (kind, name), value in sorted(results.items(),
+                                      key=lambda item: -item[1]['time']):
+        calls = value['calls']
+        print('  %(kind)-7s %(name)-28s %(avg)9.3f ms/call '
+              '%(queries)6.2f queries/call %(in)9.1f -> %(out)9.1f backends' %
+              {'kind': kind, 'name': name,
+               'avg': value['time'] * 1000 / calls,
+               'queries': value['db_queries'] / calls,
+               'in': value['backends_in'] / calls,
+               'out': value['backends_out'] / calls})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', type=int, default=100,
+                        help='Number of volume backends.')
+    parser.add_argument('--pools', type=int, default=1,
+                        help='Number of pools of every backend.')
+    parser.add_argument('--backend-names', type=int, default=10,
+                        help='Number of distinct volume_backend_name values.')
+    parser.add_argument('--zones', type=int, default=3,
+                        help='Number of availability zones.')
+    parser.add_argument('--requests', type=int, default=100,
+                        help='Number of create requests to schedule.')
+    parser.add_argument('--filters', type=lambda s: s.split(','),
+                        help='Comma separated scheduler filters to use.')
+    parser.add_argument('--weighers', type=lambda s: s.split(','),
+                        help='Comma separated scheduler weighers to use.')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed of the random requests and capacities.')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the cost of evaluating filter and goodness functions.
+
+Evaluates the same filter and goodness functions against many pools, the
+way the DriverFilter and GoodnessWeigher do for every scheduling request,
+and prints the average time spent per pool.
+
+Example:
+
+    tools/scheduler_evaluator_benchmark.py --pools 1000 --requests 10
+"""
+
+import argparse
+import time
+
+from cinder.scheduler.evaluator import evaluator
+
+
+FILTER_FUNCTION = ('volume.size < 100 AND '
+                   'capabilities.total_volumes < capabilities.max_volumes')
+GOODNESS_FUNCTION = ('capabilities.free_capacity_gb > 100 ? '
+                     '100 - capabilities.allocated_capacity_gb : '
+                     'max(10, capabilities.free_capacity_gb)')
+
+
+def run(args):
+    pools = [{'total_volumes': i % 50, 'max_volumes': 40,
+              'free_capacity_gb': (i * 7) % 500,
+              'allocated_capacity_gb': i % 100}
+             for i in range(args.pools)]
+    volume = {'size': 10}
+
+    passed = 0
+    start = time.monotonic()
+    for _request in range(args.requests):
+        for capabilities in pools:
+            if evaluator.evaluate(FILTER_FUNCTION, volume=volume,
+                                  capabilities=capabilities):
+                passed += 1
+                evaluator.evaluate(GOODNESS_FUNCTION, volume=volume,
+                                   capabilities=capabilities)
+    elapsed = time.monotonic() - start
+
+    evaluations = args.requests * args.pools + passed
+    print('%(evaluations)d evaluations in %(elapsed).2f s: '
+          '%(per_eval).1f us per evaluation' %
+          {'evaluations': evaluations, 'elapsed': elapsed,
+           'per_eval': elapsed * 1e6 / evaluations})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pools', type=int, default=1000,
+                        help='Number of pools evaluated for every request.')
+    parser.add_argument('--requests', type=int, default=10,
+                        help='Number of scheduling requests.')
+    run(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()